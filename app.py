@@ -1,30 +1,82 @@
 # =========================
 # app.py (Streamlit)
 # =========================
+import hashlib
 import os
-import re
+import tempfile
 import datetime as dt
 from io import BytesIO
-from xml.sax.saxutils import escape
 
+import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
-
-from attendance_engine import process_attendance, WEEKDAY_AR
+import streamlit.components.v1 as components
+
+from attendance_engine import process_attendance
+from exporter import write_attendance_excel
+from html_reports import render_employee_html
+from rules import (
+    EID_AL_ADHA_2026_START,
+    EID_AL_ADHA_2026_END,
+    SICK_LEAVE_ANNUAL_QUOTA,
+    count_workdays,
+    schedule_for_nationality,
+)
+from database import (
+    LEAVE_COLUMNS,
+    ensure_db,
+    get_meta,
+    set_meta,
+    get_leave,
+    get_leaves_version,
+    query_leaves_db,
+    leave_day_totals_db,
+    import_leaves,
+    import_leaves_report,
+    insert_leave,
+    update_leave,
+    leave_overlaps_db,
+    audit_leave_overlaps,
+    check_import_overlaps,
+    DEFAULT_ANNUAL_ENTITLEMENT,
+    set_leave_entitlement,
+    seed_leave_entitlements,
+    load_leave_entitlements,
+    leave_balances_as_of,
+    get_leave_balance,
+    load_balance_ledger,
+    delete_leave,
+    restore_leave,
+    list_deleted_leaves,
+    undo_last_delete,
+)
 
 # PDF (ReportLab)
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.platypus.flowables import HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.utils import ImageReader
 
-import arabic_reshaper
-from bidi.algorithm import get_display
+from pdf_context import ensure_fonts, pdf_style, warm_ar_cache, StreamedStory
+from pdf_reports import (
+    WEEKDAY_AR,
+    ar,
+    safe_str,
+    fmt_id,
+    fmt_date,
+    month_year_title,
+    sanitize_filename,
+    weekday_to_ar,
+    mm_to_hhmm,
+    build_pdf,
+    build_department_pdf,
+    build_sick_leave_pdf,
+    build_all_leave_summary_pdf,
+    department_pdf_filename,
+    employee_pdf_filename,
+    export_employee_pdfs_zip,
+)
 
 # --- Compatibility patch ---
 # streamlit_cookies_manager يستخدم @st.cache وهي دالة اتشالت من ستريمليت
@@ -595,10 +647,6 @@ if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
 if "login_user" not in st.session_state:
     st.session_state["login_user"] = ""
-
-# 🔥 حفظ آخر عملية حذف (Undo)
-if "last_deleted_leave" not in st.session_state:
-    st.session_state["last_deleted_leave"] = None
 # =========================
 # Auth helpers
 # =========================
@@ -676,8 +724,6 @@ def require_login(app_name=" التأخير والغياب والخروج الم
 # Paths
 # =========================
 EMP_PATH = os.path.join("data", "employees.xlsx")
-FONT_PATH = os.path.join("fonts", "Amiri-Regular.ttf")
-LOGO_PATH = os.path.join("assets", "logo.png")
 SIDE_IMAGE_PATH = os.path.join("assets", "222003582.jpg")
 LEAVES_PATH = os.path.join("data", "leaves.xlsx")
 LEAVE_ATTACHMENTS_DIR = os.path.join("data", "leave_attachments")
@@ -705,46 +751,6 @@ def load_employees_silent():
     return None
 
 
-def ar(text: str) -> str:
-    if text is None:
-        return ""
-    s = str(text).strip()
-    if not s:
-        return ""
-    return get_display(arabic_reshaper.reshape(s))
-
-
-def t(ar_text: str, en_text: str, lang: str) -> str:
-    return ar_text if lang == "ar" else en_text
-
-
-def safe_str(x):
-    return "" if x is None or (isinstance(x, float) and pd.isna(x)) else str(x).strip()
-
-
-def fmt_id(x):
-    """يحول أي قيمة رقم وظيفي/رقم موظف (بما فيها float زي 27164.0) لنص بدون فواصل عشرية."""
-    if x is None or (isinstance(x, float) and pd.isna(x)):
-        return ""
-    s = str(x).strip()
-    if s == "" or s.lower() == "nan":
-        return ""
-    try:
-        f = float(s)
-        if f.is_integer():
-            return str(int(f))
-        return s
-    except (ValueError, TypeError):
-        return s
-
-
-def fmt_date(d):
-    try:
-        return pd.to_datetime(d).strftime("%d-%m-%Y")
-    except Exception:
-        return safe_str(d)
-
-
 def eid_al_adha_hint() -> str:
     return (
         f"🕋 ملاحظة: إجازة عيد الأضحى المبارك من "
@@ -753,53 +759,19 @@ def eid_al_adha_hint() -> str:
     )
 
 
-def month_year_title(emp_row):
-    y, m = "", ""
-    p_to = emp_row.get("period_to", "")
-    try:
-        dt_to = pd.to_datetime(p_to)
-        y = dt_to.year
-        m = dt_to.month
-    except Exception:
-        pass
-    if y and m:
-        return f"تقرير الموظف عن شهر {m:02d} - {y}"
-    return "تقرير الموظف"
-
-
-def month_year_title_en(emp_row):
-    y, m = "", ""
-    p_to = emp_row.get("period_to", "")
-    try:
-        dt_to = pd.to_datetime(p_to)
-        y = dt_to.year
-        m = dt_to.month
-    except Exception:
-        pass
-    if y and m:
-        return f"Employee Monthly Report - {m:02d}/{y}"
-    return "Employee Report"
-
-
-def sanitize_filename(s: str) -> str:
-    s = re.sub(r"[\\/:*?\"<>|]+", "", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s[:80] if s else "employee"
-
-
-WEEKDAY_AR = {
-    "Saturday": "السبت",
-    "Sunday": "الأحد",
-    "Monday": "الإثنين",
-    "Tuesday": "الثلاثاء",
-    "Wednesday": "الأربعاء",
-    "Thursday": "الخميس",
-    "Friday": "الجمعة",
-}
+LEAVE_TYPES = ["سنوية", "مرضية", "بدون راتب", "اضطرارية", "رسمية", "أخرى"]
 
+# عناوين وأعمدة تقارير PDF الثابتة — تُشكّل مرة واحدة مع تحميل الصفحة
+PDF_FIXED_LABELS = (
+    "م", "الموظف", "القسم", "الرقم الوظيفي", "عدد الإجازات", "إجمالي الأيام",
+    "الحالة", "المتبقي", "آخر إجازة", "نوع الإجازة", "من", "إلى", "عدد الأيام",
+    "المرفق", "ملاحظات", "اليوم", "التاريخ", "أول بصمة", "آخر بصمة",
+    "ساعات العمل", "التأخير", "الخروج المبكر", "الإضافي", "الغياب",
+    "الإجازات المعتمدة", "تقرير الإجازات", "لا توجد بيانات",
+    "🟢 طبيعي", "🟡 اقترب من الحد", "🔴 إنذار - تجاوز الحد",
+)
 
-EID_AL_ADHA_2026_START = pd.Timestamp("2026-05-26")
-EID_AL_ADHA_2026_END = pd.Timestamp("2026-05-30")
+warm_ar_cache([*WEEKDAY_AR.values(), *LEAVE_TYPES, *PDF_FIXED_LABELS])
 
 
 def exclude_eid_al_adha_absence(summary_df: pd.DataFrame, absence_df: pd.DataFrame):
@@ -841,56 +813,23 @@ def exclude_eid_al_adha_absence(summary_df: pd.DataFrame, absence_df: pd.DataFra
     return updated_summary, filtered_absence
 
 
-def weekday_to_ar(x: str) -> str:
-    s = safe_str(x)
-    return WEEKDAY_AR.get(s, s)
-
-
-AR_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]")
-
-
-def mm_to_hhmm(m: int) -> str:
-    m = int(m or 0)
-    sign = "-" if m < 0 else ""
-    m = abs(m)
-    return f"{sign}{m//60:02d}:{m%60:02d}"
-
-
-def mm_to_ar_hm(m: int) -> str:
-    m = int(m or 0)
-    sign = "-" if m < 0 else ""
-    m = abs(m)
-    h = m // 60
-    mm = m % 60
-    return f"{sign}{h} ساعة و {mm} دقيقة"
-
-
-def ensure_leaves_file():
-    if not os.path.exists(LEAVES_PATH):
-        cols = [
-            "leave_id", "employee_id", "employee_no", "name_ar", "name_en",
-            "department", "job_title", "leave_type", "start_date", "end_date",
-            "status", "attachment_name", "attachment_path", "notes",
-            "created_at", "created_by",
-        ]
-        pd.DataFrame(columns=cols).to_excel(LEAVES_PATH, index=False)
-
-
-def load_leaves() -> pd.DataFrame:
-    ensure_leaves_file()
-
+def ensure_leaves_store():
+    # الإجازات محفوظة في قاعدة البيانات (database.py)،
+    # وملف leaves.xlsx القديم يتم استيراده مرة واحدة فقط
+    ensure_db()
+    if get_meta("legacy_leaves_imported") or not os.path.exists(LEAVES_PATH):
+        return
     try:
-        df = pd.read_excel(LEAVES_PATH)
+        legacy = pd.read_excel(LEAVES_PATH)
     except Exception:
-        return pd.DataFrame()
+        legacy = pd.DataFrame()
+    import_leaves(legacy)
+    set_meta("legacy_leaves_imported", LEAVES_PATH)
+
 
+def normalize_leaves_df(df: pd.DataFrame | None) -> pd.DataFrame:
     if df is None or df.empty:
-        return pd.DataFrame(columns=[
-            "leave_id", "employee_id", "employee_no", "name_ar", "name_en",
-            "department", "job_title", "leave_type", "start_date", "end_date",
-            "status", "attachment_name", "attachment_path", "notes",
-            "created_at", "created_by",
-        ])
+        return pd.DataFrame(columns=LEAVE_COLUMNS)
 
     # 🔥 توحيد الأعمدة
     for c in [
@@ -909,16 +848,150 @@ def load_leaves() -> pd.DataFrame:
             df[c] = pd.to_datetime(df[c], errors="coerce").dt.normalize()
 
     return df
-   
 
 
-def save_leaves(df: pd.DataFrame):
-    ensure_leaves_file()
-    out = df.copy()
-    for c in ["start_date", "end_date"]:
-        if c in out.columns:
-            out[c] = pd.to_datetime(out[c], errors="coerce").dt.date
-    out.to_excel(LEAVES_PATH, index=False)
+@st.cache_data(show_spinner=False, max_entries=64)
+def _query_leaves_cached(version: int, employee_keys, date_from, date_to) -> pd.DataFrame:
+    # version غير مستخدم داخل الدالة، لكنه جزء من مفتاح الـ cache:
+    # أي كتابة على الإجازات تغيّره فيتم إعادة القراءة
+    df = query_leaves_db(employee_keys, date_from, date_to)
+    return normalize_leaves_df(df)
+
+
+def query_leaves(employee_keys=None, date_from=None, date_to=None) -> pd.DataFrame:
+    """
+    الإجازات المتقاطعة مع الفترة المحددة لموظف أو أكثر (بالرقم الوظيفي أو رقم الموظف)،
+    مرتبة من الأحدث للأقدم. الفلترة تتم في قاعدة البيانات باستخدام الفهرس،
+    والنتيجة محفوظة مؤقتًا حسب رقم إصدار بيانات الإجازات.
+    بدون أي فلتر تُرجع leaves_snapshot().
+    """
+    if employee_keys is None and date_from is None and date_to is None:
+        return leaves_snapshot()
+    ensure_leaves_store()
+    if employee_keys is not None and not isinstance(employee_keys, str):
+        employee_keys = tuple(sorted(str(k).strip() for k in employee_keys))
+    try:
+        return _query_leaves_cached(get_leaves_version(), employee_keys, date_from, date_to)
+    except Exception:
+        return pd.DataFrame()
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _leaves_snapshot(version: int) -> pd.DataFrame:
+    # نسخة واحدة من كل الإجازات لكل إصدار، مشتركة بين التبويبات والجلسات
+    # (cache_resource لا ينسخ النتيجة مع كل استدعاء بعكس cache_data)
+    return normalize_leaves_df(query_leaves_db(None, None, None))
+
+
+def leaves_snapshot() -> pd.DataFrame:
+    """
+    كل الإجازات كما هي في إصدار المخزن الحالي: تُقرأ مرة واحدة لكل إصدار.
+    كل استدعاء يأخذ نسخة سطحية — pandas>=3 (Copy-on-Write دائمًا، مثبّت في requirements.txt)
+    ينسخ العمود فقط عند تعديله، فتعديل الجدول في أي تبويب لا يغيّر الـ snapshot.
+    """
+    ensure_leaves_store()
+    try:
+        snapshot = _leaves_snapshot(get_leaves_version())
+    except Exception:
+        return pd.DataFrame()
+    return snapshot.copy(deep=False)
+
+
+def invalidate_leaves_snapshot():
+    """تُستدعى بعد أي كتابة على الإجازات (الإصدار يتغير أيضًا، لكن هذا يحرر النسخة القديمة فورًا)."""
+    _leaves_snapshot.clear()
+
+
+def load_leaves() -> pd.DataFrame:
+    return leaves_snapshot()
+
+
+# =========================
+# نتائج البصمة (cache)
+# =========================
+# أي تفاعل (السماح، وقت البداية، تبديل التبويبات، التحميل) يعيد تشغيل الصفحة كلها.
+# نتيجة process_attendance + استبعاد العيد محفوظة حسب (hash ملف البصمة، وقت البداية،
+# السماح، نسخة ملف الموظفين، نسخة الإجازات) — تغيير أي منها يعيد الحساب.
+ATTENDANCE_CACHE_MAX_ENTRIES = 16
+
+# "disk" للاحتفاظ بالنتائج بين إعادة تشغيل السيرفر (مجلد cache الخاص بـ Streamlit)؛ فارغ = الذاكرة فقط
+ATTENDANCE_CACHE_PERSIST = os.environ.get("ATTENDANCE_CACHE_PERSIST") or None
+
+
+def employees_version() -> str:
+    """نسخة ملف الموظفين (وقت التعديل + الحجم) — تتغير مع أي حفظ للملف."""
+    try:
+        info = os.stat(EMP_PATH)
+    except OSError:
+        return ""
+    return f"{info.st_mtime_ns}:{info.st_size}"
+
+
+@st.cache_resource
+def attendance_cache_stats() -> dict:
+    """عدادات cache نتائج البصمة (مشتركة بين كل الجلسات في نفس الـ process)."""
+    return {"hits": 0, "misses": 0}
+
+
+@st.cache_data(
+    max_entries=ATTENDANCE_CACHE_MAX_ENTRIES,
+    persist=ATTENDANCE_CACHE_PERSIST,
+    show_spinner=False,
+)
+def _attendance_cached(upload_digest: str, start_time: str, grace_minutes: int, employees_ver: str, leaves_ver: int, _uploaded_file, _employees_df):
+    # المعاملات التي تبدأ بـ _ لا تدخل في مفتاح الـ cache (الملف نفسه ممثل بالـ hash)
+    attendance_cache_stats()["misses"] += 1
+
+    summary, late, absence, exempt_report, approved_leave_days = process_attendance(
+        _uploaded_file,
+        start_time=start_time,
+        grace_minutes=grace_minutes,
+        schedule_mode="by_nationality",
+        employees_df=_employees_df,
+        daily_required_hours=9.0,
+        leaves_query=query_leaves,
+    )
+    summary, absence = exclude_eid_al_adha_absence(summary, absence)
+
+    return summary, late, absence, exempt_report, approved_leave_days
+
+
+def process_attendance_cached(uploaded_file, start_time: str, grace_minutes: int, employees_df):
+    """process_attendance مع cache للنتيجة (الجداول تُعاد كنسخ، تعديلها لا يؤثر على المحفوظ)."""
+    stats = attendance_cache_stats()
+    misses = stats["misses"]
+
+    result = _attendance_cached(
+        hashlib.md5(uploaded_file.getvalue()).hexdigest(),
+        start_time,
+        int(grace_minutes),
+        employees_version(),
+        get_leaves_version(),
+        uploaded_file,
+        employees_df,
+    )
+
+    if stats["misses"] == misses:
+        stats["hits"] += 1
+    return result
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _leave_day_totals_cached(version: int, date_from, date_to, leave_types) -> pd.DataFrame:
+    return leave_day_totals_db(date_from, date_to, leave_types)
+
+
+def leave_day_totals(date_from=None, date_to=None, leave_types=None) -> pd.DataFrame:
+    """
+    أيام الإجازات لكل (موظف، نوع) داخل الفترة من جدول الأيام الشهرية المجمعة في قاعدة البيانات.
+    """
+    ensure_leaves_store()
+    if leave_types is not None:
+        leave_types = tuple(leave_types)
+    try:
+        return _leave_day_totals_cached(get_leaves_version(), date_from, date_to, leave_types)
+    except Exception:
+        return pd.DataFrame(columns=["employee_id", "leave_type", "days"])
 
 
 def get_employee_lookup(employees_df: pd.DataFrame | None) -> pd.DataFrame:
@@ -955,6 +1028,39 @@ def get_employee_lookup(employees_df: pd.DataFrame | None) -> pd.DataFrame:
     return emp[["employee_id", "employee_no", "name_ar", "name_en", "department", "job_title"]].drop_duplicates()
 
 
+def get_employee_schedules(employees_df: pd.DataFrame | None, saturday_ids=None) -> pd.Series:
+    """
+    جدول العطلة الأسبوعية لكل موظف (employee_id → جمعة وسبت / جمعة فقط)
+    لاحتساب أيام العمل داخل الإجازات بنفس قاعدة تقرير الحضور (weekend_schedule).
+    saturday_ids: أرقام الموظفين الذين لهم بصمة يوم سبت؛ بدونها (لا يوجد ملف بصمة)
+    يُفترض أن غير السعودي يداوم السبت، فالجدول يعتمد على الجنسية فقط.
+    """
+    if employees_df is None or employees_df.empty:
+        return pd.Series(dtype=object)
+    emp = employees_df.rename(columns={
+        "Personnel Number": "employee_id",
+        "Employee ID": "employee_id",
+        "Emp ID": "employee_id",
+        "ID": "employee_id",
+        "Nationality": "nationality",
+        "الجنسية": "nationality",
+    })
+    if "employee_id" not in emp.columns:
+        return pd.Series(dtype=object)
+    if "nationality" not in emp.columns:
+        emp["nationality"] = ""
+    ids = emp["employee_id"].apply(fmt_id)
+    if saturday_ids is None:
+        has_saturday = pd.Series(True, index=emp.index)
+    else:
+        has_saturday = ids.isin({fmt_id(x) for x in saturday_ids})
+    schedules = pd.Series(
+        [schedule_for_nationality(n, s) for n, s in zip(emp["nationality"], has_saturday)],
+        index=ids,
+    )
+    return schedules[ids.to_numpy() != ""].groupby(level=0).first()
+
+
 def find_employee_record(employees_df: pd.DataFrame | None, selected_key: str):
     lookup = get_employee_lookup(employees_df)
     if lookup.empty or not selected_key:
@@ -982,9 +1088,38 @@ def save_leave_attachment(uploaded_file, employee_id: str, start_date, end_date)
 
 
 def add_leave_record(record: dict):
-    leaves = load_leaves()
-    leaves = pd.concat([leaves, pd.DataFrame([record])], ignore_index=True)
-    save_leaves(leaves)
+    ensure_leaves_store()
+    inserted = insert_leave(record)
+    invalidate_leaves_snapshot()
+    return inserted
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _leave_overlaps_audit_cached(version: int) -> pd.DataFrame:
+    return audit_leave_overlaps()
+
+
+def leave_overlaps_audit() -> pd.DataFrame:
+    ensure_leaves_store()
+    try:
+        return _leave_overlaps_audit_cached(get_leaves_version())
+    except Exception:
+        return pd.DataFrame()
+
+
+def overlaps_display_df(overlaps: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "الموظف": overlaps["employee_id"],
+        "الإجازة": overlaps["leave_id"],
+        "النوع": overlaps["leave_type"],
+        "من": overlaps["start_date"],
+        "إلى": overlaps["end_date"],
+        "تتداخل مع": overlaps["other_leave_id"],
+        "نوعها": overlaps["other_leave_type"],
+        "من ": overlaps["other_start_date"],
+        "إلى ": overlaps["other_end_date"],
+        "أيام التداخل": overlaps["overlap_days"],
+    })
 
 
 def filter_leaves(leaves_df: pd.DataFrame, employee_key: str = "", start_date=None, end_date=None) -> pd.DataFrame:
@@ -1001,573 +1136,469 @@ def filter_leaves(leaves_df: pd.DataFrame, employee_key: str = "", start_date=No
     return x.sort_values(["start_date", "end_date"], ascending=[False, False])
 
 
-def expand_leave_days(leaves_df: pd.DataFrame) -> pd.DataFrame:
-    rows = []
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def expand_leave_days(leaves_df: pd.DataFrame, columns: list | None = None) -> pd.DataFrame:
+    """
+    صف لكل يوم داخل كل إجازة (date / weekday / weekday_ar) بدون حلقات:
+    تكرار كل سجل بعدد أيامه ثم إضافة إزاحة الأيام.
+    columns (اختياري): أعمدة سجل الإجازة المطلوبة فقط في الناتج.
+    """
     if leaves_df is None or leaves_df.empty:
         return pd.DataFrame()
-    for _, r in leaves_df.iterrows():
-        s = pd.to_datetime(r.get("start_date"), errors="coerce")
-        e = pd.to_datetime(r.get("end_date"), errors="coerce")
-        if pd.isna(s) or pd.isna(e):
-            continue
-        for d in pd.date_range(s, e, freq="D"):
-            day_name = d.day_name()
-            rows.append({
-                **r.to_dict(),
-                "date": d.date(),
-                "weekday": day_name,
-                "weekday_ar": WEEKDAY_AR.get(day_name, day_name),
-            })
-    return pd.DataFrame(rows)
+    if "start_date" not in leaves_df.columns or "end_date" not in leaves_df.columns:
+        return pd.DataFrame()
+
+    s = pd.to_datetime(leaves_df["start_date"], errors="coerce").dt.normalize()
+    e = pd.to_datetime(leaves_df["end_date"], errors="coerce").dt.normalize()
+    n_days = ((e - s).dt.days + 1).fillna(0).clip(lower=0).astype(int).to_numpy()
+    if n_days.sum() == 0:
+        return pd.DataFrame()
 
+    src = leaves_df if columns is None else leaves_df[[c for c in columns if c in leaves_df.columns]]
 
-SICK_LEAVE_ANNUAL_QUOTA = 30  # عدد أيام الإجازة المرضية المسموح بها سنويًا لكل موظف
+    pos = np.repeat(np.arange(len(src)), n_days)
+    offsets = np.arange(len(pos)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+    days = pd.DatetimeIndex(s.to_numpy()[pos] + offsets.astype("timedelta64[D]"))
 
+    out = src.iloc[pos].reset_index(drop=True)
+    codes = days.dayofweek
+    out["date"] = days.date
+    out["weekday"] = pd.Categorical.from_codes(codes, categories=WEEKDAY_NAMES)
+    out["weekday_ar"] = pd.Categorical.from_codes(codes, categories=[WEEKDAY_AR[d] for d in WEEKDAY_NAMES])
+    return out
 
-def compute_sick_leave_summary(
+
+SICK_LEAVE_ROLLING_WINDOW = 365  # طول النافذة المتحركة (بالأيام) لاحتساب الحد السنوي
+
+
+def _merge_day_intervals(starts: np.ndarray, ends: np.ndarray):
+    """دمج فترات (أرقام أيام، النهاية شاملة) متداخلة/متلاصقة → بدايات ونهايات مرتبة منفصلة."""
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    new_block = np.r_[True, starts[1:] > reach[:-1] + 1]
+    return starts[new_block], np.maximum.reduceat(ends, np.flatnonzero(new_block))
+
+
+def _covered_upto(starts: np.ndarray, ends: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """عدد الأيام المغطاة بالفترات المدموجة حتى كل يوم في days (شاملًا)."""
+    lengths = ends - starts + 1
+    before = np.r_[0, np.cumsum(lengths)]
+    k = np.searchsorted(starts, days, side="right")
+    last = np.maximum(k - 1, 0)
+    partial = np.clip(days - starts[last] + 1, 0, lengths[last])
+    return np.where(k > 0, before[last] + partial, 0)
+
+
+def compute_sick_quota_timeline(
     leaves_df: pd.DataFrame,
-    date_from=None,
-    date_to=None,
+    quota: int = SICK_LEAVE_ANNUAL_QUOTA,
+    window: int = SICK_LEAVE_ROLLING_WINDOW,
+    as_of=None,
 ) -> pd.DataFrame:
     """
-    تجميع الإجازات المرضية لكل موظف ضمن فترة محددة: عدد الإجازات، إجمالي الأيام،
-    ومؤشر تجاوز الحد السنوي (30 يوم).
-    كل يوم إجازة يقع خارج الفترة المحددة يتم استبعاده (قص عند حدود الفترة).
+    الحد السنوي المتحرك للإجازات المرضية: لكل موظف ولكل يوم مجموع أيام الإجازة المرضية
+    خلال آخر window يوم. الرصيد المتحرك يتغير ميله فقط عند بداية/نهاية فترة أو بعدها
+    بـ window يوم، فيُحسب لكل موظف عند هذه النقاط فقط من فتراته المدموجة المرتبة
+    (بدون مصفوفة موظف × يوم على كامل التاريخ).
+    الناتج صف لكل موظف: أول تاريخ وصل فيه للحد (crossed_on)، أعلى رصيد وتاريخه،
+    والرصيد الحالي في as_of (افتراضيًا اليوم). اليوم المغطى بأكثر من سجل يُحتسب مرة واحدة.
     """
     if leaves_df is None or leaves_df.empty:
         return pd.DataFrame()
 
-    x = leaves_df.copy()
-    x["leave_type"] = x["leave_type"].apply(safe_str)
-    x = x[x["leave_type"].str.strip() == "مرضية"].copy()
+    x = leaves_df[leaves_df["leave_type"].apply(safe_str) == "مرضية"].copy()
+    x["start_date"] = pd.to_datetime(x["start_date"], errors="coerce").dt.normalize()
+    x["end_date"] = pd.to_datetime(x["end_date"], errors="coerce").dt.normalize()
+    x = x.dropna(subset=["start_date", "end_date"])
+    x = x[x["end_date"] >= x["start_date"]]
     if x.empty:
         return pd.DataFrame()
 
-    x["start_date"] = pd.to_datetime(x["start_date"], errors="coerce")
-    x["end_date"] = pd.to_datetime(x["end_date"], errors="coerce")
-    x = x.dropna(subset=["start_date", "end_date"]).copy()
-    if x.empty:
+    x["employee_id"] = x["employee_id"].apply(safe_str)
+    emp_codes, emp_ids = pd.factorize(x["employee_id"])
+
+    as_of = pd.Timestamp(as_of if as_of is not None else dt.date.today()).normalize()
+    origin = x["start_date"].min()
+    last_idx = (max(x["end_date"].max(), as_of) - origin).days
+    as_of_idx = (as_of - origin).days
+
+    s_idx = (x["start_date"] - origin).dt.days.to_numpy()
+    e_idx = (x["end_date"] - origin).dt.days.to_numpy()
+
+    n = len(emp_ids)
+    current = np.zeros(n, dtype=np.int64)
+    peak = np.zeros(n, dtype=np.int64)
+    peak_idx = np.zeros(n, dtype=np.int64)
+    cross_idx = np.full(n, -1, dtype=np.int64)
+
+    by_emp = np.argsort(emp_codes, kind="stable")
+    groups = np.split(by_emp, np.cumsum(np.bincount(emp_codes, minlength=n))[:-1])
+
+    for code, sel in enumerate(groups):
+        starts, ends = _merge_day_intervals(s_idx[sel], e_idx[sel])
+
+        def rolling(days):
+            return _covered_upto(starts, ends, days) - _covered_upto(starts, ends, days - window)
+
+        # نقاط تغيّر الميل وما قبلها: بينها الرصيد خطي، فالأعلى وأول عبور للحد عند هذه النقاط
+        breaks = np.concatenate([starts, ends + 1, starts + window, ends + 1 + window])
+        days = np.unique(np.clip(np.concatenate([breaks, breaks - 1, [0, last_idx]]), 0, last_idx))
+        values = rolling(days)
+
+        best = int(values.argmax())
+        peak[code], peak_idx[code] = values[best], days[best]
+        current[code] = rolling(np.array([as_of_idx]))[0] if as_of_idx >= 0 else 0
+
+        hit = np.flatnonzero(values >= quota)
+        if hit.size:
+            # الرصيد يزيد يومًا بيوم، فيوم العبور = نقطة العبور ناقص الزيادة عن الحد
+            cross_idx[code] = days[hit[0]] - (values[hit[0]] - quota)
+
+    day0 = origin.to_datetime64()
+    info = x.groupby("employee_id", sort=False)[["employee_no", "name_ar", "department"]].last()
+
+    out = pd.DataFrame({"employee_id": emp_ids})
+    out["employee_no"] = out["employee_id"].map(info["employee_no"]).apply(fmt_id)
+    out["name_ar"] = out["employee_id"].map(info["name_ar"]).apply(safe_str)
+    out["department"] = out["employee_id"].map(info["department"]).apply(safe_str)
+    out["current_days"] = current
+    out["remaining_days"] = (quota - out["current_days"]).clip(lower=0)
+    out["peak_days"] = peak
+    out["peak_date"] = pd.to_datetime(day0 + peak_idx.astype("timedelta64[D]"))
+    out["crossed_on"] = pd.to_datetime(
+        np.where(cross_idx >= 0, day0 + cross_idx.astype("timedelta64[D]"), np.datetime64("NaT"))
+    )
+
+    return out.sort_values(
+        ["crossed_on", "current_days"], ascending=[True, False], na_position="last"
+    ).reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _sick_quota_timeline_cached(version: int, as_of) -> pd.DataFrame:
+    return compute_sick_quota_timeline(_query_leaves_cached(version, None, None, None), as_of=as_of)
+
+
+def sick_quota_timeline(as_of=None) -> pd.DataFrame:
+    ensure_leaves_store()
+    try:
+        return _sick_quota_timeline_cached(get_leaves_version(), as_of or dt.date.today())
+    except Exception:
         return pd.DataFrame()
 
-    date_from = pd.to_datetime(date_from) if date_from is not None else None
-    date_to = pd.to_datetime(date_to) if date_to is not None else None
 
-    if date_from is not None:
-        x = x[x["end_date"] >= date_from].copy()
-    if date_to is not None:
-        x = x[x["start_date"] <= date_to].copy()
+def compute_department_occupancy(leaves_df: pd.DataFrame, date_from, date_to) -> pd.DataFrame:
+    """
+    عدد الموظفين في إجازة لكل (قسم × يوم) ضمن الفترة، بدون توسيع الإجازات يومًا بيوم:
+    دمج فترات كل موظف المتداخلة، ثم مصفوفة فروق لكل قسم (+1 يوم البداية، -1 بعد النهاية)
+    ومجموع تراكمي على أيام الفترة.
+    الناتج: صف لكل قسم وعمود لكل يوم.
+    """
+    date_from = pd.Timestamp(date_from).normalize()
+    date_to = pd.Timestamp(date_to).normalize()
+    days = pd.date_range(date_from, date_to, freq="D")
+    if leaves_df is None or leaves_df.empty or len(days) == 0:
+        return pd.DataFrame(columns=days)
+
+    x = pd.DataFrame({
+        "employee_id": leaves_df["employee_id"].apply(safe_str),
+        "department": leaves_df["department"].apply(safe_str).replace("", "غير محدد"),
+        "start_date": pd.to_datetime(leaves_df["start_date"], errors="coerce").dt.normalize().clip(lower=date_from),
+        "end_date": pd.to_datetime(leaves_df["end_date"], errors="coerce").dt.normalize().clip(upper=date_to),
+    }).dropna(subset=["start_date", "end_date"])
+    x = x[x["end_date"] >= x["start_date"]]
     if x.empty:
-        return pd.DataFrame()
+        return pd.DataFrame(columns=days)
+
+    # دمج فترات الموظف المتداخلة/المتلاصقة حتى لا يُحتسب الشخص مرتين في نفس اليوم
+    x = x.sort_values(["employee_id", "department", "start_date"], kind="stable")
+    run_end = x.groupby(["employee_id", "department"])["end_date"].cummax()
+    prev_end = run_end.groupby([x["employee_id"], x["department"]]).shift()
+    new_run = prev_end.isna() | (x["start_date"] > prev_end + pd.Timedelta(days=1))
+    x["run"] = new_run.cumsum()
+    merged = x.groupby("run").agg(
+        department=("department", "first"),
+        start_date=("start_date", "min"),
+        end_date=("end_date", "max"),
+    )
 
-    # قص كل سجل عند حدود الفترة المحددة قبل احتساب عدد الأيام
-    if date_from is not None:
-        x["start_date"] = x["start_date"].clip(lower=date_from)
-    if date_to is not None:
-        x["end_date"] = x["end_date"].clip(upper=date_to)
+    dept_codes, departments = pd.factorize(merged["department"], sort=True)
+    s_idx = (merged["start_date"] - date_from).dt.days.to_numpy()
+    e_idx = (merged["end_date"] - date_from).dt.days.to_numpy() + 1
 
-    x["days_count"] = (x["end_date"] - x["start_date"]).dt.days + 1
-    x["days_count"] = x["days_count"].clip(lower=1)
+    diff = np.zeros((len(departments), len(days) + 1), dtype=np.int32)
+    np.add.at(diff, (dept_codes, s_idx), 1)
+    np.add.at(diff, (dept_codes, e_idx), -1)
 
-    x["employee_id"] = x["employee_id"].apply(safe_str)
-    x["employee_no"] = x["employee_no"].apply(fmt_id)
-    x["name_ar"] = x["name_ar"].apply(safe_str)
-    x["department"] = x["department"].apply(safe_str)
+    return pd.DataFrame(np.cumsum(diff[:, :-1], axis=1), index=departments, columns=days)
 
-    grouped = x.groupby(
-        ["employee_id", "employee_no", "name_ar", "department"],
-        dropna=False,
-        as_index=False,
-    ).agg(
-        leave_count=("leave_id", "count"),
-        total_days=("days_count", "sum"),
-        last_leave_date=("end_date", "max"),
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _department_occupancy_cached(version: int, date_from, date_to) -> pd.DataFrame:
+    return compute_department_occupancy(
+        _query_leaves_cached(version, None, date_from, date_to), date_from, date_to
     )
 
-    def _status(days):
-        if days >= SICK_LEAVE_ANNUAL_QUOTA:
-            return "🔴 إنذار - تجاوز الحد"
-        if days >= SICK_LEAVE_ANNUAL_QUOTA * 0.7:
-            return "🟡 اقترب من الحد"
-        return "🟢 طبيعي"
 
-    grouped["status"] = grouped["total_days"].apply(_status)
-    grouped["remaining_days"] = (SICK_LEAVE_ANNUAL_QUOTA - grouped["total_days"]).clip(lower=0)
-    grouped["exceeded_days"] = (grouped["total_days"] - SICK_LEAVE_ANNUAL_QUOTA).clip(lower=0)
+def department_occupancy(date_from, date_to) -> pd.DataFrame:
+    ensure_leaves_store()
+    try:
+        return _department_occupancy_cached(get_leaves_version(), date_from, date_to)
+    except Exception:
+        return pd.DataFrame()
 
-    grouped = grouped.sort_values(
-        ["total_days", "leave_count"], ascending=[False, False]
-    ).reset_index(drop=True)
-    grouped.insert(0, "rank", grouped.index + 1)
 
-    return grouped
+LEAVE_ANALYTICS_KEYS = ["employee_id", "employee_no", "name_ar", "department"]
 
 
-def compute_all_leave_summary(
+def compute_leave_analytics(
     leaves_df: pd.DataFrame,
     date_from=None,
     date_to=None,
+    day_totals: pd.DataFrame | None = None,
+    schedules: pd.Series | None = None,
 ) -> pd.DataFrame:
     """
-    تجميع كل الإجازات (كل الأنواع) لكل موظف ضمن فترة محددة:
-    عدد الإجازات، إجمالي الأيام، وآخر إجازة.
-    كل يوم إجازة يقع خارج الفترة المحددة يتم استبعاده (قص عند حدود الفترة).
+    نواة تحليلات الإجازات: تنظيف السجلات وقصّها عند حدود الفترة مرة واحدة،
+    ثم تجميع متعدد المقاييس لكل موظف في مرور واحد:
+    - كل الأنواع: عدد الإجازات، إجمالي الأيام، آخر إجازة ونوعها، أيام كل نوع.
+    - المرضية فقط: sick_count / sick_days / sick_last_date وحالة الحد السنوي.
+    ملخص الإجازات المرضية وملخص الإجازات الشامل (والـ PDF الخاص بكل منهما) يُشتقان منها.
+    day_totals (اختياري): أيام الإجازات لكل (موظف، نوع) من leave_day_totals — مصدر
+    total_days / sick_days / أيام كل نوع بدل احتسابها من السجلات.
+    schedules (اختياري): جدول العطلة لكل موظف من get_employee_schedules؛ يُستخدم لاحتساب
+    work_days / sick_work_days (أيام العمل فقط بعد استبعاد العطلة الأسبوعية والإجازات الرسمية).
     """
     if leaves_df is None or leaves_df.empty:
         return pd.DataFrame()
 
+    keys = LEAVE_ANALYTICS_KEYS
+
     x = leaves_df.copy()
     x["leave_type"] = x["leave_type"].apply(safe_str)
 
     x["start_date"] = pd.to_datetime(x["start_date"], errors="coerce")
     x["end_date"] = pd.to_datetime(x["end_date"], errors="coerce")
-    x = x.dropna(subset=["start_date", "end_date"]).copy()
-    if x.empty:
-        return pd.DataFrame()
+    x = x.dropna(subset=["start_date", "end_date"])
 
     date_from = pd.to_datetime(date_from) if date_from is not None else None
     date_to = pd.to_datetime(date_to) if date_to is not None else None
 
     if date_from is not None:
-        x = x[x["end_date"] >= date_from].copy()
+        x = x[x["end_date"] >= date_from]
     if date_to is not None:
-        x = x[x["start_date"] <= date_to].copy()
+        x = x[x["start_date"] <= date_to]
     if x.empty:
         return pd.DataFrame()
 
+    x = x.reset_index(drop=True)
+
     # قص كل سجل عند حدود الفترة المحددة قبل احتساب عدد الأيام
     if date_from is not None:
         x["start_date"] = x["start_date"].clip(lower=date_from)
     if date_to is not None:
         x["end_date"] = x["end_date"].clip(upper=date_to)
 
-    x["days_count"] = (x["end_date"] - x["start_date"]).dt.days + 1
-    x["days_count"] = x["days_count"].clip(lower=1)
-
     x["employee_id"] = x["employee_id"].apply(safe_str)
     x["employee_no"] = x["employee_no"].apply(fmt_id)
     x["name_ar"] = x["name_ar"].apply(safe_str)
     x["department"] = x["department"].apply(safe_str)
 
-    grouped = x.groupby(
-        ["employee_id", "employee_no", "name_ar", "department"],
-        dropna=False,
-        as_index=False,
-    ).agg(
+    # أيام الإجازات من leave_month_totals (day_totals) لكل موظف له مجموعة واحدة؛
+    # من السجلات فقط للموظف الذي يظهر في أكثر من مجموعة (اختلاف الاسم/القسم بين السجلات)
+    # أو بدون day_totals. السجلات تبقى مصدر عدد الإجازات وآخر إجازة وأيام العمل.
+    from_totals = pd.Series(False, index=x.index)
+    if day_totals is not None:
+        groups_per_emp = x.drop_duplicates(keys).groupby("employee_id").size()
+        from_totals = x["employee_id"].map(groups_per_emp) == 1
+
+    # السجل الذي نهايته قبل بدايته = 0 يوم (مثل leave_month_totals و leave_day_totals_db)
+    row_days = x.loc[~from_totals]
+    x["days_count"] = 0
+    x.loc[~from_totals, "days_count"] = ((row_days["end_date"] - row_days["start_date"]).dt.days + 1).clip(lower=0)
+
+    # أيام العمل داخل كل إجازة (مثل احتساب تقرير الحضور) — دفعة واحدة بدون توسيع الأيام
+    x["work_days"] = count_workdays(
+        x["start_date"],
+        x["end_date"],
+        x["employee_id"].map(schedules) if schedules is not None else None,
+    )
+
+    is_sick = x["leave_type"] == "مرضية"
+    x["sick_flag"] = is_sick.astype(int)
+    x["sick_work_days"] = x["work_days"].where(is_sick, 0)
+    x["sick_end"] = x["end_date"].where(is_sick)
+
+    grouped = x.groupby(keys, dropna=False, as_index=False).agg(
         leave_count=("leave_id", "count"),
-        total_days=("days_count", "sum"),
+        work_days=("work_days", "sum"),
         last_leave_date=("end_date", "max"),
+        sick_count=("sick_flag", "sum"),
+        sick_work_days=("sick_work_days", "sum"),
+        sick_last_date=("sick_end", "max"),
     )
 
-    # نوع آخر إجازة لكل موظف (بعد ترتيب السجلات بالتاريخ)
-    last_type_df = (
-        x.sort_values("end_date")
-        .groupby(["employee_id", "employee_no", "name_ar", "department"], dropna=False)
-        .tail(1)[["employee_id", "employee_no", "name_ar", "department", "leave_type"]]
-        .rename(columns={"leave_type": "آخر_نوع_إجازة"})
-    )
-    grouped = grouped.merge(
-        last_type_df, on=["employee_id", "employee_no", "name_ar", "department"], how="left"
-    )
+    # نوع آخر إجازة لكل موظف (السجل صاحب أحدث تاريخ نهاية، والأحدث إدخالًا عند التساوي)
+    last_row = x.iloc[::-1].groupby(keys, dropna=False)["end_date"].idxmax()
+    grouped["آخر_نوع_إجازة"] = x["leave_type"].to_numpy()[last_row.to_numpy()]
 
     # عدد أيام كل نوع إجازة على حدة (سنوية / مرضية / بدون راتب / ...) لكل موظف
-    by_type = (
-        x.groupby(["employee_id", "employee_no", "name_ar", "department", "leave_type"], dropna=False)["days_count"]
-        .sum()
-        .reset_index()
-    )
-    breakdown_map = {}
-    for (eid, eno, nm, dep), g in by_type.groupby(["employee_id", "employee_no", "name_ar", "department"]):
-        parts = [f"{safe_str(t)}: {int(d)}" for t, d in zip(g["leave_type"], g["days_count"])]
-        breakdown_map[(eid, eno, nm, dep)] = " | ".join(parts)
-
-    grouped["نوع_الإجازات_تفصيلي"] = grouped.apply(
-        lambda r: breakdown_map.get((r["employee_id"], r["employee_no"], r["name_ar"], r["department"]), ""),
-        axis=1,
+    by_type = x.loc[~from_totals, keys + ["leave_type", "days_count"]]
+    if from_totals.any():
+        totals = day_totals.rename(columns={"days": "days_count"})
+        totals = totals.assign(
+            employee_id=totals["employee_id"].apply(safe_str),
+            leave_type=totals["leave_type"].apply(safe_str),
+        )
+        single = grouped["employee_id"].isin(set(x.loc[from_totals, "employee_id"]))
+        by_type = pd.concat([
+            by_type,
+            totals.merge(grouped.loc[single, keys], on="employee_id", how="inner")[keys + ["leave_type", "days_count"]],
+        ], ignore_index=True)
+
+    # جدول واحد: صف لكل موظف وعمود رقمي لكل نوع إجازة (أيام_<النوع>)
+    per_type = by_type.pivot_table(
+        index=keys,
+        columns="leave_type",
+        values="days_count",
+        aggfunc="sum",
+        fill_value=0,
     )
+    leave_types = list(per_type.columns)
+    per_type.columns = [f"أيام_{t}" for t in leave_types]
+    grouped = grouped.merge(per_type.reset_index(), on=keys, how="left")
+
+    type_cols = list(per_type.columns)
+    grouped[type_cols] = grouped[type_cols].fillna(0).astype(int)
+    grouped["total_days"] = grouped[type_cols].sum(axis=1).astype(int)
+    grouped["sick_days"] = grouped["أيام_مرضية"] if "أيام_مرضية" in grouped.columns else 0
+
+    # النص التفصيلي "سنوية: 5 | مرضية: 2" من الأعمدة الرقمية
+    breakdown = pd.Series("", index=grouped.index, dtype=object)
+    for t, c in zip(leave_types, type_cols):
+        days = grouped[c]
+        part = (f"{t}: " + days.astype(str)).where(days > 0, "")
+        sep = pd.Series(" | ", index=grouped.index).where((breakdown != "") & (part != ""), "")
+        breakdown = breakdown + sep + part
+    grouped["نوع_الإجازات_تفصيلي"] = breakdown
+
+    # حالة الحد السنوي للإجازات المرضية
+    sick_days = grouped["sick_days"]
+    grouped["sick_status"] = "🟢 طبيعي"
+    grouped.loc[sick_days >= SICK_LEAVE_ANNUAL_QUOTA * 0.7, "sick_status"] = "🟡 اقترب من الحد"
+    grouped.loc[sick_days >= SICK_LEAVE_ANNUAL_QUOTA, "sick_status"] = "🔴 إنذار - تجاوز الحد"
+    grouped["sick_remaining_days"] = (SICK_LEAVE_ANNUAL_QUOTA - sick_days).clip(lower=0)
+    grouped["sick_exceeded_days"] = (sick_days - SICK_LEAVE_ANNUAL_QUOTA).clip(lower=0)
+
+    return grouped
+
 
+def _rank_summary(grouped: pd.DataFrame) -> pd.DataFrame:
     grouped = grouped.sort_values(
         ["total_days", "leave_count"], ascending=[False, False]
     ).reset_index(drop=True)
     grouped.insert(0, "rank", grouped.index + 1)
-
     return grouped
 
 
-def build_pdf(emp_row, late_emp: pd.DataFrame, abs_emp: pd.DataFrame, leave_emp: pd.DataFrame | None = None, lang: str = "ar") -> bytes:
-    FONT_EN = "Helvetica"
-    FONT_AR_NAME = "AR"
-
-    if not os.path.exists(FONT_PATH):
-        raise FileNotFoundError(f"Arabic font not found: {FONT_PATH}")
-    try:
-        pdfmetrics.registerFont(TTFont(FONT_AR_NAME, FONT_PATH))
-    except Exception:
-        pass
+def compute_sick_leave_summary(
+    leaves_df: pd.DataFrame | None = None,
+    date_from=None,
+    date_to=None,
+    day_totals: pd.DataFrame | None = None,
+    analytics: pd.DataFrame | None = None,
+    schedules: pd.Series | None = None,
+) -> pd.DataFrame:
+    """
+    تجميع الإجازات المرضية لكل موظف ضمن فترة محددة: عدد الإجازات، إجمالي الأيام،
+    ومؤشر تجاوز الحد السنوي (30 يوم).
+    كل يوم إجازة يقع خارج الفترة المحددة يتم استبعاده (قص عند حدود الفترة).
+    analytics (اختياري): ناتج compute_leave_analytics / leave_analytics لنفس الفترة.
+    """
+    if analytics is None:
+        analytics = compute_leave_analytics(leaves_df, date_from, date_to, day_totals, schedules)
+    if analytics is None or analytics.empty:
+        return pd.DataFrame()
 
-    font_main = FONT_AR_NAME if lang == "ar" else FONT_EN
+    x = analytics[analytics["sick_count"] > 0]
+    if x.empty:
+        return pd.DataFrame()
 
-    align_text = 2 if lang == "ar" else 0
-    align_head = 2 if lang == "ar" else 0
+    grouped = x[LEAVE_ANALYTICS_KEYS].copy()
+    grouped["leave_count"] = x["sick_count"].astype(int)
+    grouped["total_days"] = x["sick_days"].astype(int)
+    grouped["work_days"] = x["sick_work_days"].astype(int)
+    grouped["last_leave_date"] = x["sick_last_date"]
+    grouped["status"] = x["sick_status"]
+    grouped["remaining_days"] = x["sick_remaining_days"]
+    grouped["exceeded_days"] = x["sick_exceeded_days"]
 
-    def txt(x):
-        s = safe_str(x)
-        return ar(s) if lang == "ar" else s
+    return _rank_summary(grouped)
 
-    styles = getSampleStyleSheet()
 
-    title_style = ParagraphStyle("title", parent=styles["Title"], fontName=font_main, fontSize=15, alignment=1)
-    name_style = ParagraphStyle("name", parent=styles["BodyText"], fontName=font_main, fontSize=12, alignment=1, leading=16)
+def compute_all_leave_summary(
+    leaves_df: pd.DataFrame | None = None,
+    date_from=None,
+    date_to=None,
+    day_totals: pd.DataFrame | None = None,
+    analytics: pd.DataFrame | None = None,
+    schedules: pd.Series | None = None,
+) -> pd.DataFrame:
+    """
+    تجميع كل الإجازات (كل الأنواع) لكل موظف ضمن فترة محددة:
+    عدد الإجازات، إجمالي الأيام، وآخر إجازة.
+    كل يوم إجازة يقع خارج الفترة المحددة يتم استبعاده (قص عند حدود الفترة).
+    analytics (اختياري): ناتج compute_leave_analytics / leave_analytics لنفس الفترة.
+    """
+    if analytics is None:
+        analytics = compute_leave_analytics(leaves_df, date_from, date_to, day_totals, schedules)
+    if analytics is None or analytics.empty:
+        return pd.DataFrame()
 
-    info_font = font_main if lang == "ar" else FONT_EN
-    info_style = ParagraphStyle(
-        "info",
-        parent=styles["BodyText"],
-        fontName=info_font,
-        fontSize=10,
-        alignment=1,
-        textColor=colors.grey,
-        leading=14,
-    )
+    grouped = analytics[
+        LEAVE_ANALYTICS_KEYS
+        + ["leave_count", "total_days", "work_days", "last_leave_date", "آخر_نوع_إجازة"]
+        + [c for c in analytics.columns if c.startswith("أيام_")]
+        + ["نوع_الإجازات_تفصيلي"]
+    ].copy()
 
-    note_style = ParagraphStyle(
-        "note",
-        parent=styles["BodyText"],
-        fontName=font_main if lang == "ar" else FONT_EN,
-        fontSize=10,
-        alignment=2 if lang == "ar" else 0,
-        textColor=colors.HexColor("#8B5CF6"),
-        leading=14,
-        spaceBefore=6,
-        spaceAfter=6,
-    )
+    return _rank_summary(grouped)
 
-    h_style = ParagraphStyle("h", parent=title_style, fontName=font_main, fontSize=12, alignment=align_head, spaceAfter=6)
-    p_style = ParagraphStyle("p", parent=styles["BodyText"], fontName=font_main, fontSize=10.5, alignment=align_text, leading=15)
-    total_style = ParagraphStyle("total", parent=p_style, fontName=font_main, fontSize=12.0, alignment=align_text, leading=18)
 
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=1.0 * cm,
-        rightMargin=1.0 * cm,
-        topMargin=1.0 * cm,
-        bottomMargin=1.0 * cm,
+@st.cache_data(show_spinner=False, max_entries=16)
+def _leave_analytics_cached(version: int, date_from, date_to, schedules) -> pd.DataFrame:
+    return compute_leave_analytics(
+        _query_leaves_cached(version, None, date_from, date_to),
+        date_from,
+        date_to,
+        _leave_day_totals_cached(version, date_from, date_to, None),
+        schedules,
     )
 
-    name_ar_ = safe_str(emp_row.get("name_ar", ""))
-    name_en_ = safe_str(emp_row.get("name_en", ""))
-    nat = safe_str(emp_row.get("nationality", emp_row.get("nationality_raw", "")))
-    emp_no = fmt_id(emp_row.get("employee_no", ""))
-    dept = safe_str(emp_row.get("department", ""))
-    job = safe_str(emp_row.get("job_title", ""))
-
-    title = month_year_title(emp_row) if lang == "ar" else month_year_title_en(emp_row)
-    attendance_rule = safe_str(emp_row.get("attendance_calculation", "")).strip().lower()
-
-    if lang == "ar":
-        info_parts = []
-        if emp_no:
-            info_parts.append(f"الكود/الرقم: {emp_no}")
-        if job:
-            info_parts.append(f"الوظيفة: {job}")
-        if dept:
-            info_parts.append(f"الإدارة: {dept}")
-        if nat:
-            info_parts.append(f"الجنسية: {nat}")
-        info_line = ar(" | ".join(info_parts))
-    else:
-        parts = []
-        if emp_no:
-            parts.append(escape(f"Employee No: {emp_no}"))
-        if job:
-            parts.append(f"Job Title: <font name='AR'>{ar(job)}</font>" if AR_CHARS.search(job) else escape(f"Job Title: {job}"))
-        if dept:
-            parts.append(f"Department: <font name='AR'>{ar(dept)}</font>" if AR_CHARS.search(dept) else escape(f"Department: {dept}"))
-        if nat:
-            parts.append(f"Nationality: <font name='AR'>{ar(nat)}</font>" if AR_CHARS.search(nat) else escape(f"Nationality: {nat}"))
-        info_line = " | ".join(parts)
-
-    def on_first_page(canvas, _doc):
-        canvas.saveState()
-        W, H = A4
-        if os.path.exists(LOGO_PATH):
-            try:
-                img = ImageReader(LOGO_PATH)
-                w = 3.0 * cm
-                h = 1.4 * cm
-                x = W - _doc.rightMargin - w
-                y = H - _doc.topMargin - h + 0.2 * cm
-                canvas.drawImage(img, x, y, width=w, height=h, mask="auto")
-            except Exception:
-                pass
-        canvas.restoreState()
-
-    def fmt_time(x):
-        try:
-            tt = pd.to_datetime(str(x), errors="coerce")
-            return "" if pd.isna(tt) else tt.strftime("%H:%M")
-        except Exception:
-            return ""
 
-    def rtl_row(row):
-        return list(reversed(row)) if lang == "ar" else row
+def leave_analytics(date_from=None, date_to=None, schedules: pd.Series | None = None) -> pd.DataFrame:
+    """
+    تحليلات الإجازات لكل موظف ضمن الفترة (compute_leave_analytics)،
+    محفوظة مؤقتًا حسب (رقم إصدار بيانات الإجازات، الفترة) ومشتركة بين التبويبات.
+    """
+    ensure_leaves_store()
+    try:
+        return _leave_analytics_cached(get_leaves_version(), date_from, date_to, schedules)
+    except Exception:
+        return pd.DataFrame()
 
-    def rtl_cols(widths):
-        return list(reversed(widths)) if lang == "ar" else widths
 
-    if lang == "ar":
-        name_line = f"{name_ar_} — {name_en_}" if name_en_ else name_ar_
-        name_paragraph = Paragraph(ar(name_line), name_style)
-    else:
-        en_part = escape(name_en_ or "")
-        ar_part = ar(name_ar_) if name_ar_ else ""
-        if en_part and ar_part:
-            mixed = f"{en_part} — <font name='AR'>{ar_part}</font>"
-        elif en_part:
-            mixed = en_part
-        else:
-            mixed = f"<font name='AR'>{ar_part}</font>"
-        name_paragraph = Paragraph(mixed, name_style)
-
-    story = []
-    story.append(Paragraph(txt(title), title_style))
-    story.append(name_paragraph)
-    story.append(Paragraph(info_line, info_style))
-    story.append(Spacer(1, 6))
-
-    if attendance_rule == "daily_hours":
-        if lang == "ar":
-            note = "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام، والإضافي بعد نهاية الدوام."
-            story.append(Paragraph(ar(note), note_style))
-        else:
-            note = "📝 Note: Late is calculated after shift start with grace, early leave before shift end, and overtime after shift end."
-            story.append(Paragraph(note, note_style))
-    else:
-        if lang == "ar":
-            note = "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام المحددة."
-            story.append(Paragraph(ar(note), note_style))
-        else:
-            note = "📝 Note: Late is calculated after shift start with grace, and early leave before official shift end."
-            story.append(Paragraph(note, note_style))
+from reportlab.platypus import Image as RLImage
 
-    story.append(HRFlowable(width="100%", thickness=0.6, color=colors.lightgrey))
-    story.append(Spacer(1, 8))
-
-    section_title = "التأخير والخروج المبكر والإضافي" if lang == "ar" else "Late / Early Leave / Overtime"
-    story.append(Paragraph(txt(section_title), h_style))
-
-    if late_emp is None or late_emp.empty:
-        story.append(Paragraph(txt(t("لا يوجد بيانات", "No records", lang)), p_style))
-    else:
-        le = late_emp.copy()
-        if "date" in le.columns:
-            le = le.sort_values("date")
-            le["date"] = le["date"].apply(fmt_date)
-
-        if "worked_minutes" not in le.columns:
-            le["worked_minutes"] = 0
-        if "overtime_minutes" not in le.columns:
-            le["overtime_minutes"] = 0
-        if "early_leave_minutes" not in le.columns:
-            le["early_leave_minutes"] = 0
-
-        if attendance_rule == "daily_hours":
-            rows = [rtl_row([
-                txt(t("اليوم", "Day", lang)),
-                txt(t("التاريخ", "Date", lang)),
-                txt(t("أول بصمة", "First In", lang)),
-                txt(t("آخر بصمة", "Last Out", lang)),
-                txt(t("ساعات العمل", "Worked", lang)),
-                txt(t("التأخير", "Late", lang)),
-                txt(t("الخروج المبكر", "Early Leave", lang)),
-                txt(t("الإضافي", "Overtime", lang)),
-            ])]
-
-            for _, r in le.iterrows():
-                day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
-                row = [
-                    txt(day_val),
-                    txt(safe_str(r.get("date", ""))),
-                    txt(fmt_time(r.get("first_punch_time", ""))),
-                    txt(fmt_time(r.get("last_punch_time", ""))),
-                    txt(mm_to_hhmm(int(r.get("worked_minutes", 0) or 0))),
-                    txt(mm_to_hhmm(int(r.get("late_minutes", 0) or 0))),
-                    txt(mm_to_hhmm(int(r.get("early_leave_minutes", 0) or 0))),
-                    txt(mm_to_hhmm(int(r.get("overtime_minutes", 0) or 0))),
-                ]
-                rows.append(rtl_row(row))
-
-            widths = rtl_cols([2.2*cm, 2.7*cm, 2.2*cm, 2.2*cm, 2.6*cm, 2.2*cm, 2.6*cm, 2.2*cm])
-            t1 = Table(rows, colWidths=widths)
-        else:
-            rows = [rtl_row([
-                txt(t("اليوم", "Day", lang)),
-                txt(t("التاريخ", "Date", lang)),
-                txt(t("أول بصمة", "First Punch", lang)),
-                txt(t("آخر بصمة", "Last Punch", lang)),
-                txt(t("التأخير", "Late", lang)),
-                txt(t("الخروج المبكر", "Early Leave", lang)),
-            ])]
-
-            for _, r in le.iterrows():
-                day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
-                row = [
-                    txt(day_val),
-                    txt(safe_str(r.get("date", ""))),
-                    txt(fmt_time(r.get("first_punch_time", ""))),
-                    txt(fmt_time(r.get("last_punch_time", ""))),
-                    txt(mm_to_hhmm(int(r.get("late_minutes", 0) or 0))),
-                    txt(mm_to_hhmm(int(r.get("early_leave_minutes", 0) or 0))),
-                ]
-                rows.append(rtl_row(row))
-
-            widths = rtl_cols([3.0*cm, 3.2*cm, 2.8*cm, 2.8*cm, 2.8*cm, 3.0*cm])
-            t1 = Table(rows, colWidths=widths)
-
-        t1.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, -1), font_main),
-            ("FONTSIZE", (0, 0), (-1, 0), 10.0),
-            ("FONTSIZE", (0, 1), (-1, -1), 9.2),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ]))
-        story.append(t1)
-        story.append(Spacer(1, 8))
-
-        total_late = int(emp_row.get("total_late_minutes", 0) or 0)
-        total_early_leave = int(emp_row.get("total_early_leave_minutes", 0) or 0)
-        total_overtime = int(emp_row.get("total_overtime_minutes", 0) or 0)
-        total_deduction = total_late + total_early_leave
-
-        if lang == "ar":
-            story.append(Paragraph(ar(f"⏱ إجمالي التأخير: {mm_to_ar_hm(total_late)}"), total_style))
-            story.append(Paragraph(ar(f"🚪 إجمالي الخروج المبكر: {mm_to_ar_hm(total_early_leave)}"), total_style))
-
-            if attendance_rule == "daily_hours":
-                story.append(Paragraph(ar(f"⬆️ إجمالي الإضافي: {mm_to_ar_hm(total_overtime)}"), total_style))
-                net_minutes = total_overtime - total_deduction
-                if net_minutes > 0:
-                    net_line = f"✅ الصافي النهائي: إضافي {mm_to_ar_hm(net_minutes)}"
-                elif net_minutes < 0:
-                    net_line = f"❌ الصافي النهائي: عجز {mm_to_ar_hm(net_minutes)}"
-                else:
-                    net_line = "➖ الصافي النهائي: متعادل (0 دقيقة)"
-                story.append(Paragraph(ar(net_line), total_style))
-            else:
-                story.append(Paragraph(ar(f"📌 إجمالي التأخير + الخروج المبكر: {mm_to_ar_hm(total_deduction)}"), total_style))
-        else:
-            story.append(Paragraph(f"Total Late: {mm_to_hhmm(total_late)}", total_style))
-            story.append(Paragraph(f"Total Early Leave: {mm_to_hhmm(total_early_leave)}", total_style))
-            if attendance_rule == "daily_hours":
-                story.append(Paragraph(f"Total Overtime: {mm_to_hhmm(total_overtime)}", total_style))
-                net_minutes = total_overtime - total_deduction
-                if net_minutes > 0:
-                    net_line = f"Final Net: Overtime {mm_to_hhmm(net_minutes)}"
-                elif net_minutes < 0:
-                    net_line = f"Final Net: Deficit {mm_to_hhmm(net_minutes)}"
-                else:
-                    net_line = "Final Net: Balanced (0m)"
-                story.append(Paragraph(net_line, total_style))
-            else:
-                story.append(Paragraph(f"Total Late + Early Leave: {mm_to_hhmm(total_deduction)}", total_style))
-
-    story.append(Spacer(1, 12))
-
-    story.append(Paragraph(txt(t("الغياب", "Absence", lang)), h_style))
-    if abs_emp is None or abs_emp.empty:
-        story.append(Paragraph(txt(t("لا يوجد غياب", "No absence records", lang)), p_style))
-    else:
-        ae = abs_emp.copy().sort_values("date") if "date" in abs_emp.columns else abs_emp.copy()
-        if "date" in ae.columns:
-            ae["date"] = ae["date"].apply(fmt_date)
-
-        rows2 = [rtl_row([
-            txt(t("اليوم", "Day", lang)),
-            txt(t("التاريخ", "Date", lang)),
-        ])]
-
-        for _, r in ae.iterrows():
-            day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
-            row = [txt(day_val), txt(safe_str(r.get("date", "")))]
-            rows2.append(rtl_row(row))
-
-        t2 = Table(rows2, colWidths=rtl_cols([6.0 * cm, 9.5 * cm]))
-        t2.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, -1), font_main),
-            ("FONTSIZE", (0, 0), (-1, 0), 11),
-            ("FONTSIZE", (0, 1), (-1, -1), 10),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ]))
-        story.append(t2)
-        story.append(Spacer(1, 6))
-
-        absent_days = int(emp_row.get("absent_days", 0) or 0)
-        story.append(Paragraph(txt(t(f"🚫 عدد أيام الغياب: {absent_days}", f"🚫 Total Absent Days: {absent_days}", lang)), total_style))
-
-    story.append(Spacer(1, 12))
-    story.append(Paragraph(txt(t("الإجازات المعتمدة", "Approved Leaves", lang)), h_style))
-    if leave_emp is None or leave_emp.empty:
-        story.append(Paragraph(txt(t("لا توجد إجازات معتمدة", "No approved leaves", lang)), p_style))
-    else:
-        lv = leave_emp.copy().sort_values("date") if "date" in leave_emp.columns else leave_emp.copy()
-        if "date" in lv.columns:
-            lv["date"] = lv["date"].apply(fmt_date)
-        rows3 = [rtl_row([
-            txt(t("اليوم", "Day", lang)),
-            txt(t("التاريخ", "Date", lang)),
-            txt(t("نوع الإجازة", "Leave Type", lang)),
-        ])]
-        for _, r in lv.iterrows():
-            day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
-            rows3.append(rtl_row([
-                txt(day_val),
-                txt(safe_str(r.get("date", ""))),
-                txt(safe_str(r.get("leave_type", "إجازة"))),
-            ]))
-        t3 = Table(rows3, colWidths=rtl_cols([4.5 * cm, 4.5 * cm, 6.5 * cm]))
-        t3.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, -1), font_main),
-            ("FONTSIZE", (0, 0), (-1, 0), 11),
-            ("FONTSIZE", (0, 1), (-1, -1), 10),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ]))
-        story.append(t3)
-        story.append(Spacer(1, 6))
-        leave_days = int(emp_row.get("approved_leave_days", len(lv)) or 0)
-        story.append(Paragraph(txt(t(f"🏖️ عدد أيام الإجازات المعتمدة: {leave_days}", f"🏖️ Total Approved Leave Days: {leave_days}", lang)), total_style))
-
-    doc.build(story, onFirstPage=on_first_page)
-    return buf.getvalue()
-
-
-
-
-
-
-
-from reportlab.platypus import Image as RLImage
-
-# =========================
-# دالة المرفقات (زر فقط)
-# =========================
-def show_leave_attachments(row):
-    path = safe_str(row.get("attachment_path", ""))
-    name = safe_str(row.get("attachment_name", ""))
+# =========================
+# دالة المرفقات (زر فقط)
+# =========================
+def show_leave_attachments(row):
+    path = safe_str(row.get("attachment_path", ""))
+    name = safe_str(row.get("attachment_name", ""))
 
     if not path or not os.path.exists(path):
         return "—"
@@ -1583,75 +1614,13 @@ def show_leave_attachments(row):
 
 
 
-# =========================
-# PDF (بدون عرض مرفقات)
-# =========================
-def build_leaves_pdf(leaves_df):
-    buf = BytesIO()
-
-    FONT_PATH = os.path.join("fonts", "Amiri-Regular.ttf")
-    FONT_NAME = "AR"
-    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
-
-    doc = SimpleDocTemplate(buf, pagesize=A4)
-    styles = getSampleStyleSheet()
-
-    normal_style = ParagraphStyle(
-        "arabic_normal",
-        parent=styles["Normal"],
-        fontName=FONT_NAME,
-        fontSize=12,
-        alignment=2,
-    )
-
-    title_style = ParagraphStyle(
-        "arabic_title",
-        parent=styles["Heading2"],
-        fontName=FONT_NAME,
-        fontSize=14,
-        alignment=2,
-    )
-
-    story = []
-
-    for _, r in leaves_df.iterrows():
-
-        story.append(Paragraph(ar(f"الموظف: {safe_str(r.get('name_ar'))}"), title_style))
-        story.append(Spacer(1, 8))
-
-        story.append(Paragraph(ar(f"نوع الإجازة: {safe_str(r.get('leave_type'))}"), normal_style))
-        story.append(Spacer(1, 5))
-
-        story.append(Paragraph(ar(f"من: {fmt_date(r.get('start_date'))}"), normal_style))
-        story.append(Spacer(1, 5))
-
-        story.append(Paragraph(ar(f"إلى: {fmt_date(r.get('end_date'))}"), normal_style))
-        story.append(Spacer(1, 5))
-
-        if safe_str(r.get("notes")):
-            story.append(Paragraph(ar(f"ملاحظات: {safe_str(r.get('notes'))}"), normal_style))
-            story.append(Spacer(1, 5))
-
-        # 👇 فقط اسم المرفق
-        att_name = safe_str(r.get("attachment_name"))
-        if att_name:
-            story.append(Paragraph(ar(f"📎 مرفق: {att_name}"), normal_style))
-
-        story.append(Spacer(1, 20))
-
-    doc.build(story)
-    return buf.getvalue()
-
-
-
-
-
 # =========================
 # تشغيل المعالجة
 # =========================
 employees_df = load_employees_silent()
-leaves_df = load_leaves()
+ensure_leaves_store()
 employee_lookup = get_employee_lookup(employees_df)
+employee_schedules = get_employee_schedules(employees_df)
 
 
 
@@ -1684,37 +1653,25 @@ with st.sidebar:
 
 main_tab, leave_root_tab = st.tabs(["📊 تقرير البصمة", "🏖️ إدارة الإجازات"])
 
-def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
+# تقارير الإجازات الكبيرة (كل الموظفين / عدة سنوات) تُبنى في وضع خاص:
+# جداول مقسّمة بنفس الهيدر وكتابة مباشرة في ملف مؤقت بدل تجميع التقرير في الذاكرة.
+LARGE_LEAVE_REPORT_ROWS = 1000
+LEAVE_REPORT_CHUNK_ROWS = 200
 
-    buf = BytesIO()
 
-    FONT_NAME = "AR_LEAVE"
-
-    try:
-        pdfmetrics.registerFont(
-            TTFont(FONT_NAME, FONT_PATH)
-        )
-    except Exception:
-        pass
-
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=0.7 * cm,
-        rightMargin=0.7 * cm,
-        topMargin=0.7 * cm,
-        bottomMargin=0.7 * cm,
-    )
-
-    styles = getSampleStyleSheet()
+def _leave_report_story(leaves_df: pd.DataFrame, FONT_NAME: str, chunk_rows: int | None = None):
+    """
+    flowables تقرير الإجازات بالترتيب (generator).
+    chunk_rows: تقسيم جدول كل موظف لجداول بحد أقصى chunk_rows صف مع تكرار الهيدر.
+    """
 
     # =====================================================
     # STYLES
     # =====================================================
 
-    title_style = ParagraphStyle(
+    title_style = pdf_style(
         "title",
-        parent=styles["Title"],
+        parent="Title",
         fontName=FONT_NAME,
         fontSize=18,
         alignment=1,
@@ -1723,9 +1680,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         spaceAfter=18,
     )
 
-    employee_style = ParagraphStyle(
+    employee_style = pdf_style(
         "employee_style",
-        parent=styles["BodyText"],
+        parent="BodyText",
         fontName=FONT_NAME,
         fontSize=11,
         alignment=2,
@@ -1733,9 +1690,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         textColor=colors.white,
     )
 
-    header_style = ParagraphStyle(
+    header_style = pdf_style(
         "header_style",
-        parent=styles["BodyText"],
+        parent="BodyText",
         fontName=FONT_NAME,
         fontSize=10,
         alignment=1,
@@ -1743,9 +1700,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         leading=14,
     )
 
-    cell_style = ParagraphStyle(
+    cell_style = pdf_style(
         "cell_style",
-        parent=styles["BodyText"],
+        parent="BodyText",
         fontName=FONT_NAME,
         fontSize=9,
         alignment=1,
@@ -1753,9 +1710,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         leading=13,
     )
 
-    notes_style = ParagraphStyle(
+    notes_style = pdf_style(
         "notes_style",
-        parent=styles["BodyText"],
+        parent="BodyText",
         fontName=FONT_NAME,
         fontSize=8.5,
         alignment=2,
@@ -1763,9 +1720,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         leading=11,
     )
 
-    total_style = ParagraphStyle(
+    total_style = pdf_style(
         "total_style",
-        parent=styles["BodyText"],
+        parent="BodyText",
         fontName=FONT_NAME,
         fontSize=11,
         alignment=2,
@@ -1781,13 +1738,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
     # بداية التقرير
     # =====================================================
 
-    story = []
-
-    story.append(
-        Paragraph(
-            ar("تقرير الإجازات"),
-            title_style
-        )
+    yield Paragraph(
+        ar("تقرير الإجازات"),
+        title_style
     )
 
     # =====================================================
@@ -1796,16 +1749,12 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
 
     if leaves_df is None or leaves_df.empty:
 
-        story.append(
-            Paragraph(
-                ar("لا توجد بيانات"),
-                cell_style
-            )
+        yield Paragraph(
+            ar("لا توجد بيانات"),
+            cell_style
         )
 
-        doc.build(story)
-
-        return buf.getvalue()
+        return
 
     # =====================================================
     # تجهيز البيانات
@@ -1823,6 +1772,9 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
         errors="coerce"
     )
 
+    # عدد أيام كل إجازة (NaN لو التاريخ ناقص)
+    pdf_df["_days"] = (pdf_df["end_date"] - pdf_df["start_date"]).dt.days + 1
+
     grouped = pdf_df.groupby(
         ["employee_id", "employee_no", "name_ar"],
         dropna=False
@@ -1831,6 +1783,87 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
     total_records = 0
     total_leave_days = 0
 
+    details_style = TableStyle([
+
+        # HEADER
+        ("BACKGROUND",
+         (0, 0),
+         (-1, 0),
+         colors.HexColor("#334155")),
+
+        ("TEXTCOLOR",
+         (0, 0),
+         (-1, 0),
+         colors.white),
+
+        ("FONTNAME",
+         (0, 0),
+         (-1, -1),
+         FONT_NAME),
+
+        ("GRID",
+         (0, 0),
+         (-1, -1),
+         0.4,
+         colors.HexColor("#cbd5e1")),
+
+        ("ALIGN",
+         (0, 0),
+         (-1, -1),
+         "CENTER"),
+
+        ("VALIGN",
+         (0, 0),
+         (-1, -1),
+         "MIDDLE"),
+
+        ("BOTTOMPADDING",
+         (0, 0),
+         (-1, -1),
+         6),
+
+        ("TOPPADDING",
+         (0, 0),
+         (-1, -1),
+         6),
+
+        # ROW COLORS
+        ("ROWBACKGROUNDS",
+         (0, 1),
+         (-1, -1),
+         [
+             colors.white,
+             colors.HexColor("#f8fafc")
+         ]),
+
+    ])
+
+    def header_row():
+        return rtl_row([
+            Paragraph(ar(label), header_style)
+            for label in ["نوع الإجازة", "من", "إلى", "عدد الأيام", "المرفق", "ملاحظات"]
+        ])
+
+    def detail_row(r):
+
+        leave_type = safe_str(r.get("leave_type", "")) or "—"
+        start_date = fmt_date(r.get("start_date"))
+        end_date = fmt_date(r.get("end_date"))
+        attachment_name = safe_str(r.get("attachment_name", "")) or "لا يوجد"
+        notes_text = safe_str(r.get("notes", "")) or "—"
+
+        days = r.get("_days")
+        days_count = int(days) if pd.notna(days) else 1
+
+        return rtl_row([
+            Paragraph(ar(leave_type), cell_style),
+            Paragraph(ar(start_date), cell_style),
+            Paragraph(ar(end_date), cell_style),
+            Paragraph(ar(str(days_count)), cell_style),
+            Paragraph(ar(attachment_name), cell_style),
+            Paragraph(ar(notes_text), notes_style),
+        ])
+
     # =====================================================
     # الموظفين
     # =====================================================
@@ -1846,29 +1879,7 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
 
         leave_count = len(emp_df)
 
-        employee_total_days = 0
-
-        # =================================================
-        # حساب إجمالي الأيام
-        # =================================================
-
-        for _, rr in emp_df.iterrows():
-
-            s = pd.to_datetime(
-                rr.get("start_date"),
-                errors="coerce"
-            )
-
-            e = pd.to_datetime(
-                rr.get("end_date"),
-                errors="coerce"
-            )
-
-            if pd.notna(s) and pd.notna(e):
-
-                employee_total_days += (
-                    (e - s).days + 1
-                )
+        employee_total_days = int(emp_df["_days"].sum())
 
         total_records += leave_count
         total_leave_days += employee_total_days
@@ -1922,209 +1933,37 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
 
         ]))
 
-        story.append(employee_header)
-
-        story.append(
-            Spacer(1, 0.15 * cm)
-        )
-
-        # =================================================
-        # جدول التفاصيل
-        # =================================================
-
-        rows = [
-            rtl_row([
-
-                Paragraph(
-                    ar("نوع الإجازة"),
-                    header_style
-                ),
-
-                Paragraph(
-                    ar("من"),
-                    header_style
-                ),
-
-                Paragraph(
-                    ar("إلى"),
-                    header_style
-                ),
-
-                Paragraph(
-                    ar("عدد الأيام"),
-                    header_style
-                ),
-
-                Paragraph(
-                    ar("المرفق"),
-                    header_style
-                ),
-
-                Paragraph(
-                    ar("ملاحظات"),
-                    header_style
-                ),
+        yield employee_header
 
-            ])
-        ]
+        yield Spacer(1, 0.15 * cm)
 
         # =================================================
-        # تفاصيل الإجازات
+        # جدول التفاصيل (جدول واحد أو عدة جداول بنفس الهيدر)
         # =================================================
 
-        for _, r in emp_df.iterrows():
-
-            leave_type = safe_str(
-                r.get("leave_type", "")
-            ) or "—"
-
-            start_date = fmt_date(
-                r.get("start_date")
-            )
-
-            end_date = fmt_date(
-                r.get("end_date")
-            )
-
-            attachment_name = safe_str(
-                r.get("attachment_name", "")
-            ) or "لا يوجد"
-
-            notes_text = safe_str(
-                r.get("notes", "")
-            ) or "—"
-
-            s = pd.to_datetime(
-                r.get("start_date"),
-                errors="coerce"
-            )
-
-            e = pd.to_datetime(
-                r.get("end_date"),
-                errors="coerce"
-            )
-
-            days_count = 1
-
-            if pd.notna(s) and pd.notna(e):
-
-                days_count = (
-                    (e - s).days + 1
-                )
-
-            rows.append(
-                rtl_row([
-
-                    Paragraph(
-                        ar(leave_type),
-                        cell_style
-                    ),
-
-                    Paragraph(
-                        ar(start_date),
-                        cell_style
-                    ),
-
-                    Paragraph(
-                        ar(end_date),
-                        cell_style
-                    ),
-
-                    Paragraph(
-                        ar(str(days_count)),
-                        cell_style
-                    ),
-
-                    Paragraph(
-                        ar(attachment_name),
-                        cell_style
-                    ),
-
-                    Paragraph(
-                        ar(notes_text),
-                        notes_style
-                    ),
-
-                ])
+        records = emp_df.to_dict("records")
+        step = chunk_rows or len(records)
+
+        for i in range(0, len(records), step):
+
+            details_table = Table(
+                [header_row()] + [detail_row(r) for r in records[i:i + step]],
+                colWidths=[
+                    2.0 * cm,
+                    4.0 * cm,
+                    4.0 * cm,
+                    4.0 * cm,
+                    2.7 * cm,
+                    3.1 * cm,
+                ],
+                repeatRows=1,
             )
 
-        # =================================================
-        # إنشاء الجدول
-        # =================================================
-
-        details_table = Table(
-            rows,
-            colWidths=[
-                2.0 * cm,
-                4.0 * cm,
-                4.0 * cm,
-                4.0 * cm,
-                2.7 * cm,
-                3.1 * cm,
-            ],
-            repeatRows=1,
-        )
-
-        details_table.setStyle(TableStyle([
-
-            # HEADER
-            ("BACKGROUND",
-             (0, 0),
-             (-1, 0),
-             colors.HexColor("#334155")),
-
-            ("TEXTCOLOR",
-             (0, 0),
-             (-1, 0),
-             colors.white),
-
-            ("FONTNAME",
-             (0, 0),
-             (-1, -1),
-             FONT_NAME),
+            details_table.setStyle(details_style)
 
-            ("GRID",
-             (0, 0),
-             (-1, -1),
-             0.4,
-             colors.HexColor("#cbd5e1")),
+            yield details_table
 
-            ("ALIGN",
-             (0, 0),
-             (-1, -1),
-             "CENTER"),
-
-            ("VALIGN",
-             (0, 0),
-             (-1, -1),
-             "MIDDLE"),
-
-            ("BOTTOMPADDING",
-             (0, 0),
-             (-1, -1),
-             6),
-
-            ("TOPPADDING",
-             (0, 0),
-             (-1, -1),
-             6),
-
-            # ROW COLORS
-            ("ROWBACKGROUNDS",
-             (0, 1),
-             (-1, -1),
-             [
-                 colors.white,
-                 colors.HexColor("#f8fafc")
-             ]),
-
-        ]))
-
-        story.append(details_table)
-
-        story.append(
-            Spacer(1, 0.5 * cm)
-        )
+        yield Spacer(1, 0.5 * cm)
 
     # =====================================================
     # الإجماليات
@@ -2135,7 +1974,7 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
             Paragraph(
                 ar(
                     f"إجمالي سجلات الإجازات: {total_records}"
-                  
+
                 ),
                 total_style
             )
@@ -2158,219 +1997,28 @@ def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
 
         ("BOTTOMPADDING",
          (0, 0),
-         (-1, -1),
-         8),
-
-        ("TOPPADDING",
-         (0, 0),
-         (-1, -1),
-         8),
-
-    ]))
-
-    story.append(summary_table)
-
-    # =====================================================
-    # BUILD PDF
-    # =====================================================
-
-    doc.build(story)
-
-    return buf.getvalue()
-
-
-
-def build_sick_leave_pdf(summary_df: pd.DataFrame, year_label: str = "") -> bytes:
-    """
-    تقرير PDF لملخص الإجازات المرضية لكل موظف مرتب من الأكثر إلى الأقل،
-    مع تمييز الموظفين المتجاوزين للحد السنوي (30 يوم).
-    """
-    buf = BytesIO()
-
-    FONT_NAME = "AR_SICK"
-    try:
-        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
-    except Exception:
-        pass
-
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=0.7 * cm,
-        rightMargin=0.7 * cm,
-        topMargin=0.7 * cm,
-        bottomMargin=0.7 * cm,
-    )
-
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        "sick_title",
-        parent=styles["Title"],
-        fontName=FONT_NAME,
-        fontSize=18,
-        alignment=1,
-        textColor=colors.HexColor("#111827"),
-        leading=24,
-        spaceAfter=6,
-    )
-
-    subtitle_style = ParagraphStyle(
-        "sick_subtitle",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=11,
-        alignment=1,
-        textColor=colors.HexColor("#374151"),
-        leading=16,
-        spaceAfter=14,
-    )
-
-    header_style = ParagraphStyle(
-        "sick_header",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=10,
-        alignment=1,
-        textColor=colors.white,
-        leading=14,
-    )
-
-    cell_style = ParagraphStyle(
-        "sick_cell",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=9.5,
-        alignment=1,
-        textColor=colors.black,
-        leading=13,
-    )
-
-    total_style = ParagraphStyle(
-        "sick_total",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=11,
-        alignment=2,
-        textColor=colors.HexColor("#111827"),
-        leading=16,
-        spaceBefore=12,
-    )
-
-    def rtl_row(row):
-        return list(reversed(row))
-
-    story = []
-    story.append(Paragraph(ar("تقرير الإجازات المرضية حسب الموظف"), title_style))
-    if year_label:
-        story.append(Paragraph(ar(f"الفترة: {year_label}"), subtitle_style))
-    story.append(
-        Paragraph(
-            ar(f"الحد السنوي المسموح به لكل موظف: {SICK_LEAVE_ANNUAL_QUOTA} يوم"),
-            subtitle_style,
-        )
-    )
-
-    if summary_df is None or summary_df.empty:
-        story.append(Paragraph(ar("لا توجد إجازات مرضية ضمن الفترة المحددة"), cell_style))
-        doc.build(story)
-        return buf.getvalue()
-
-    # رأس الجدول (بالترتيب من اليمين لليسار بعد rtl_row)
-    header_row = [
-        Paragraph(ar("الحالة"), header_style),
-        Paragraph(ar("المتبقي"), header_style),
-        Paragraph(ar("إجمالي الأيام"), header_style),
-        Paragraph(ar("عدد الإجازات"), header_style),
-        Paragraph(ar("القسم"), header_style),
-        Paragraph(ar("الرقم الوظيفي"), header_style),
-        Paragraph(ar("الموظف"), header_style),
-        Paragraph(ar("م"), header_style),
-    ]
-
-    rows = [header_row]
-    row_colors = [colors.HexColor("#1e293b")]
-
-    for _, r in summary_df.iterrows():
-        exceeded = int(r.get("total_days", 0)) >= SICK_LEAVE_ANNUAL_QUOTA
-        near_limit = int(r.get("total_days", 0)) >= SICK_LEAVE_ANNUAL_QUOTA * 0.7 and not exceeded
-
-        row = [
-            Paragraph(ar(safe_str(r.get("status"))), cell_style),
-            Paragraph(ar(str(int(r.get("remaining_days", 0)))), cell_style),
-            Paragraph(ar(str(int(r.get("total_days", 0)))), cell_style),
-            Paragraph(ar(str(int(r.get("leave_count", 0)))), cell_style),
-            Paragraph(ar(safe_str(r.get("department"))), cell_style),
-            Paragraph(ar(fmt_id(r.get("employee_no"))), cell_style),
-            Paragraph(ar(safe_str(r.get("name_ar"))), cell_style),
-            Paragraph(ar(str(int(r.get("rank", 0)))), cell_style),
-        ]
-        rows.append(row)
-
-        if exceeded:
-            row_colors.append(colors.HexColor("#fee2e2"))
-        elif near_limit:
-            row_colors.append(colors.HexColor("#fef9c3"))
-        else:
-            row_colors.append(colors.white if len(row_colors) % 2 == 0 else colors.HexColor("#f8fafc"))
-
-    col_widths = [1.6 * cm, 1.8 * cm, 2.3 * cm, 2.3 * cm, 3.2 * cm, 2.8 * cm, 5.0 * cm, 1.0 * cm]
-
-    table = Table(rows, colWidths=col_widths, repeatRows=1)
-
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1e293b")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("GRID", (0, 0), (-1, -1), 0.4, colors.HexColor("#cbd5e1")),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-    ]
-    for i, c in enumerate(row_colors):
-        if i == 0:
-            continue
-        style_cmds.append(("BACKGROUND", (0, i), (-1, i), c))
-
-    table.setStyle(TableStyle(style_cmds))
-    story.append(table)
+         (-1, -1),
+         8),
 
-    exceeded_count = int((summary_df["total_days"] >= SICK_LEAVE_ANNUAL_QUOTA).sum())
-    total_employees = len(summary_df)
-    total_days_all = int(summary_df["total_days"].sum())
+        ("TOPPADDING",
+         (0, 0),
+         (-1, -1),
+         8),
 
-    story.append(Spacer(1, 12))
-    story.append(
-        Paragraph(
-            ar(f"👥 عدد الموظفين: {total_employees}    |    📅 إجمالي أيام الإجازات المرضية: {total_days_all}"),
-            total_style,
-        )
-    )
-    story.append(
-        Paragraph(
-            ar(f"🔴 عدد الموظفين المتجاوزين للحد السنوي ({SICK_LEAVE_ANNUAL_QUOTA} يوم): {exceeded_count}"),
-            total_style,
-        )
-    )
+    ]))
 
-    doc.build(story)
-    return buf.getvalue()
+    yield summary_table
 
 
-def build_all_leave_summary_pdf(summary_df: pd.DataFrame, year_label: str = "") -> bytes:
+def write_leaves_pdf(leaves_df: pd.DataFrame, out, chunk_rows: int | None = None):
     """
-    تقرير PDF شامل لملخص إجازات كل الموظفين (كل الأنواع)،
-    يعرض عدد الإجازات وإجمالي الأيام وآخر إجازة لكل موظف.
+    كتابة تقرير الإجازات في out (مسار أو ملف مفتوح).
+    مع chunk_rows تُولّد عناصر التقرير أثناء البناء (StreamedStory) فلا يُحمّل التقرير كله في الذاكرة.
     """
-    buf = BytesIO()
-
-    FONT_NAME = "AR_ALLSUM"
-    try:
-        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
-    except Exception:
-        pass
+    FONT_NAME = ensure_fonts()
 
     doc = SimpleDocTemplate(
-        buf,
+        out,
         pagesize=A4,
         leftMargin=0.7 * cm,
         rightMargin=0.7 * cm,
@@ -2378,137 +2026,121 @@ def build_all_leave_summary_pdf(summary_df: pd.DataFrame, year_label: str = "")
         bottomMargin=0.7 * cm,
     )
 
-    styles = getSampleStyleSheet()
+    story = _leave_report_story(leaves_df, FONT_NAME, chunk_rows=chunk_rows)
 
-    title_style = ParagraphStyle(
-        "allsum_title",
-        parent=styles["Title"],
-        fontName=FONT_NAME,
-        fontSize=18,
-        alignment=1,
-        textColor=colors.HexColor("#111827"),
-        leading=24,
-        spaceAfter=6,
-    )
-
-    subtitle_style = ParagraphStyle(
-        "allsum_subtitle",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=11,
-        alignment=1,
-        textColor=colors.HexColor("#374151"),
-        leading=16,
-        spaceAfter=14,
-    )
+    if chunk_rows:
+        doc.build(StreamedStory(story))
+    else:
+        doc.build(list(story))
 
-    header_style = ParagraphStyle(
-        "allsum_header",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=10,
-        alignment=1,
-        textColor=colors.white,
-        leading=14,
-    )
 
-    cell_style = ParagraphStyle(
-        "allsum_cell",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=9.5,
-        alignment=1,
-        textColor=colors.black,
-        leading=13,
-    )
+def build_leaves_pdf(leaves_df: pd.DataFrame) -> bytes:
 
-    total_style = ParagraphStyle(
-        "allsum_total",
-        parent=styles["BodyText"],
-        fontName=FONT_NAME,
-        fontSize=11,
-        alignment=2,
-        textColor=colors.HexColor("#111827"),
-        leading=16,
-        spaceBefore=12,
-    )
+    buf = BytesIO()
 
-    story = []
-    story.append(Paragraph(ar("ملخص الإجازات الشامل لكل الموظفين"), title_style))
-    if year_label:
-        story.append(Paragraph(ar(f"الفترة: {year_label}"), subtitle_style))
-
-    if summary_df is None or summary_df.empty:
-        story.append(Paragraph(ar("لا توجد إجازات مسجلة ضمن الفترة المحددة"), cell_style))
-        doc.build(story)
-        return buf.getvalue()
-
-    # رأس الجدول (بالترتيب من اليمين لليسار بعد rtl_row)
-    header_row = [
-        Paragraph(ar("آخر إجازة"), header_style),
-        Paragraph(ar("إجمالي الأيام"), header_style),
-        Paragraph(ar("عدد الإجازات"), header_style),
-        Paragraph(ar("القسم"), header_style),
-        Paragraph(ar("الرقم الوظيفي"), header_style),
-        Paragraph(ar("الموظف"), header_style),
-        Paragraph(ar("م"), header_style),
-    ]
-
-    rows = [header_row]
-
-    for _, r in summary_df.iterrows():
-        row = [
-            Paragraph(ar(fmt_date(r.get("last_leave_date"))), cell_style),
-            Paragraph(ar(str(int(r.get("total_days", 0)))), cell_style),
-            Paragraph(ar(str(int(r.get("leave_count", 0)))), cell_style),
-            Paragraph(ar(safe_str(r.get("department"))), cell_style),
-            Paragraph(ar(fmt_id(r.get("employee_no"))), cell_style),
-            Paragraph(ar(safe_str(r.get("name_ar"))), cell_style),
-            Paragraph(ar(str(int(r.get("rank", 0)))), cell_style),
-        ]
-        rows.append(row)
-
-    col_widths = [2.4 * cm, 2.3 * cm, 2.3 * cm, 3.4 * cm, 2.8 * cm, 5.3 * cm, 1.0 * cm]
-
-    table = Table(rows, colWidths=col_widths, repeatRows=1)
-
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1e293b")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("GRID", (0, 0), (-1, -1), 0.4, colors.HexColor("#cbd5e1")),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-    ]
-    for i in range(1, len(rows)):
-        style_cmds.append((
-            "BACKGROUND", (0, i), (-1, i),
-            colors.white if i % 2 == 0 else colors.HexColor("#f8fafc"),
-        ))
-
-    table.setStyle(TableStyle(style_cmds))
-    story.append(table)
-
-    total_employees = len(summary_df)
-    total_days_all = int(summary_df["total_days"].sum())
-    total_leaves_all = int(summary_df["leave_count"].sum())
-
-    story.append(Spacer(1, 12))
-    story.append(
-        Paragraph(
-            ar(
-                f"👥 عدد الموظفين: {total_employees}    |    "
-                f"📄 إجمالي عدد الإجازات: {total_leaves_all}    |    "
-                f"📅 إجمالي أيام الإجازات: {total_days_all}"
-            ),
-            total_style,
-        )
-    )
+    write_leaves_pdf(leaves_df, buf)
 
-    doc.build(story)
     return buf.getvalue()
 
 
+def build_large_leaves_pdf(leaves_df: pd.DataFrame):
+    """وضع التقارير الكبيرة: يُكتب التقرير في ملف مؤقت ويُرجع مفتوحًا للقراءة (يُحذف تلقائيًا عند إغلاقه)."""
+
+    out = tempfile.TemporaryFile(suffix=".pdf")
+
+    write_leaves_pdf(leaves_df, out, chunk_rows=LEAVE_REPORT_CHUNK_ROWS)
+
+    out.seek(0)
+
+    return out
+
+
+def leaves_pdf_download_data(leaves_df: pd.DataFrame):
+    """data لزر تحميل تقرير الإجازات: التقارير الكبيرة تُبث من ملف مؤقت، والعادية من cache."""
+
+    if leaves_df is not None and len(leaves_df) > LARGE_LEAVE_REPORT_ROWS:
+        return lambda: build_large_leaves_pdf(leaves_df)
+
+    return deferred_pdf(build_leaves_pdf, leaves_df)
+
+
+def attendance_excel_download_data(summary, late, absence, exempt, leaves):
+    """data لزر تحميل ملف Excel للرواتب: يُكتب عند التحميل فقط في ملف مؤقت (الذاكرة ثابتة مهما كان حجمه)."""
+
+    def render():
+        out = tempfile.TemporaryFile(suffix=".xlsx")
+        write_attendance_excel(out, summary, late, absence, exempt, leaves)
+        out.seek(0)
+        return out
+
+    return render
+
+
+
+# =========================
+# PDF عند الطلب
+# =========================
+# التقارير تُبنى فقط عند الضغط على زر التحميل (data كـ callable)، والنتيجة
+# محفوظة حسب hash محتوى الجداول والإعدادات مع حد أقصى لعدد الملفات المحفوظة.
+PDF_CACHE_MAX_ENTRIES = 32
+
+# ملخصات الإجازات الأكبر من هذا العدد تُرسم مباشرة على canvas بدل Table
+FAST_SUMMARY_PDF_ROWS = 500
+
+
+def frame_digest(*parts) -> str:
+    h = hashlib.md5()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            labels = part.columns if isinstance(part, pd.DataFrame) else part.index
+            h.update(repr(labels.tolist()).encode())
+            h.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+@st.cache_data(max_entries=PDF_CACHE_MAX_ENTRIES, show_spinner=False)
+def _pdf_cached(builder: str, digest: str, _build, _args: tuple, _kwargs: dict) -> bytes:
+    return _build(*_args, **_kwargs)
+
+
+def deferred_pdf(build, *args, **kwargs):
+    """callable لـ st.download_button: يبني التقرير عند التحميل فقط ويعيد النسخة المحفوظة لنفس البيانات."""
+    def render() -> bytes:
+        digest = frame_digest(*args, sorted(kwargs.items()))
+        return _pdf_cached(build.__name__, digest, build, args, kwargs)
+    return render
+
+
+BULK_ZIP_PREFIX = "attendance_reports_"
+BULK_ZIP_MAX_AGE_SECONDS = 6 * 60 * 60
+
+
+def file_download_data(path: str):
+    """callable لـ st.download_button: يقرأ الملف من القرص عند التحميل فقط وليس مع كل rerun."""
+    def read() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def cleanup_stale_bulk_zips(max_age_seconds: int = BULK_ZIP_MAX_AGE_SECONDS):
+    """حذف ملفات ZIP القديمة في temp (جلسات انتهت أو أُغلقت قبل إنشاء ملف جديد)."""
+    tmp_dir = tempfile.gettempdir()
+    cutoff = dt.datetime.now().timestamp() - max_age_seconds
+    for name in os.listdir(tmp_dir):
+        if not (name.startswith(BULK_ZIP_PREFIX) and name.endswith(".zip")):
+            continue
+        path = os.path.join(tmp_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
 def render_leave_results_table(res: pd.DataFrame):
     display_df = res.copy()
     display_df["من"] = display_df["start_date"].apply(fmt_date)
@@ -2582,8 +2214,8 @@ def show_attachment_dialog_if_needed():
 
 
 with leave_root_tab:
-    register_tab, view_tab, sick_tab, all_summary_tab, edit_tab = st.tabs(
-        ["➕ تسجيل إجازة", "📊 عرض الإجازات", "🤒 الإجازات المرضية", "📋 ملخص الإجازات", "✏️ تعديل الإجازات"]
+    register_tab, view_tab, sick_tab, all_summary_tab, coverage_tab, balance_tab, edit_tab = st.tabs(
+        ["➕ تسجيل إجازة", "📊 عرض الإجازات", "🤒 الإجازات المرضية", "📋 ملخص الإجازات", "🗓️ تغطية الأقسام", "💼 رصيد السنوية", "✏️ تعديل الإجازات"]
     )
 
     with register_tab:
@@ -2613,6 +2245,16 @@ with leave_root_tab:
                     uploaded_leaves_file
                 )
 
+                # رقم ثابت لكل سجل بدون leave_id (من محتوى الملف) حتى لا يتكرر الاستيراد
+                file_tag = hashlib.md5(uploaded_leaves_file.getvalue()).hexdigest()[:8]
+                if "leave_id" not in bulk_df.columns:
+                    bulk_df.insert(0, "leave_id", "")
+                bulk_df["leave_id"] = bulk_df["leave_id"].apply(safe_str).astype(object)
+                blank_ids = bulk_df["leave_id"] == ""
+                bulk_df.loc[blank_ids, "leave_id"] = [
+                    f"LV-UP-{file_tag}-{i + 1}" for i in bulk_df.index[blank_ids]
+                ]
+
                 st.success(
                     "✅ تم رفع الملف بنجاح"
                 )
@@ -2622,6 +2264,41 @@ with leave_root_tab:
                     use_container_width=True
                 )
 
+                bulk_overlaps = check_import_overlaps(bulk_df)
+                if not bulk_overlaps.empty:
+                    st.warning(
+                        f"⚠️ يوجد {len(bulk_overlaps)} تداخل بين إجازات الملف أو مع الإجازات المسجلة. "
+                        f"عند الاستيراد يُتجاهل سجل الملف المتداخل مع إجازة مسجلة، "
+                        f"وعند تداخل سجلين من الملف يُستورد الأسبق في الملف ويُتجاهل اللاحق فقط. "
+                        f"قائمة السجلات المتجاهلة فعليًا تظهر بعد الاستيراد."
+                    )
+                    st.dataframe(
+                        overlaps_display_df(bulk_overlaps),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+                if st.button("📥 استيراد الإجازات", key="bulk_leaves_import_btn"):
+                    ensure_leaves_store()
+                    imported, skipped = import_leaves_report(bulk_df, skip_overlaps=True)
+                    invalidate_leaves_snapshot()
+                    st.success(f"✅ تم استيراد {imported} إجازة من أصل {len(bulk_df)}")
+                    if not skipped.empty:
+                        st.warning(f"⚠️ لم يتم استيراد {len(skipped)} سجل:")
+                        st.dataframe(
+                            skipped.rename(columns={
+                                "row": "رقم الصف",
+                                "leave_id": "رقم الإجازة",
+                                "employee_id": "رقم الموظف",
+                                "leave_type": "النوع",
+                                "start_date": "من",
+                                "end_date": "إلى",
+                                "reason": "السبب",
+                            }),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+
             except Exception as e:
 
                 st.error(f"❌ {e}")
@@ -2652,7 +2329,7 @@ with leave_root_tab:
 
                 leave_type = st.selectbox(
                     "نوع الإجازة",
-                    ["سنوية", "مرضية", "بدون راتب", "اضطرارية", "رسمية", "أخرى"]
+                    LEAVE_TYPES
                 )
 
                 c1, c2 = st.columns(2)
@@ -2689,7 +2366,7 @@ with leave_root_tab:
                             leave_end
                         )
 
-                        add_leave_record({
+                        saved = add_leave_record({
                             "leave_id": f"LV-{pd.Timestamp.now().strftime('%Y%m%d%H%M%S%f')}",
                             "employee_id": safe_str(emp.get("employee_id")),
                             "employee_no": fmt_id(emp.get("employee_no")),
@@ -2708,8 +2385,21 @@ with leave_root_tab:
                             "created_by": st.session_state.get("login_user"),
                         })
 
-                        st.success("تم حفظ الإجازة بنجاح")
-                        st.rerun()
+                        if saved:
+                            st.success("تم حفظ الإجازة بنجاح")
+                            st.rerun()
+                        else:
+                            overlaps = leave_overlaps_db(emp.get("employee_id"), leave_start, leave_end)
+                            if overlaps.empty:
+                                st.warning("هذه الإجازة مسجلة مسبقًا لنفس الموظف")
+                            else:
+                                st.error("لم يتم الحفظ: الفترة تتداخل مع إجازة أخرى مسجلة لنفس الموظف")
+                                for _, o in overlaps.iterrows():
+                                    st.caption(
+                                        f"{safe_str(o.get('leave_type'))}: "
+                                        f"{fmt_date(o.get('start_date'))} → {fmt_date(o.get('end_date'))} "
+                                        f"({safe_str(o.get('leave_id'))})"
+                                    )
 
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -2762,30 +2452,18 @@ with leave_root_tab:
                     st.rerun()
 
                 if show_clicked:
-                    df = load_leaves().copy()
-                    if df.empty:
-                        st.session_state["show_leaves_result"] = True
-                        st.session_state["leave_result_df"] = pd.DataFrame()
-                    else:
-                        df["start_date"] = pd.to_datetime(df["start_date"], errors="coerce")
-                        df["end_date"] = pd.to_datetime(df["end_date"], errors="coerce")
-
-                        if view_mode == "موظف محدد":
-                            if not selected_emp:
-                                st.warning("اختر الموظف أولاً")
-                                st.session_state["show_leaves_result"] = False
-                            else:
-                                df = df[
-                                    (df["employee_id"].astype(str).str.strip() == str(selected_emp_key).strip()) |
-                                    (df["employee_no"].astype(str).str.strip() == str(selected_emp_key).strip())
-                                ]
-                                mask = (df["start_date"] <= pd.to_datetime(report_to)) & (df["end_date"] >= pd.to_datetime(report_from))
-                                st.session_state["leave_result_df"] = df[mask].sort_values(["start_date", "end_date"], ascending=[False, False]).copy()
-                                st.session_state["show_leaves_result"] = True
+                    if view_mode == "موظف محدد":
+                        if not selected_emp:
+                            st.warning("اختر الموظف أولاً")
+                            st.session_state["show_leaves_result"] = False
                         else:
-                            mask = (df["start_date"] <= pd.to_datetime(report_to)) & (df["end_date"] >= pd.to_datetime(report_from))
-                            st.session_state["leave_result_df"] = df[mask].sort_values(["start_date", "end_date"], ascending=[False, False]).copy()
+                            st.session_state["leave_result_df"] = query_leaves(
+                                [selected_emp_key], report_from, report_to
+                            )
                             st.session_state["show_leaves_result"] = True
+                    else:
+                        st.session_state["leave_result_df"] = query_leaves(None, report_from, report_to)
+                        st.session_state["show_leaves_result"] = True
 
                 if st.session_state.get("show_leaves_result", False):
                     res = st.session_state.get("leave_result_df", pd.DataFrame())
@@ -2802,8 +2480,6 @@ with leave_root_tab:
                         # PDF EXPORT
                         # =========================================================
 
-                        pdf_bytes = build_leaves_pdf(res)
-
                         if view_mode == "كل الموظفين":
 
                             pdf_name = "leave_report_all.pdf"
@@ -2817,9 +2493,10 @@ with leave_root_tab:
 
                         st.download_button(
                             label="📄 تصدير تقرير الإجازات PDF",
-                            data=pdf_bytes,
+                            data=leaves_pdf_download_data(res),
                             file_name=pdf_name,
                             mime="application/pdf",
+                            on_click="ignore",
                             use_container_width=True,
                             key="leave_pdf_download_btn"
                         )
@@ -2865,22 +2542,13 @@ with leave_root_tab:
                                     with col_del:
                                         if st.button("🗑️", key=f"del_btn_{safe_str(r.get('leave_id'))}_{idx}", use_container_width=True):
 
-                                            leaves = load_leaves().copy()
-
                                             target_id = safe_str(r.get("leave_id"))
 
-                                            # 🔥 تأكيد تطابق قوي
-                                            leaves["leave_id"] = leaves["leave_id"].astype(str).str.strip()
-
-                                            # 💾 حفظ السجل قبل الحذف
-                                            deleted_row = leaves[leaves["leave_id"] == target_id]
-                                            if not deleted_row.empty:
-                                                st.session_state["last_deleted_leave"] = deleted_row.iloc[0].to_dict()
-
-                                            # ❌ حذف فعلي
-                                            leaves = leaves[leaves["leave_id"] != target_id]
-
-                                            save_leaves(leaves)
+                                            # 🗑️ حذف مؤقت — يمكن التراجع عنه من سجل المحذوفات
+                                            if delete_leave(target_id, st.session_state.get("login_user")):
+                                                # ما حُذف في هذه الجلسة فقط هو ما يظهر له تنبيه وزر التراجع
+                                                st.session_state.setdefault("session_deleted_leave_ids", []).append(target_id)
+                                            invalidate_leaves_snapshot()
 
                                             st.success("تم حذف الإجازة")
                                             st.rerun()
@@ -2889,89 +2557,58 @@ with leave_root_tab:
 
 
 
-                    # 🔁 زر التراجع عن الحذف
-                    if st.session_state.get("last_deleted_leave"):
+                    # 🔁 زر التراجع عن الحذف (لما حُذف في هذه الجلسة فقط)
+                    session_deleted_ids = st.session_state.get("session_deleted_leave_ids", [])
+                    session_deleted = list_deleted_leaves(limit=1, leave_ids=session_deleted_ids)
+                    if not session_deleted.empty:
 
                         st.warning("تم حذف سجل. يمكنك التراجع.")
 
                         if st.button("↩️ التراجع عن آخر حذف", use_container_width=True):
 
-                            leaves = load_leaves().copy()
-
-                            # استرجاع السجل
-                            leaves = pd.concat([
-                                leaves,
-                                pd.DataFrame([st.session_state["last_deleted_leave"]])
-                            ], ignore_index=True)
-
-                            save_leaves(leaves)
-
-                            st.session_state["last_deleted_leave"] = None
-
-                            st.success("تم استرجاع الإجازة بنجاح")
-                            st.rerun()
-                        
-
-                            # =========================================================
-                            # تجهيز التقرير
-                            # =========================================================
-
-                            export_df = res.copy()
-
-                            # =========================================================
-                            # حساب عدد الإجازات لكل موظف
-                            # =========================================================
-
-                            leave_counts = (
-                                export_df.groupby(
-                                    ["employee_id", "name_ar"],
-                                    dropna=False
-                                )
-                                .size()
-                                .reset_index(name="leave_count")
-                            )
-
-                            export_df = export_df.merge(
-                                leave_counts,
-                                on=["employee_id", "name_ar"],
-                                how="left"
-                            )
-
-                            # =========================================================
-                            # إنشاء PDF
-                            # =========================================================
-
-                            pdf_bytes = build_leaves_pdf(
-                                export_df
-                            )
-
-                            # =========================================================
-                            # اسم الملف
-                            # =========================================================
-
-                            if view_mode == "كل الموظفين":
-
-                                pdf_name = "leave_report_all.pdf"
-
+                            # استرجاع آخر سجل حذفه هذا المستخدم في هذه الجلسة
+                            if undo_last_delete(st.session_state.get("login_user"), leave_ids=session_deleted_ids):
+                                invalidate_leaves_snapshot()
+                                st.success("تم استرجاع الإجازة بنجاح")
+                                st.rerun()
                             else:
+                                st.error("⚠️ تعذر الاسترجاع: توجد إجازة أخرى لنفس الموظف في نفس الفترة")
+
+                    deleted_leaves = list_deleted_leaves(limit=20)
+                    if not deleted_leaves.empty:
+
+                        with st.expander(f"🗑️ الإجازات المحذوفة ({len(deleted_leaves)})"):
+                            for _, d in deleted_leaves.iterrows():
+                                r1, r2 = st.columns([5, 1])
+                                with r1:
+                                    st.write(
+                                        f"{safe_str(d.get('name_ar'))} — {safe_str(d.get('leave_type'))} | "
+                                        f"{fmt_date(d.get('start_date'))} → {fmt_date(d.get('end_date'))}"
+                                    )
+                                    st.caption(f"حُذفت في {safe_str(d.get('deleted_at'))[:16]} بواسطة {safe_str(d.get('deleted_by')) or '—'}")
+                                with r2:
+                                    if st.button("↩️", key=f"restore_btn_{safe_str(d.get('leave_id'))}", use_container_width=True):
+                                        if restore_leave(safe_str(d.get("leave_id")), st.session_state.get("login_user")):
+                                            invalidate_leaves_snapshot()
+                                            st.rerun()
+                                        else:
+                                            st.error("⚠️ تعذر الاسترجاع: توجد إجازة أخرى لنفس الموظف في نفس الفترة")
 
-                                pdf_name = (
-                                    f"leave_report_"
-                                    f"{sanitize_filename(selected_emp_key)}.pdf"
-                                )
-
-                            # =========================================================
-                            # زر التحميل
-                            # =========================================================
-
-                            st.download_button(
-                                label="📄 تصدير تقرير الإجازات PDF",
-                                data=pdf_bytes,
-                                file_name=pdf_name,
-                                mime="application/pdf",
-                                use_container_width=True,
-                                key="leave_pdf_download_btn"
-                            )
+            # =========================================================
+            # فحص تداخل الإجازات (كل المخزن)
+            # =========================================================
+
+            with st.expander("🔍 فحص تداخل الإجازات"):
+                audit_df = leave_overlaps_audit()
+                if audit_df.empty:
+                    st.success("لا توجد إجازات متداخلة ✅")
+                else:
+                    st.warning(f"يوجد {len(audit_df)} تداخل بين إجازات لنفس الموظف")
+                    st.dataframe(
+                        overlaps_display_df(audit_df),
+                        use_container_width=True,
+                        hide_index=True
+                    )
 
         except Exception as e:
             st.error(f"⚠️ حدث خطأ في عرض هذا التبويب: {e}")
@@ -3012,9 +2649,7 @@ with leave_root_tab:
                 summary_df = pd.DataFrame()
             else:
                 summary_df = compute_sick_leave_summary(
-                    all_leaves_sick,
-                    date_from=sick_date_from,
-                    date_to=sick_date_to,
+                    analytics=leave_analytics(sick_date_from, sick_date_to, employee_schedules),
                 )
 
             period_label = f"{fmt_date(sick_date_from)} → {fmt_date(sick_date_to)}"
@@ -3049,6 +2684,7 @@ with leave_root_tab:
                 display_df["القسم"] = display_df["department"]
                 display_df["عدد الإجازات"] = display_df["leave_count"]
                 display_df["إجمالي الأيام"] = display_df["total_days"]
+                display_df["أيام العمل"] = display_df["work_days"]
                 display_df["المتبقي من الحد"] = display_df["remaining_days"]
                 display_df["آخر إجازة"] = display_df["last_leave_date"].apply(fmt_date)
                 display_df["المؤشر"] = display_df["status"]
@@ -3060,6 +2696,7 @@ with leave_root_tab:
                     "القسم",
                     "عدد الإجازات",
                     "إجمالي الأيام",
+                    "أيام العمل",
                     "المتبقي من الحد",
                     "آخر إجازة",
                     "المؤشر",
@@ -3101,7 +2738,6 @@ with leave_root_tab:
                                     st.warning(f"🟡 متبقي له {int(r.get('remaining_days', 0))} يوم فقط")
 
                 st.markdown("### 📄 تصدير التقرير")
-                sick_pdf_bytes = build_sick_leave_pdf(summary_df, year_label=period_label)
                 sick_pdf_name = (
                     f"sick_leave_report_"
                     f"{sick_date_from.strftime('%Y%m%d')}_{sick_date_to.strftime('%Y%m%d')}.pdf"
@@ -3109,13 +2745,40 @@ with leave_root_tab:
 
                 st.download_button(
                     label="📄 تصدير تقرير الإجازات المرضية PDF",
-                    data=sick_pdf_bytes,
+                    data=deferred_pdf(
+                        build_sick_leave_pdf,
+                        summary_df,
+                        year_label=period_label,
+                        fast=len(summary_df) > FAST_SUMMARY_PDF_ROWS,
+                    ),
                     file_name=sick_pdf_name,
                     mime="application/pdf",
+                    on_click="ignore",
                     use_container_width=True,
                     key="sick_leave_pdf_download_btn"
                 )
 
+            st.markdown(f"### 📈 الحد المتحرك (آخر {SICK_LEAVE_ROLLING_WINDOW} يوم)")
+            rolling_df = sick_quota_timeline()
+            crossed_df = rolling_df[rolling_df["crossed_on"].notna()] if not rolling_df.empty else rolling_df
+            if crossed_df.empty:
+                st.success("لم يصل أي موظف إلى الحد خلال أي فترة 365 يوم ✅")
+            else:
+                st.dataframe(
+                    pd.DataFrame({
+                        "الموظف": crossed_df["name_ar"],
+                        "الرقم الوظيفي": crossed_df["employee_no"],
+                        "القسم": crossed_df["department"],
+                        "تاريخ الوصول للحد": crossed_df["crossed_on"].apply(fmt_date),
+                        "أعلى رصيد": crossed_df["peak_days"],
+                        "تاريخ أعلى رصيد": crossed_df["peak_date"].apply(fmt_date),
+                        "الرصيد الحالي": crossed_df["current_days"],
+                        "المتبقي حاليًا": crossed_df["remaining_days"],
+                    }),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+
         st.markdown("</div>", unsafe_allow_html=True)
 
     with all_summary_tab:
@@ -3153,9 +2816,7 @@ with leave_root_tab:
                     allsum_summary_df = pd.DataFrame()
                 else:
                     allsum_summary_df = compute_all_leave_summary(
-                        all_leaves_summary_src,
-                        date_from=allsum_date_from,
-                        date_to=allsum_date_to,
+                        analytics=leave_analytics(allsum_date_from, allsum_date_to, employee_schedules),
                     )
 
                 allsum_period_label = f"{fmt_date(allsum_date_from)} → {fmt_date(allsum_date_to)}"
@@ -3179,10 +2840,18 @@ with leave_root_tab:
                     display_df["القسم"] = display_df["department"]
                     display_df["عدد الإجازات"] = display_df["leave_count"]
                     display_df["إجمالي أيام الإجازات"] = display_df["total_days"]
+                    display_df["أيام العمل"] = display_df["work_days"]
                     display_df["آخر إجازة"] = display_df["last_leave_date"].apply(fmt_date)
                     display_df["نوع آخر إجازة"] = display_df["آخر_نوع_إجازة"].apply(safe_str)
                     display_df["تفصيل الإجازات حسب النوع"] = display_df["نوع_الإجازات_تفصيلي"]
 
+                    # أعمدة رقمية لكل نوع إجازة (قابلة للترتيب في الجدول)
+                    type_cols = {
+                        c: c.replace("_", " ", 1)
+                        for c in allsum_summary_df.columns if c.startswith("أيام_")
+                    }
+                    display_df = display_df.rename(columns=type_cols)
+
                     table_df = display_df[[
                         "الترتيب",
                         "الموظف",
@@ -3190,6 +2859,8 @@ with leave_root_tab:
                         "القسم",
                         "عدد الإجازات",
                         "إجمالي أيام الإجازات",
+                        "أيام العمل",
+                        *type_cols.values(),
                         "آخر إجازة",
                         "نوع آخر إجازة",
                         "تفصيل الإجازات حسب النوع",
@@ -3203,16 +2874,21 @@ with leave_root_tab:
 
                     st.markdown("### 📄 تصدير التقرير")
                     try:
-                        allsum_pdf_bytes = build_all_leave_summary_pdf(allsum_summary_df, year_label=allsum_period_label)
                         allsum_pdf_name = (
                             f"all_leaves_summary_"
                             f"{allsum_date_from.strftime('%Y%m%d')}_{allsum_date_to.strftime('%Y%m%d')}.pdf"
                         )
                         st.download_button(
                             label="📄 تصدير ملخص الإجازات PDF",
-                            data=allsum_pdf_bytes,
+                            data=deferred_pdf(
+                                build_all_leave_summary_pdf,
+                                allsum_summary_df,
+                                year_label=allsum_period_label,
+                                fast=len(allsum_summary_df) > FAST_SUMMARY_PDF_ROWS,
+                            ),
                             file_name=allsum_pdf_name,
                             mime="application/pdf",
+                            on_click="ignore",
                             use_container_width=True,
                             key="allsum_leave_pdf_download_btn"
                         )
@@ -3223,6 +2899,164 @@ with leave_root_tab:
 
         st.markdown("</div>", unsafe_allow_html=True)
 
+    with coverage_tab:
+        st.markdown(
+            '<div class="card"><div class="card-title">🗓️ عدد الموظفين في إجازة لكل قسم يوميًا</div>',
+            unsafe_allow_html=True
+        )
+
+        try:
+            c1, c2 = st.columns(2)
+            with c1:
+                cov_from = st.date_input("من تاريخ", value=dt.date(dt.date.today().year, 1, 1), key="coverage_date_from")
+            with c2:
+                cov_to = st.date_input("إلى تاريخ", value=dt.date(dt.date.today().year, 12, 31), key="coverage_date_to")
+
+            if cov_to < cov_from:
+                st.error("تاريخ النهاية يجب أن يكون بعد أو يساوي تاريخ البداية")
+            else:
+                occupancy = department_occupancy(cov_from, cov_to)
+
+                if occupancy.empty or int(occupancy.to_numpy().max()) == 0:
+                    st.info("لا توجد إجازات ضمن الفترة المحددة.")
+                else:
+                    heat_df = (
+                        occupancy.rename_axis(index="القسم", columns="التاريخ")
+                        .stack()
+                        .rename("عدد الموظفين")
+                        .reset_index()
+                    )
+                    heatmap = alt.Chart(heat_df).mark_rect().encode(
+                        x=alt.X("التاريخ:T", title=None),
+                        y=alt.Y("القسم:N", title=None),
+                        color=alt.Color("عدد الموظفين:Q", scale=alt.Scale(scheme="orangered")),
+                        tooltip=["القسم", alt.Tooltip("التاريخ:T", format="%Y-%m-%d"), "عدد الموظفين"],
+                    ).properties(height=max(200, 22 * len(occupancy)))
+                    st.altair_chart(heatmap, use_container_width=True)
+
+                    peak_day = occupancy.idxmax(axis=1)
+                    st.dataframe(
+                        pd.DataFrame({
+                            "القسم": occupancy.index,
+                            "أعلى عدد في يوم": occupancy.max(axis=1).to_numpy(),
+                            "تاريخ الذروة": peak_day.apply(fmt_date).to_numpy(),
+                            "متوسط يومي": occupancy.mean(axis=1).round(2).to_numpy(),
+                        }).sort_values("أعلى عدد في يوم", ascending=False),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+        except Exception as e:
+            st.error(f"⚠️ حدث خطأ في عرض هذا التبويب: {e}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with balance_tab:
+        st.markdown(
+            '<div class="card"><div class="card-title">💼 رصيد الإجازة السنوية</div>',
+            unsafe_allow_html=True
+        )
+
+        try:
+            if employee_lookup.empty:
+                st.info("ملف الموظفين غير متوفر.")
+            else:
+                ensure_leaves_store()
+                balance_date = st.date_input("الرصيد في تاريخ", value=dt.date.today(), key="balance_as_of_date")
+
+                options_map = {
+                    employee_option_label(r): (r.get("employee_id") or r.get("employee_no"))
+                    for _, r in employee_lookup.iterrows()
+                }
+                balance_emp = st.selectbox(
+                    "الموظف",
+                    options=list(options_map.keys()),
+                    index=None,
+                    placeholder="ابحث باسم الموظف...",
+                    key="balance_emp_select"
+                )
+
+                if balance_emp:
+                    balance_key = str(options_map[balance_emp])
+                    bal = get_leave_balance(balance_key, balance_date)
+
+                    if bal is None:
+                        st.info("لا يوجد استحقاق مسجل لهذا الموظف في هذا التاريخ.")
+                    else:
+                        b1, b2, b3 = st.columns(3)
+                        b1.metric("🟢 الرصيد الحالي", f"{bal['balance']:.2f}")
+                        b2.metric("➕ المستحق", f"{bal['accrued_total']:.2f}")
+                        b3.metric("➖ المستخدم", int(bal["used_total"]))
+
+                    ents = load_leave_entitlements()
+                    current = ents[ents["employee_id"] == balance_key]
+                    cur_days = float(current["annual_days"].iloc[0]) if not current.empty else float(DEFAULT_ANNUAL_ENTITLEMENT)
+                    cur_start = (
+                        pd.to_datetime(current["accrual_start"].iloc[0]).date()
+                        if not current.empty else dt.date(dt.date.today().year, 1, 1)
+                    )
+                    cur_opening = float(current["opening_balance"].iloc[0]) if not current.empty else 0.0
+
+                    with st.form(f"entitlement_form_{balance_key}"):
+                        f1, f2, f3 = st.columns(3)
+                        with f1:
+                            ent_days = st.number_input("الاستحقاق السنوي (يوم)", min_value=0.0, max_value=60.0, value=cur_days, step=1.0)
+                        with f2:
+                            ent_start = st.date_input("بداية الاستحقاق", value=cur_start)
+                        with f3:
+                            ent_opening = st.number_input("الرصيد الافتتاحي", value=cur_opening, step=0.5)
+                        if st.form_submit_button("💾 حفظ الاستحقاق"):
+                            set_leave_entitlement(balance_key, ent_days, ent_start, ent_opening, st.session_state.get("login_user"))
+                            st.success("تم حفظ الاستحقاق")
+                            st.rerun()
+
+                    ledger = load_balance_ledger(balance_key)
+                    if not ledger.empty:
+                        st.dataframe(
+                            ledger.rename(columns={
+                                "month": "الشهر",
+                                "accrued": "المستحق",
+                                "used": "المستخدم",
+                                "accrued_total": "إجمالي المستحق",
+                                "used_total": "إجمالي المستخدم",
+                                "balance": "الرصيد",
+                            }).drop(columns=["employee_id"]),
+                            use_container_width=True,
+                            hide_index=True,
+                        )
+
+                st.markdown("### 👥 أرصدة كل الموظفين")
+                if st.button(
+                    f"➕ إضافة الاستحقاق الافتراضي ({DEFAULT_ANNUAL_ENTITLEMENT} يوم) للموظفين بدون استحقاق",
+                    key="seed_entitlements_btn"
+                ):
+                    added = seed_leave_entitlements(employee_lookup["employee_id"], updated_by=st.session_state.get("login_user"))
+                    st.success(f"تمت إضافة الاستحقاق لـ {added} موظف")
+
+                balances = leave_balances_as_of(balance_date)
+                if balances.empty:
+                    st.info("لا توجد أرصدة محسوبة بعد.")
+                else:
+                    balances = balances.merge(
+                        employee_lookup[["employee_id", "name_ar", "department"]].drop_duplicates("employee_id"),
+                        on="employee_id",
+                        how="left",
+                    )
+                    st.dataframe(
+                        pd.DataFrame({
+                            "الموظف": balances["name_ar"].apply(safe_str),
+                            "الرقم الوظيفي": balances["employee_id"],
+                            "القسم": balances["department"].apply(safe_str),
+                            "الاستحقاق السنوي": balances["annual_days"],
+                            "إجمالي المستحق": balances["accrued_total"].round(2),
+                            "إجمالي المستخدم": balances["used_total"],
+                            "الرصيد": balances["balance"].round(2),
+                        }).sort_values("الرصيد"),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+        except Exception as e:
+            st.error(f"⚠️ حدث خطأ في عرض هذا التبويب: {e}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
     with edit_tab:
         try:
             st.markdown('<div class="card"><div class="card-title">✏️ تعديل الإجازات</div>', unsafe_allow_html=True)
@@ -3243,10 +3077,9 @@ with leave_root_tab:
                 preselected_emp = None
                 preselected_leave_id = st.session_state.get("edit_leave_id")
                 if preselected_leave_id:
-                    all_lv = load_leaves().copy()
-                    hit = all_lv[all_lv["leave_id"].astype(str).str.strip() == str(preselected_leave_id).strip()]
-                    if not hit.empty:
-                        pre_emp_id = safe_str(hit.iloc[0].get("employee_id"))
+                    hit = get_leave(preselected_leave_id)
+                    if hit:
+                        pre_emp_id = safe_str(hit.get("employee_id"))
                         for lbl, empkey in options_map.items():
                             if str(empkey).strip() == pre_emp_id:
                                 preselected_emp = lbl
@@ -3266,14 +3099,7 @@ with leave_root_tab:
 
                 if edit_employee_label:
                     edit_employee_key = str(options_map[edit_employee_label]).strip()
-                    employee_leaves = load_leaves().copy()
-                    if not employee_leaves.empty:
-                        employee_leaves["start_date"] = pd.to_datetime(employee_leaves["start_date"], errors="coerce")
-                        employee_leaves["end_date"] = pd.to_datetime(employee_leaves["end_date"], errors="coerce")
-                        employee_leaves = employee_leaves[
-                            (employee_leaves["employee_id"].astype(str).str.strip() == edit_employee_key) |
-                            (employee_leaves["employee_no"].astype(str).str.strip() == edit_employee_key)
-                        ].sort_values(["start_date", "end_date"], ascending=[False, False]).copy()
+                    employee_leaves = query_leaves([edit_employee_key])
 
                     if not employee_leaves.empty:
                         leave_options = {}
@@ -3297,15 +3123,18 @@ with leave_root_tab:
                         selected_edit_id = leave_options[selected_leave_option]
 
                 if selected_edit_id:
-                    leaves = load_leaves().copy()
-                    leaves["start_date"] = pd.to_datetime(leaves["start_date"], errors="coerce")
-                    leaves["end_date"] = pd.to_datetime(leaves["end_date"], errors="coerce")
-                    row = leaves[leaves["leave_id"].astype(str).str.strip() == str(selected_edit_id).strip()]
+                    row = employee_leaves[employee_leaves["leave_id"].astype(str).str.strip() == str(selected_edit_id).strip()]
 
                     if not row.empty:
                         r = row.iloc[0]
 
-                        leave_types = ["سنوية", "مرضية", "بدون راتب", "اضطرارية", "رسمية", "أخرى"]
+                        # نسخة السجل عند فتح النموذج — تُرسل مع الحفظ للتحقق من عدم تعديله من مستخدم آخر
+                        version_key = f"edit_version_{selected_edit_id}"
+                        if version_key not in st.session_state:
+                            current_version = pd.to_numeric(r.get("row_version"), errors="coerce")
+                            st.session_state[version_key] = int(current_version) if pd.notna(current_version) else 1
+
+                        leave_types = LEAVE_TYPES
                         current_type = safe_str(r.get("leave_type"))
                         current_index = leave_types.index(current_type) if current_type in leave_types else 0
 
@@ -3338,12 +3167,16 @@ with leave_root_tab:
                             if st.button("💾 حفظ التعديل", key=f"save_edit_{selected_edit_id}", use_container_width=True):
                                 if new_end < new_start:
                                     st.error("تاريخ النهاية يجب أن يكون بعد أو يساوي تاريخ البداية")
+                                elif not leave_overlaps_db(r.get("employee_id"), new_start, new_end, exclude_leave_id=selected_edit_id).empty:
+                                    st.error("⚠️ الفترة الجديدة تتداخل مع إجازة أخرى مسجلة لنفس الموظف")
                                 else:
-                                    mask = leaves["leave_id"].astype(str).str.strip() == str(selected_edit_id).strip()
-                                    leaves.loc[mask, "leave_type"] = new_type
-                                    leaves.loc[mask, "start_date"] = pd.Timestamp(new_start)
-                                    leaves.loc[mask, "end_date"] = pd.Timestamp(new_end)
-                                    leaves.loc[mask, "notes"] = new_notes
+                                    changes = {
+                                        "leave_type": new_type,
+                                        "start_date": pd.Timestamp(new_start),
+                                        "end_date": pd.Timestamp(new_end),
+                                        "notes": new_notes,
+                                        "status": safe_str(r.get("status")),
+                                    }
 
                                     if new_file is not None:
                                         name, path = save_leave_attachment(
@@ -3352,16 +3185,26 @@ with leave_root_tab:
                                             new_start,
                                             new_end
                                         )
-                                        leaves.loc[mask, "attachment_name"] = name
-                                        leaves.loc[mask, "attachment_path"] = path
-
-                                    save_leaves(leaves)
-                                    st.success("تم تعديل الإجازة بنجاح")
-                                    st.session_state["edit_leave_id"] = None
-                                    st.rerun()
+                                        changes["attachment_name"] = name
+                                        changes["attachment_path"] = path
+
+                                    saved = update_leave(
+                                        selected_edit_id,
+                                        changes,
+                                        expected_version=st.session_state.get(version_key)
+                                    )
+                                    st.session_state.pop(version_key, None)
+                                    if saved:
+                                        invalidate_leaves_snapshot()
+                                        st.success("تم تعديل الإجازة بنجاح")
+                                        st.session_state["edit_leave_id"] = None
+                                        st.rerun()
+                                    else:
+                                        st.error("تعذر الحفظ: تم تعديل أو حذف هذا السجل من مستخدم آخر، أو أصبحت الفترة تتداخل مع إجازة أخرى. راجع البيانات الحالية ثم أعد الحفظ")
 
                         with ec2:
                             if st.button("❌ إلغاء التحميل", key=f"cancel_edit_{selected_edit_id}", use_container_width=True):
+                                st.session_state.pop(version_key, None)
                                 st.session_state["edit_leave_id"] = None
                                 st.rerun()
                     else:
@@ -3402,22 +3245,117 @@ with main_tab:
         a3.markdown('<div class="grid-note">📄 يمكنك تصدير تقرير الموظف PDF عربي وإنجليزي بعد رفع الملف.</div>', unsafe_allow_html=True)
         st.markdown(f'<div class="grid-note">{eid_al_adha_hint()}</div>', unsafe_allow_html=True)
     else:
-        summary, late, absence, exempt_report, approved_leave_days = process_attendance(
+        summary, late, absence, exempt_report, approved_leave_days = process_attendance_cached(
             uploaded_file,
-            start_time=start_time.strftime("%H:%M"),
-            grace_minutes=int(grace),
-            schedule_mode="by_nationality",
-            employees_df=employees_df,
-            daily_required_hours=9.0,
-            approved_leaves_df=leaves_df,
+            start_time.strftime("%H:%M"),
+            int(grace),
+            employees_df,
         )
-        summary, absence = exclude_eid_al_adha_absence(summary, absence)
+        with st.sidebar:
+            cache_stats = attendance_cache_stats()
+            st.caption(f"🗂️ نتائج محفوظة: {cache_stats['hits']} مرة / إعادة حساب: {cache_stats['misses']} مرة")
 
         if summary is None or summary.empty:
             st.error("لا توجد بيانات بعد المعالجة.")
         elif len(summary) != 1:
             st.warning("الملف يحتوي أكثر من موظف — هذا العرض مصمم لموظف واحد حاليًا.")
             st.dataframe(summary, use_container_width=True, hide_index=True)
+
+            st.markdown('<div class="soft-card"><div class="soft-title">📦 تقارير كل الموظفين</div>', unsafe_allow_html=True)
+            st.caption(f"تقرير PDF عربي وإنجليزي لكل موظف ({len(summary)} موظف) في ملف ZIP واحد.")
+
+            # مفتاح الملف: محتوى ملف البصمة + الإعدادات + نسخة الإجازات
+            bulk_key = hashlib.md5(
+                uploaded_file.getvalue()
+                + f"|{start_time}|{int(grace)}|{get_leaves_version()}".encode()
+            ).hexdigest()
+            bulk_zip = st.session_state.get("bulk_pdf_zip")
+
+            if st.button("📦 إنشاء تقارير PDF لكل الموظفين", use_container_width=True, key="bulk_pdf_build"):
+                if bulk_zip and os.path.exists(bulk_zip["path"]):
+                    os.remove(bulk_zip["path"])
+                cleanup_stale_bulk_zips()
+
+                fd, zip_path = tempfile.mkstemp(suffix=".zip", prefix=BULK_ZIP_PREFIX)
+                os.close(fd)
+
+                bar = st.progress(0.0, text="جاري إنشاء التقارير...")
+
+                def _bulk_progress(done, total):
+                    bar.progress(done / total, text=f"تم إنشاء {done} من {total} موظف")
+
+                try:
+                    count = export_employee_pdfs_zip(
+                        summary, late, absence, approved_leave_days, zip_path, progress=_bulk_progress
+                    )
+                    bulk_zip = {"key": bulk_key, "path": zip_path, "count": count}
+                    st.session_state["bulk_pdf_zip"] = bulk_zip
+                except Exception as e:
+                    os.remove(zip_path)
+                    bulk_zip = None
+                    st.session_state.pop("bulk_pdf_zip", None)
+                    st.error(f"⚠️ تعذّر إنشاء التقارير: {e}")
+
+            if bulk_zip and bulk_zip["key"] == bulk_key and os.path.exists(bulk_zip["path"]):
+                st.download_button(
+                    f"⬇️ تحميل التقارير ({bulk_zip['count']} موظف)",
+                    data=file_download_data(bulk_zip["path"]),
+                    file_name="attendance_reports.zip",
+                    mime="application/zip",
+                    on_click="ignore",
+                    use_container_width=True,
+                    key="bulk_pdf_download",
+                )
+            st.markdown("</div>", unsafe_allow_html=True)
+
+            st.markdown('<div class="soft-card"><div class="soft-title">🏢 تقرير القسم المجمّع</div>', unsafe_allow_html=True)
+            st.caption("ملف PDF واحد لكل موظفي القسم مع فهرس وروابط (Bookmarks) لكل موظف.")
+
+            departments = sorted(summary["department"].apply(safe_str).unique()) if "department" in summary.columns else []
+            if departments:
+                selected_dept = st.selectbox(
+                    "القسم",
+                    departments,
+                    format_func=lambda d: d or "بدون قسم",
+                    key="dept_pdf_department",
+                )
+                d1, d2 = st.columns(2)
+                with d1:
+                    st.download_button(
+                        "📄 تقرير القسم PDF (عربي)",
+                        data=deferred_pdf(build_department_pdf, selected_dept, summary, late, absence, approved_leave_days, lang="ar"),
+                        file_name=department_pdf_filename(selected_dept, "ar"),
+                        mime="application/pdf",
+                        on_click="ignore",
+                        use_container_width=True,
+                        key="dept_pdf_download_ar",
+                    )
+                with d2:
+                    st.download_button(
+                        "📄 Department PDF (English)",
+                        data=deferred_pdf(build_department_pdf, selected_dept, summary, late, absence, approved_leave_days, lang="en"),
+                        file_name=department_pdf_filename(selected_dept, "en"),
+                        mime="application/pdf",
+                        on_click="ignore",
+                        use_container_width=True,
+                        key="dept_pdf_download_en",
+                    )
+            else:
+                st.info("لا توجد أقسام في بيانات الملف.")
+            st.markdown("</div>", unsafe_allow_html=True)
+
+            st.markdown('<div class="soft-card"><div class="soft-title">📊 ملف Excel للرواتب</div>', unsafe_allow_html=True)
+            st.caption("الملخص والتأخير والغياب والمستثنون والإجازات في ملف واحد (ورقة لكل جدول).")
+            st.download_button(
+                "⬇️ تحميل ملف Excel",
+                data=attendance_excel_download_data(summary, late, absence, exempt_report, approved_leave_days),
+                file_name="attendance_payroll.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore",
+                use_container_width=True,
+                key="attendance_excel_download",
+            )
+            st.markdown("</div>", unsafe_allow_html=True)
         else:
             emp = summary.iloc[0]
             emp_personnel_id = safe_str(emp.get("employee_id", ""))
@@ -3439,16 +3377,6 @@ with main_tab:
             if not leave_emp.empty and "weekday" in leave_emp.columns:
                 leave_emp["weekday_ar"] = leave_emp["weekday"].apply(weekday_to_ar)
 
-            pdf_ar = build_pdf(emp, late_emp, abs_emp, leave_emp, lang="ar")
-            pdf_en = build_pdf(emp, late_emp, abs_emp, leave_emp, lang="en")
-
-            st.session_state["pdf_bytes_ar"] = pdf_ar
-            st.session_state["pdf_bytes_en"] = pdf_en
-            base_name = sanitize_filename(name_ar or name_en)
-            base_no = sanitize_filename(emp_no)
-            st.session_state["pdf_filename_ar"] = f"{base_name}_{base_no}_AR.pdf"
-            st.session_state["pdf_filename_en"] = f"{base_name}_{base_no}_EN.pdf"
-
             title = month_year_title(emp)
             schedule = safe_str(emp.get("schedule", ""))
             sat_note = "✅ دوام السبت" if schedule == "جمعة فقط" else "🛑 إجازة السبت"
@@ -3523,7 +3451,9 @@ with main_tab:
                     unsafe_allow_html=True,
                 )
 
-            overview_tab, details_tab, status_tab = st.tabs(["📌 الملخص", "🧾 التفاصيل اليومية", "🚫 الغياب والإجازات"])
+            overview_tab, details_tab, status_tab, preview_tab = st.tabs(
+                ["📌 الملخص", "🧾 التفاصيل اليومية", "🚫 الغياب والإجازات", "🖨️ معاينة التقرير"]
+            )
 
             with overview_tab:
                 st.markdown('<div class="soft-card"><div class="soft-title">بطاقة الموظف</div>', unsafe_allow_html=True)
@@ -3605,30 +3535,45 @@ with main_tab:
                         st.dataframe(leave_df[["اليوم", "التاريخ", "نوع الإجازة", "المرفق"]], use_container_width=True, hide_index=True)
                     st.markdown("</div>", unsafe_allow_html=True)
 
+            with preview_tab:
+                # معاينة HTML (نفس محتوى PDF) — للعرض والطباعة من المتصفح بدون بناء PDF
+                preview_lang = st.radio(
+                    "لغة التقرير",
+                    ["ar", "en"],
+                    format_func=lambda x: "عربي" if x == "ar" else "English",
+                    horizontal=True,
+                    key="report_preview_lang",
+                )
+                components.html(
+                    render_employee_html(emp, late_emp, abs_emp, leave_emp, lang=preview_lang),
+                    height=900,
+                    scrolling=True,
+                )
+
             with st.sidebar:
                 st.divider()
                 st.subheader("⬇️ التصدير")
                 st.markdown('<div class="export-box">', unsafe_allow_html=True)
 
-                if st.session_state.get("pdf_bytes_ar", b""):
-                    st.download_button(
-                        "📄 تحميل تقرير PDF (عربي)",
-                        data=st.session_state["pdf_bytes_ar"],
-                        file_name=st.session_state.get("pdf_filename_ar", "report_AR.pdf"),
-                        mime="application/pdf",
-                        use_container_width=True,
-                        key="download_pdf_ar",
-                    )
+                st.download_button(
+                    "📄 تحميل تقرير PDF (عربي)",
+                    data=deferred_pdf(build_pdf, emp, late_emp, abs_emp, leave_emp, lang="ar"),
+                    file_name=employee_pdf_filename(emp, "ar"),
+                    mime="application/pdf",
+                    on_click="ignore",
+                    use_container_width=True,
+                    key="download_pdf_ar",
+                )
 
-                if st.session_state.get("pdf_bytes_en", b""):
-                    st.download_button(
-                        "📄 Download PDF (English)",
-                        data=st.session_state["pdf_bytes_en"],
-                        file_name=st.session_state.get("pdf_filename_en", "report_EN.pdf"),
-                        mime="application/pdf",
-                        use_container_width=True,
-                        key="download_pdf_en",
-                    )
+                st.download_button(
+                    "📄 Download PDF (English)",
+                    data=deferred_pdf(build_pdf, emp, late_emp, abs_emp, leave_emp, lang="en"),
+                    file_name=employee_pdf_filename(emp, "en"),
+                    mime="application/pdf",
+                    on_click="ignore",
+                    use_container_width=True,
+                    key="download_pdf_en",
+                )
 
                 st.markdown("""
                 <div class="footer-hint">
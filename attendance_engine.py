@@ -61,6 +61,11 @@ def _is_saudi(nat) -> bool:
     return any(k in s for k in keys)
 
 
+def weekend_schedule(nat, has_saturday_presence: bool) -> str:
+    # السبت يوم عمل فقط لغير السعودي الذي له بصمة يوم سبت في الملف
+    return "جمعة فقط" if (not _is_saudi(nat)) and has_saturday_presence else "جمعة وسبت"
+
+
 def _norm_str(x) -> str:
     if x is None or (isinstance(x, float) and pd.isna(x)):
         return ""
@@ -109,6 +114,15 @@ def _is_eid_holiday(d) -> bool:
     return (dd >= EID_FROM) and (dd <= EID_TO)
 
 
+def _payroll_period(any_date):
+    # فترة الرواتب من يوم 8 في الشهر حتى يوم 7 في الشهر التالي
+    start_date = any_date.replace(day=8)
+    if any_date.day < 8:
+        start_date = (start_date - pd.DateOffset(months=1))
+    end_date = start_date + pd.DateOffset(months=1) - pd.DateOffset(days=1)
+    return start_date, end_date
+
+
 def _prepare_leaves_df(approved_leaves_df: pd.DataFrame | None) -> pd.DataFrame:
     if approved_leaves_df is None or approved_leaves_df.empty:
         return pd.DataFrame()
@@ -185,9 +199,9 @@ def process_attendance(
     employees_df: pd.DataFrame | None = None,
     daily_required_hours: float = 9.0,
     approved_leaves_df: pd.DataFrame | None = None,
+    leaves_query=None,
 ):
     df = _read_attendance_any_format(attendance_file)
-    leaves_df = _prepare_leaves_df(approved_leaves_df)
 
     df = df.rename(
         columns={
@@ -208,6 +222,16 @@ def process_attendance(
     df["weekday"] = df["date"].dt.day_name()
     df["weekday_ar"] = df["weekday"].map(WEEKDAY_AR).fillna(df["weekday"])
 
+    # leaves_query(employee_ids, date_from, date_to): جلب الإجازات المتقاطعة مع فترة الرواتب فقط
+    if approved_leaves_df is None and leaves_query is not None:
+        valid_dates = df["date"].dropna()
+        if not valid_dates.empty:
+            period_from, _ = _payroll_period(valid_dates.min())
+            _, period_to = _payroll_period(valid_dates.max())
+            employee_ids = df["employee_id"].dropna().astype(str).str.strip().unique().tolist()
+            approved_leaves_df = leaves_query(employee_ids, period_from.normalize(), period_to.normalize())
+    leaves_df = _prepare_leaves_df(approved_leaves_df)
+
     fp = pd.to_datetime(df.get("first_punch"), errors="coerce")
     lp = pd.to_datetime(df.get("last_punch"), errors="coerce")
 
@@ -321,8 +345,8 @@ def process_attendance(
             attendance_rule = ""
 
         has_sat_presence = (emp_df["weekday"] == "Saturday").any()
-        saturday_is_workday = (not is_saudi) and has_sat_presence
-        schedule = "جمعة فقط" if saturday_is_workday else "جمعة وسبت"
+        schedule = weekend_schedule(emp_nat, has_sat_presence)
+        saturday_is_workday = schedule == "جمعة فقط"
 
         def is_workday(day_name: str, date_val=None) -> bool:
             if _is_eid_holiday(date_val):
@@ -336,10 +360,7 @@ def process_attendance(
         emp_df["is_workday"] = emp_df.apply(lambda r: is_workday(r["weekday"], r["date"]), axis=1)
 
         any_date = emp_df["date"].dropna().iloc[0]
-        start_date = any_date.replace(day=8)
-        if any_date.day < 8:
-            start_date = (start_date - pd.DateOffset(months=1))
-        end_date = start_date + pd.DateOffset(months=1) - pd.DateOffset(days=1)
+        start_date, end_date = _payroll_period(any_date)
 
         date_min = start_date
         date_max = end_date
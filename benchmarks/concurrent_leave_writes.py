@@ -0,0 +1,136 @@
+"""
+قياس الكتابة المتزامنة على مخزن الإجازات.
+
+كل عامل (process) يضيف عددًا من الإجازات، ثم يزيد عدّادًا مشتركًا
+داخل ملاحظات سجل واحد عبر update_leave(expected_version=...) مع إعادة
+المحاولة عند التعارض. في النهاية يجب أن يساوي العدّاد عدد الزيادات
+الكلي (لا توجد تعديلات ضائعة).
+
+    python benchmarks/concurrent_leave_writes.py --workers 1 2 4 8 --ops 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+COUNTER_ID = "LV-BENCH-COUNTER"
+
+
+def _init_worker(db_path):
+
+    database.DB_NAME = db_path
+
+
+def _record(leave_id, employee_id, day):
+
+    return {
+        "leave_id": leave_id,
+        "employee_id": employee_id,
+        "employee_no": employee_id,
+        "name_ar": "",
+        "name_en": "",
+        "department": "",
+        "job_title": "",
+        "leave_type": "سنوية",
+        "start_date": f"2025-01-{day:02d}",
+        "end_date": f"2025-01-{day:02d}",
+        "notes": "0",
+        "status": "معتمدة",
+        "attachment_name": "",
+        "attachment_path": "",
+        "created_at": "",
+        "created_by": "bench",
+    }
+
+
+def _work(args):
+
+    worker, ops = args
+
+    inserted = 0
+    conflicts = 0
+
+    for i in range(ops):
+
+        # إضافة سجل جديد
+        day = i % 28 + 1
+        if database.insert_leave(_record(f"LV-B-{worker}-{i}", f"B{worker}-{i // 28}", day)):
+            inserted += 1
+
+        # زيادة العدّاد المشترك (read-modify-write مع تحقق متفائل)
+        while True:
+
+            cur = database.get_leave(COUNTER_ID)
+
+            data = dict(cur)
+            data["notes"] = str(int(cur["notes"]) + 1)
+
+            if database.update_leave(COUNTER_ID, data, expected_version=cur["row_version"]):
+                break
+
+            conflicts += 1
+
+    return inserted, conflicts
+
+
+def run(workers, ops):
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.remove(db_path)
+
+    _init_worker(db_path)
+    database.ensure_db()
+    database.insert_leave(_record(COUNTER_ID, "B-COUNTER", 1))
+
+    t0 = time.perf_counter()
+
+    with Pool(workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        results = pool.map(_work, [(w, ops) for w in range(workers)])
+
+    elapsed = time.perf_counter() - t0
+
+    inserted = sum(r[0] for r in results)
+    conflicts = sum(r[1] for r in results)
+
+    counter = int(database.get_leave(COUNTER_ID)["notes"])
+    expected = workers * ops
+
+    # كل عملية = إضافة + تعديل ناجح
+    writes = inserted + counter
+
+    print(
+        f"workers={workers:<3} writes={writes:<6} "
+        f"{writes / elapsed:8.0f} writes/s  "
+        f"retries={conflicts:<5} counter={counter}/{expected}"
+    )
+
+    assert inserted == expected, "insert ضائع"
+    assert counter == expected, "تعديل ضائع"
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+
+    for n in args.workers:
+        run(n, args.ops)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+مقارنة زمن بناء تقارير ملخصات الإجازات (المرضية / الشاملة) بين
+جدول platypus (Table + Paragraph) والرسم المباشر على canvas (fast=True).
+
+    python benchmarks/summary_pdf_render.py --rows 500 2000 10000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # مسار الخط نسبي (fonts/)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from pdf_reports import build_sick_leave_pdf, build_all_leave_summary_pdf  # noqa: E402
+from rules import SICK_LEAVE_ANNUAL_QUOTA  # noqa: E402
+
+
+DEPARTMENTS = ["الموارد البشرية", "الإدارة العامة للشؤون المالية والإدارية", "ENGR", "تقنية المعلومات"]
+NAMES = ["محمد عبدالله", "عبدالرحمن بن سعيد بن عبدالعزيز القحطاني", "علي حسن", "Ahmed Ali"]
+
+
+def _summary(rows):
+
+    rng = np.random.default_rng(0)
+    total_days = rng.integers(1, 60, rows)
+
+    return pd.DataFrame({
+        "rank": np.arange(1, rows + 1),
+        "employee_no": rng.integers(10000, 99999, rows),
+        "name_ar": rng.choice(NAMES, rows),
+        "department": rng.choice(DEPARTMENTS, rows),
+        "leave_count": rng.integers(1, 10, rows),
+        "total_days": total_days,
+        "remaining_days": np.maximum(SICK_LEAVE_ANNUAL_QUOTA - total_days, 0),
+        "status": np.where(total_days >= SICK_LEAVE_ANNUAL_QUOTA, "🔴 إنذار - تجاوز الحد", "🟢 طبيعي"),
+        "last_leave_date": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), "D"),
+    })
+
+
+def _pages(pdf):
+
+    return len(re.findall(rb"/Type /Page\b(?!s)", pdf))
+
+
+def run(rows):
+
+    df = _summary(rows)
+
+    for name, build in (("sick", build_sick_leave_pdf), ("all", build_all_leave_summary_pdf)):
+
+        timings = {}
+        pages = {}
+
+        for fast in (False, True):
+            t0 = time.perf_counter()
+            pdf = build(df, year_label="2026", fast=fast)
+            timings[fast] = time.perf_counter() - t0
+            pages[fast] = _pages(pdf)
+
+        print(
+            f"{name:<5} rows={rows:<7} "
+            f"table={timings[False]:7.2f}s  canvas={timings[True]:7.2f}s  "
+            f"x{timings[False] / timings[True]:5.1f}  "
+            f"pages={pages[False]}/{pages[True]}"
+        )
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 2000, 10000])
+    args = parser.parse_args()
+
+    for n in args.rows:
+        run(n)
+
+
+if __name__ == "__main__":
+    main()
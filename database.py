@@ -2,491 +2,2627 @@
 # database.py
 # =========================
 
+import hashlib
+import heapq
 import sqlite3
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
 
 DB_NAME = "attendance.db"
 
+# أعمدة الإجازة بدون محتوى المرفق (BLOB) — تُستخدم في الاستعلامات
+LEAVE_COLUMNS = [
+    "leave_id",
+    "employee_id",
+    "employee_no",
+    "name_ar",
+    "name_en",
+    "department",
+    "job_title",
+    "leave_type",
+    "start_date",
+    "end_date",
+    "status",
+    "attachment_name",
+    "attachment_path",
+    "notes",
+    "created_at",
+    "created_by",
+    "row_version",
+]
+
+# حد عدد المعاملات في جملة IN واحدة (SQLite)
+QUERY_CHUNK_SIZE = 500
+
+# مدة انتظار قفل الكتابة عند تزامن أكثر من جلسة (بالثواني)
+BUSY_TIMEOUT = 30
+
+# رصيد الإجازة السنوية: النوع المخصوم من الرصيد والاستحقاق السنوي الافتراضي (أيام)
+ANNUAL_LEAVE_TYPE = "سنوية"
+DEFAULT_ANNUAL_ENTITLEMENT = 21
+
+_READY_DBS = set()
+
+
+# =========================================================
+# HELPERS
+# =========================================================
+
+def _clean_text(x):
+
+    if x is None:
+        return ""
+
+    if isinstance(x, float) and pd.isna(x):
+        return ""
+
+    s = str(x).strip()
+
+    if s.lower() in ("nan", "nat", "none"):
+        return ""
+
+    return s
+
+
+def _clean_id(x):
+
+    # 27164.0 → "27164" (نفس منطق fmt_id في التطبيق)
+
+    s = _clean_text(x)
+
+    try:
+
+        f = float(s)
+
+        if f.is_integer():
+
+            return str(int(f))
+
+    except (ValueError, TypeError):
+        pass
+
+    return s
+
+
+def _iso_date(x):
+
+    # التواريخ تُخزن بصيغة YYYY-MM-DD حتى تعمل المقارنة النصية في الفهرس
+
+    d = pd.to_datetime(x, errors="coerce")
+
+    if pd.isna(d):
+        return ""
+
+    return d.strftime("%Y-%m-%d")
+
+
+def _month_buckets(start_date, end_date):
+
+    # تقسيم فترة الإجازة على الشهور: [("2026-04", 3), ("2026-05", 1)]
+
+    start = pd.to_datetime(start_date, errors="coerce")
+    end = pd.to_datetime(end_date, errors="coerce")
+
+    if pd.isna(start) or pd.isna(end) or end < start:
+        return []
+
+    buckets = []
+
+    cursor = start
+
+    while cursor <= end:
+
+        month_end = cursor + pd.offsets.MonthEnd(0)
+
+        seg_end = min(month_end, end)
+
+        buckets.append((
+
+            cursor.strftime("%Y-%m"),
+
+            int((seg_end - cursor).days) + 1
+
+        ))
+
+        cursor = seg_end + pd.Timedelta(days=1)
+
+    return buckets
+
+
+def _apply_month_totals(cur, employee_id, leave_type, start_date, end_date, sign):
+
+    # تُستدعى بنفس الـ cursor قبل commit حتى يتم التحديث في نفس المعاملة
+
+    for month, days in _month_buckets(start_date, end_date):
+
+        cur.execute("""
+
+            INSERT INTO leave_month_totals (employee_id, leave_type, month, days)
+
+            VALUES (?, ?, ?, ?)
+
+            ON CONFLICT(employee_id, leave_type, month)
+
+            DO UPDATE SET days = days + excluded.days
+
+        """, (
+
+            _clean_id(employee_id),
+            _clean_text(leave_type),
+            month,
+            sign * days
+
+        ))
+
+    # أي تغيير في أيام السنوية يجعل سجل رصيد الموظف بحاجة لإعادة احتساب
+    if _clean_text(leave_type) == ANNUAL_LEAVE_TYPE:
+
+        _mark_ledger_dirty(cur, employee_id)
+
+
+def _mark_ledger_dirty(cur, employee_id):
+
+    cur.execute(
+
+        "INSERT OR IGNORE INTO leave_ledger_dirty (employee_id) VALUES (?)",
+
+        (_clean_id(employee_id),)
+
+    )
+
+
+def _leave_key_row(cur, leave_id):
+
+    cur.execute("""
+
+        SELECT employee_id, leave_type, start_date, end_date, row_version
+
+        FROM leaves
+
+        WHERE leave_id = ?
+            AND deleted_at IS NULL
+
+    """, (str(leave_id),))
+
+    return cur.fetchone()
+
 
 # =========================================================
 # CONNECTION
 # =========================================================
 
-def get_connection():
+def get_connection():
+
+    conn = sqlite3.connect(
+
+        DB_NAME,
+
+        timeout=BUSY_TIMEOUT,
+
+        check_same_thread=False
+
+    )
+
+    conn.row_factory = sqlite3.Row
+
+    # مع WAL يكفي synchronous=NORMAL (لا فقدان تماسك عند انقطاع التشغيل)
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    return conn
+
+
+def get_write_connection():
+
+    # BEGIN IMMEDIATE: حجز قفل الكتابة من بداية المعاملة، حتى لا تتداخل
+    # قراءة السجل القديم مع كتابة جلسة أخرى (read-modify-write آمن)
+
+    conn = get_connection()
+
+    conn.execute("BEGIN IMMEDIATE")
+
+    return conn
+
+
+@contextmanager
+def write_transaction():
+
+    """
+    معاملة كتابة: commit عند النجاح و rollback عند أي خطأ، والاتصال يُغلق دائمًا
+    حتى لا يبقى قفل الكتابة محجوزًا وتنتظر باقي الجلسات BUSY_TIMEOUT.
+    """
+
+    conn = get_write_connection()
+
+    try:
+
+        with conn:
+
+            yield conn
+
+    finally:
+
+        conn.close()
+
+
+# =========================================================
+# INIT DATABASE
+# =========================================================
+
+def init_db():
+
+    conn = get_connection()
+
+    # WAL: القراءة لا تنتظر الكتابة، والكتّاب يصطفون على قفل واحد قصير
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    cur = conn.cursor()
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leaves (
+
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+        leave_id TEXT UNIQUE,
+
+        employee_id TEXT,
+        employee_no TEXT,
+
+        name_ar TEXT,
+        name_en TEXT,
+
+        department TEXT,
+        job_title TEXT,
+
+        leave_type TEXT,
+
+        start_date TEXT,
+        end_date TEXT,
+
+        status TEXT,
+
+        attachment_name TEXT,
+        attachment_data BLOB,
+
+        notes TEXT,
+
+        created_at TEXT,
+        created_by TEXT
+
+    )
+
+    """)
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS store_meta (
+
+        key TEXT PRIMARY KEY,
+        value TEXT
+
+    )
+
+    """)
+
+    # =====================================================
+    # سجل عمليات الحذف والاسترجاع (إضافة فقط)
+    # =====================================================
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leave_history (
+
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+        leave_id TEXT,
+
+        action TEXT,
+
+        performed_at TEXT,
+        performed_by TEXT
+
+    )
+
+    """)
+
+    cur.execute("""
+
+        CREATE INDEX IF NOT EXISTS idx_leave_history_action
+
+        ON leave_history (action, id)
+
+    """)
+
+    # =====================================================
+    # أيام الإجازات المجمعة لكل (موظف، نوع، شهر)
+    # =====================================================
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leave_month_totals (
+
+        employee_id TEXT,
+        leave_type TEXT,
+
+        month TEXT,
+
+        days INTEGER DEFAULT 0,
+
+        PRIMARY KEY (employee_id, leave_type, month)
+
+    )
+
+    """)
+
+    # =====================================================
+    # رصيد الإجازة السنوية
+    # leave_entitlements: الاستحقاق السنوي وبداية الاستحقاق لكل موظف
+    # leave_balance_ledger: الرصيد في نهاية كل شهر (محسوب مسبقًا)
+    # leave_ledger_dirty: الموظفون الذين يحتاج رصيدهم لإعادة احتساب
+    # =====================================================
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leave_entitlements (
+
+        employee_id TEXT PRIMARY KEY,
+
+        annual_days REAL,
+
+        accrual_start TEXT,
+
+        opening_balance REAL DEFAULT 0,
+
+        updated_at TEXT,
+        updated_by TEXT
+
+    )
+
+    """)
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leave_balance_ledger (
+
+        employee_id TEXT,
+
+        month TEXT,
+
+        accrued REAL,
+        used INTEGER,
+
+        accrued_total REAL,
+        used_total INTEGER,
+
+        balance REAL,
+
+        PRIMARY KEY (employee_id, month)
+
+    )
+
+    """)
+
+    cur.execute("""
+
+    CREATE TABLE IF NOT EXISTS leave_ledger_dirty (
+
+        employee_id TEXT PRIMARY KEY
+
+    )
+
+    """)
+
+    conn.commit()
+
+    conn.close()
+
+    migrate_db()
+
+    # =====================================================
+    # فهارس الاستعلام حسب الموظف والفترة
+    # =====================================================
+
+    conn = get_connection()
+
+    cur = conn.cursor()
+
+    cur.execute("""
+
+        CREATE INDEX IF NOT EXISTS idx_leaves_employee_period
+
+        ON leaves (employee_id, start_date, end_date)
+
+    """)
+
+    cur.execute("""
+
+        CREATE INDEX IF NOT EXISTS idx_leaves_employee_no_period
+
+        ON leaves (employee_no, start_date, end_date)
+
+    """)
+
+    # =====================================================
+    # رقم إصدار البيانات — يزيد مع كل كتابة داخل نفس المعاملة
+    # =====================================================
+
+    cur.execute("""
+
+        INSERT OR IGNORE INTO store_meta (key, value)
+
+        VALUES ('data_version', '0')
+
+    """)
+
+    for event in ("INSERT", "UPDATE", "DELETE"):
+
+        cur.execute(f"""
+
+            CREATE TRIGGER IF NOT EXISTS trg_leaves_version_{event.lower()}
+
+            AFTER {event} ON leaves
+
+            BEGIN
+
+                UPDATE store_meta
+
+                SET value = CAST(value AS INTEGER) + 1
+
+                WHERE key = 'data_version';
+
+            END
+
+        """)
+
+    cur.execute("""
+
+        CREATE INDEX IF NOT EXISTS idx_leaves_end_start
+
+        ON leaves (end_date, start_date)
+
+    """)
+
+    conn.commit()
+
+    conn.close()
+
+    if get_meta_raw("month_totals_ready") is None:
+
+        rebuild_leave_month_totals()
+
+    _READY_DBS.add(DB_NAME)
+
+
+def ensure_db():
+
+    if DB_NAME not in _READY_DBS:
+
+        init_db()
+
+
+# =========================================================
+# MIGRATION
+# =========================================================
+
+def migrate_db():
+
+    conn = get_connection()
+
+    cur = conn.cursor()
+
+    columns = []
+
+    try:
+
+        cur.execute(
+
+            "PRAGMA table_info(leaves)"
+
+        )
+
+        columns = [
+
+            row[1]
+
+            for row in cur.fetchall()
+
+        ]
+
+    except Exception:
+        pass
+
+    # =====================================================
+    # attachment_data
+    # =====================================================
+
+    if "attachment_data" not in columns:
+
+        try:
+
+            cur.execute("""
+
+                ALTER TABLE leaves
+
+                ADD COLUMN attachment_data BLOB
+
+            """)
+
+        except Exception:
+            pass
+
+    # =====================================================
+    # attachment_name
+    # =====================================================
+
+    if "attachment_name" not in columns:
+
+        try:
+
+            cur.execute("""
+
+                ALTER TABLE leaves
+
+                ADD COLUMN attachment_name TEXT
+
+            """)
+
+        except Exception:
+            pass
+
+    # =====================================================
+    # attachment_path
+    # =====================================================
+
+    if "attachment_path" not in columns:
+
+        try:
+
+            cur.execute("""
+
+                ALTER TABLE leaves
+
+                ADD COLUMN attachment_path TEXT
+
+            """)
+
+        except Exception:
+            pass
+
+    # =====================================================
+    # row_version — للتحقق المتفائل (optimistic) عند التعديل
+    # =====================================================
+
+    if "row_version" not in columns:
+
+        try:
+
+            cur.execute("""
+
+                ALTER TABLE leaves
+
+                ADD COLUMN row_version INTEGER DEFAULT 1
+
+            """)
+
+        except Exception:
+            pass
+
+    # =====================================================
+    # الحذف المؤقت (soft delete)
+    # =====================================================
+
+    for col in ("deleted_at", "deleted_by"):
+
+        if col not in columns:
+
+            try:
+
+                cur.execute(f"""
+
+                    ALTER TABLE leaves
+
+                    ADD COLUMN {col} TEXT
+
+                """)
+
+            except Exception:
+                pass
+
+    # =====================================================
+    # توحيد صيغة التواريخ القديمة (YYYY-MM-DD HH:MM:SS)
+    # =====================================================
+
+    try:
+
+        cur.execute("""
+
+            UPDATE leaves
+
+            SET
+                start_date = substr(start_date, 1, 10),
+                end_date = substr(end_date, 1, 10)
+
+            WHERE
+                length(start_date) > 10
+                OR length(end_date) > 10
+
+        """)
+
+    except Exception:
+        pass
+
+    conn.commit()
+
+    conn.close()
+
+
+# =========================================================
+# LOAD LEAVES
+# =========================================================
+
+def load_leaves_db():
+
+    ensure_db()
+
+    conn = get_connection()
+
+    try:
+
+        df = pd.read_sql_query(
+
+            """
+
+            SELECT *
+
+            FROM leaves
+
+            WHERE deleted_at IS NULL
+
+            ORDER BY start_date DESC
+
+            """,
+
+            conn
+
+        )
+
+    except Exception:
+
+        df = pd.DataFrame()
+
+    conn.close()
+
+    return df
+
+
+# =========================================================
+# CHECK DUPLICATE
+# =========================================================
+
+def leave_exists(
+
+    employee_id,
+    leave_type,
+    start_date,
+    end_date
+
+):
+
+    conn = get_connection()
+
+    cur = conn.cursor()
+
+    cur.execute("""
+
+        SELECT COUNT(*)
+
+        FROM leaves
+
+        WHERE
+
+            employee_id = ?
+            AND leave_type = ?
+            AND start_date = ?
+            AND end_date = ?
+            AND deleted_at IS NULL
+
+    """, (
+
+        _clean_id(employee_id),
+        _clean_text(leave_type),
+        _iso_date(start_date),
+        _iso_date(end_date)
+
+    ))
+
+    count = cur.fetchone()[0]
+
+    conn.close()
+
+    return count > 0
+
+
+# =========================================================
+# INSERT LEAVE
+# =========================================================
+
+def insert_leave(record, allow_overlap=False):
+
+    """
+    إضافة إجازة. ترجع False لو السجل مكرر (أو leave_id مستخدم)، أو لو يتداخل مع إجازة أخرى
+    لنفس الموظف (إلا مع allow_overlap=True) — تفاصيل التداخل من leave_overlaps_db.
+    """
+
+    ensure_db()
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        # =====================================================
+        # منع التكرار (داخل نفس معاملة الكتابة)
+        # =====================================================
+
+        cur.execute("""
+
+            SELECT COUNT(*)
+
+            FROM leaves
+
+            WHERE
+
+                employee_id = ?
+                AND leave_type = ?
+                AND start_date = ?
+                AND end_date = ?
+                AND deleted_at IS NULL
+
+        """, (
+
+            _clean_id(record.get("employee_id")),
+            _clean_text(record.get("leave_type")),
+            _iso_date(record.get("start_date")),
+            _iso_date(record.get("end_date"))
+
+        ))
+
+        if cur.fetchone()[0] > 0:
+
+            conn.rollback()
+
+            return False
+
+        # leave_id مستخدم (حتى لو السجل محذوف مؤقتًا) — نفس رد التكرار بدل IntegrityError
+
+        cur.execute("SELECT 1 FROM leaves WHERE leave_id = ?", (str(record.get("leave_id")),))
+
+        if cur.fetchone() is not None:
+
+            conn.rollback()
+
+            return False
+
+        # =====================================================
+        # منع التداخل مع إجازة أخرى لنفس الموظف
+        # =====================================================
+
+        if not allow_overlap and _has_overlap(
+
+            cur,
+
+            _clean_id(record.get("employee_id")),
+
+            _iso_date(record.get("start_date")),
+            _iso_date(record.get("end_date"))
+
+        ):
+
+            conn.rollback()
+
+            return False
+
+        attachment_name = _clean_text(record.get("attachment_name"))
+        attachment_data = None
+        attachment_path = _clean_text(record.get("attachment_path"))
+
+        uploaded_file = record.get(
+
+            "uploaded_file"
+
+        )
+
+        if uploaded_file is not None:
+
+            try:
+
+                attachment_name = uploaded_file.name
+
+                attachment_data = uploaded_file.getvalue()
+
+            except Exception:
+
+                attachment_name = ""
+
+                attachment_data = None
+
+        cur.execute("""
+
+        INSERT INTO leaves (
+
+            leave_id,
+
+            employee_id,
+            employee_no,
+
+            name_ar,
+            name_en,
+
+            department,
+            job_title,
+
+            leave_type,
+
+            start_date,
+            end_date,
+
+            status,
+
+            attachment_name,
+            attachment_data,
+            attachment_path,
+
+            notes,
+
+            created_at,
+            created_by
+
+        )
+
+        VALUES (
+
+            ?, ?, ?,
+            ?, ?,
+            ?, ?,
+            ?, ?, ?,
+            ?, ?, ?, ?,
+            ?, ?, ?
+
+        )
+
+        """, (
+
+            record.get("leave_id"),
+
+            _clean_id(record.get("employee_id")),
+            _clean_id(record.get("employee_no")),
+
+            _clean_text(record.get("name_ar")),
+            _clean_text(record.get("name_en")),
+
+            _clean_text(record.get("department")),
+            _clean_text(record.get("job_title")),
+
+            _clean_text(record.get("leave_type")),
+
+            _iso_date(record.get("start_date")),
+            _iso_date(record.get("end_date")),
+
+            _clean_text(record.get("status")),
+
+            attachment_name,
+            attachment_data,
+            attachment_path,
+
+            _clean_text(record.get("notes")),
+
+            str(datetime.now()),
+            _clean_text(record.get("created_by"))
+
+        ))
+
+        _apply_month_totals(
+
+            cur,
+
+            record.get("employee_id"),
+            record.get("leave_type"),
+
+            record.get("start_date"),
+            record.get("end_date"),
+
+            1
+
+        )
+
+    return True
+
+
+# =========================================================
+# DELETE LEAVE
+# =========================================================
+
+def delete_leave(leave_id, deleted_by=""):
+
+    """
+    حذف مؤقت: السجل يبقى في الجدول مع deleted_at، وتُسجل العملية في leave_history
+    حتى يمكن التراجع عنها لاحقًا (حتى بعد إعادة تشغيل التطبيق).
+    """
+
+    ensure_db()
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        old = _leave_key_row(cur, leave_id)
+
+        if not old:
+
+            conn.rollback()
+
+            return False
+
+        _apply_month_totals(
+
+            cur,
+
+            old["employee_id"],
+            old["leave_type"],
+
+            old["start_date"],
+            old["end_date"],
+
+            -1
+
+        )
+
+        now = str(datetime.now())
+
+        cur.execute(
+
+            """
+
+            UPDATE leaves
+
+            SET
+
+                deleted_at = ?,
+                deleted_by = ?,
+                row_version = COALESCE(row_version, 1) + 1
+
+            WHERE leave_id = ?
+                AND deleted_at IS NULL
+
+            """,
+
+            (now, _clean_text(deleted_by), str(leave_id))
+
+        )
+
+        _log_history(cur, leave_id, "delete", now, deleted_by)
+
+    return True
+
+
+# =========================================================
+# RESTORE / UNDO
+# =========================================================
+
+def _log_history(cur, leave_id, action, performed_at, performed_by):
+
+    cur.execute("""
+
+        INSERT INTO leave_history (leave_id, action, performed_at, performed_by)
+
+        VALUES (?, ?, ?, ?)
+
+    """, (
+
+        str(leave_id),
+        action,
+        performed_at,
+        _clean_text(performed_by)
+
+    ))
+
+
+def restore_leave(leave_id, restored_by=""):
+
+    ensure_db()
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        cur.execute(
+
+            """
+
+            UPDATE leaves
+
+            SET
+
+                deleted_at = NULL,
+                deleted_by = NULL,
+                row_version = COALESCE(row_version, 1) + 1
+
+            WHERE leave_id = ?
+                AND deleted_at IS NOT NULL
+
+            """,
+
+            (str(leave_id),)
+
+        )
+
+        if cur.rowcount == 0:
+
+            conn.rollback()
+
+            return False
+
+        row = _leave_key_row(cur, leave_id)
+
+        # إجازة أُضيفت لنفس الفترة بعد الحذف تمنع الاسترجاع
+        if _has_overlap(cur, row["employee_id"], row["start_date"], row["end_date"], leave_id):
+
+            conn.rollback()
+
+            return False
+
+        _apply_month_totals(
+
+            cur,
+
+            row["employee_id"],
+            row["leave_type"],
+
+            row["start_date"],
+            row["end_date"],
+
+            1
+
+        )
+
+        _log_history(cur, leave_id, "restore", str(datetime.now()), restored_by)
+
+    return True
+
+
+def list_deleted_leaves(limit=20, deleted_by=None, leave_ids=None):
+
+    """
+    آخر الإجازات المحذوفة التي لم يتم استرجاعها، من الأحدث للأقدم.
+    deleted_by / leave_ids: لحصر النتيجة في حذف مستخدم معيّن أو سجلات معيّنة
+    (مثل ما حُذف في الجلسة الحالية).
+    """
+
+    ensure_db()
+
+    conditions = [
+
+        "h.action = 'delete'",
+        "l.deleted_at = h.performed_at"
+
+    ]
+
+    params = []
+
+    if deleted_by is not None:
+
+        conditions.append("l.deleted_by = ?")
+        params.append(deleted_by)
+
+    if leave_ids is not None:
+
+        leave_ids = [str(x) for x in leave_ids]
+
+        if not leave_ids:
+
+            return pd.DataFrame(columns=LEAVE_COLUMNS + ["deleted_at", "deleted_by"])
+
+        conditions.append(f"l.leave_id IN ({', '.join('?' for _ in leave_ids)})")
+        params.extend(leave_ids)
+
+    params.append(int(limit))
+
+    conn = get_connection()
+
+    try:
+
+        df = pd.read_sql_query(
+
+            f"""
+
+            SELECT
+
+                {", ".join("l." + c for c in LEAVE_COLUMNS)},
+
+                l.deleted_at,
+                l.deleted_by
+
+            FROM leave_history h
+
+            JOIN leaves l ON l.leave_id = h.leave_id
+
+            WHERE
+
+                {" AND ".join(conditions)}
+
+            ORDER BY h.id DESC
+
+            LIMIT ?
+
+            """,
+
+            conn,
+
+            params=params
+
+        )
+
+    finally:
+
+        conn.close()
+
+    return df
+
+
+def undo_last_delete(restored_by="", count=1, deleted_by=None, leave_ids=None):
+
+    """
+    التراجع عن آخر count عمليات حذف. ترجع عدد السجلات المسترجعة.
+    deleted_by / leave_ids: يحصر التراجع في حذف هذا المستخدم أو هذه السجلات فقط،
+    حتى لا يسترجع المستخدم حذفًا قام به شخص آخر.
+    """
+
+    deleted = list_deleted_leaves(limit=count, deleted_by=deleted_by, leave_ids=leave_ids)
+
+    restored = 0
+
+    for leave_id in deleted["leave_id"].tolist():
+
+        if restore_leave(leave_id, restored_by):
+
+            restored += 1
+
+    return restored
+
+
+# =========================================================
+# GET ATTACHMENT
+# =========================================================
+
+def get_attachment(leave_id):
+
+    conn = get_connection()
+
+    cur = conn.cursor()
+
+    cur.execute("""
+
+        SELECT
+
+            attachment_name,
+            attachment_data
+
+        FROM leaves
+
+        WHERE leave_id = ?
+
+    """, (leave_id,))
+
+    row = cur.fetchone()
+
+    conn.close()
+
+    if row:
+
+        return {
+
+            "name": row["attachment_name"],
+
+            "data": row["attachment_data"]
+
+        }
+
+    return None
+
+
+# =========================================================
+# UPDATE LEAVE
+# =========================================================
+
+def update_leave(
+
+    leave_id,
+    data: dict,
+    expected_version=None
+
+):
+
+    """
+    expected_version: قيمة row_version التي قرأها المستخدم قبل التعديل.
+    لو تغيّر السجل من جلسة أخرى بعدها يتم رفض التعديل وإرجاع False
+    بدل الكتابة فوق تعديل الآخر. ترجع False أيضًا لو الفترة الجديدة تتداخل
+    مع إجازة أخرى لنفس الموظف.
+    """
+
+    ensure_db()
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        old = _leave_key_row(cur, leave_id)
+
+        if not old:
+
+            conn.rollback()
+
+            return False
+
+        if expected_version is not None and int(old["row_version"] or 1) != int(expected_version):
+
+            conn.rollback()
+
+            return False
+
+        if _has_overlap(
+
+            cur,
+
+            old["employee_id"],
+
+            _iso_date(data.get("start_date")),
+            _iso_date(data.get("end_date")),
+
+            leave_id
+
+        ):
+
+            conn.rollback()
+
+            return False
+
+        _apply_month_totals(
+
+            cur,
+
+            old["employee_id"],
+            old["leave_type"],
+
+            old["start_date"],
+            old["end_date"],
+
+            -1
+
+        )
+
+        _apply_month_totals(
+
+            cur,
+
+            old["employee_id"],
+            data.get("leave_type"),
+
+            data.get("start_date"),
+            data.get("end_date"),
+
+            1
+
+        )
+
+        cur.execute("""
+
+            UPDATE leaves
+
+            SET
+
+                leave_type = ?,
+                start_date = ?,
+                end_date = ?,
+                notes = ?,
+                status = ?,
+                row_version = COALESCE(row_version, 1) + 1
+
+            WHERE leave_id = ?
+                AND deleted_at IS NULL
+
+        """, (
+
+            _clean_text(data.get("leave_type")),
+
+            _iso_date(data.get("start_date")),
+
+            _iso_date(data.get("end_date")),
+
+            _clean_text(data.get("notes")),
+
+            _clean_text(data.get("status")),
+
+            str(leave_id)
+
+        ))
+
+        # =====================================================
+        # استبدال المرفق (اختياري)
+        # =====================================================
+
+        if "attachment_path" in data:
+
+            cur.execute("""
+
+                UPDATE leaves
+
+                SET
+
+                    attachment_name = ?,
+                    attachment_path = ?
+
+                WHERE leave_id = ?
+
+            """, (
+
+                _clean_text(data.get("attachment_name")),
+
+                _clean_text(data.get("attachment_path")),
+
+                str(leave_id)
+
+            ))
+
+    return True
+
+
+# =========================================================
+# GET LEAVE
+# =========================================================
+
+def get_leave(leave_id):
+
+    ensure_db()
+
+    conn = get_connection()
+
+    cur = conn.cursor()
+
+    cur.execute(
+
+        f"""
+
+        SELECT {", ".join(LEAVE_COLUMNS)}
+
+        FROM leaves
+
+        WHERE leave_id = ?
+            AND deleted_at IS NULL
+
+        """,
+
+        (str(leave_id).strip(),)
+
+    )
+
+    row = cur.fetchone()
+
+    conn.close()
+
+    if row:
+
+        return dict(row)
+
+    return None
+
+
+# =========================================================
+# QUERY LEAVES (موظف / فترة)
+# =========================================================
+
+def query_leaves_db(
+
+    employee_keys=None,
+    date_from=None,
+    date_to=None
+
+):
+
+    """
+    ترجع الإجازات المتقاطعة مع الفترة [date_from, date_to] لموظف أو أكثر.
+    المطابقة على employee_id أو employee_no، والاستعلام يستخدم فهرس
+    (employee_id, start_date, end_date) بدل تحميل كل السجلات والفلترة في pandas.
+    """
+
+    ensure_db()
+
+    if isinstance(employee_keys, str):
+
+        employee_keys = [employee_keys]
+
+    keys = None
+
+    if employee_keys is not None:
+
+        keys = sorted({
+
+            _clean_id(k)
+
+            for k in employee_keys
+
+            if _clean_id(k)
+
+        })
+
+        if not keys:
+
+            return pd.DataFrame(columns=LEAVE_COLUMNS)
+
+    period_sql = ""
+    period_params = []
+
+    if date_from is not None:
+
+        period_sql += " AND end_date >= ?"
+        period_params.append(_iso_date(date_from))
+
+    if date_to is not None:
+
+        period_sql += " AND start_date <= ?"
+        period_params.append(_iso_date(date_to))
+
+    key_chunks = [None]
+
+    if keys is not None:
+
+        key_chunks = [
+
+            keys[i:i + QUERY_CHUNK_SIZE]
+
+            for i in range(0, len(keys), QUERY_CHUNK_SIZE)
+
+        ]
+
+    conn = get_connection()
+
+    frames = []
+
+    try:
+
+        for chunk in key_chunks:
+
+            key_sql = ""
+            key_params = []
+
+            if chunk is not None:
+
+                marks = ", ".join("?" * len(chunk))
+
+                key_sql = f" AND (employee_id IN ({marks}) OR employee_no IN ({marks}))"
+                key_params = chunk + chunk
+
+            frames.append(
+
+                pd.read_sql_query(
+
+                    f"""
+
+                    SELECT {", ".join(LEAVE_COLUMNS)}
+
+                    FROM leaves
+
+                    WHERE deleted_at IS NULL{key_sql}{period_sql}
+
+                    ORDER BY start_date DESC, end_date DESC
+
+                    """,
+
+                    conn,
+
+                    params=key_params + period_params
+
+                )
+
+            )
+
+    finally:
+
+        conn.close()
+
+    if len(frames) == 1:
+
+        return frames[0]
+
+    df = pd.concat(frames, ignore_index=True)
+
+    return df.sort_values(
+
+        ["start_date", "end_date"],
+
+        ascending=[False, False]
+
+    ).reset_index(drop=True)
+
+
+# =========================================================
+# BULK IMPORT
+# =========================================================
+
+IMPORT_SKIPPED_COLUMNS = ["row", "leave_id", "employee_id", "leave_type", "start_date", "end_date", "reason"]
+
+
+def _import_leave_id(r):
+
+    # رقم ثابت للسجل بدون leave_id من محتواه (الموظف، النوع، الفترة):
+    # نفس السجل في استيراد لاحق يأخذ نفس الرقم، وسجل مختلف لا يصطدم برقم سجل آخر
+
+    key = "|".join((
+
+        _clean_id(r.get("employee_id")),
+        _clean_text(r.get("leave_type")),
+        _iso_date(r.get("start_date")),
+        _iso_date(r.get("end_date"))
+
+    ))
+
+    return "LV-IMP-" + hashlib.md5(key.encode("utf-8")).hexdigest()[:16]
+
+
+def import_leaves(df: pd.DataFrame, skip_overlaps=False):
+
+    """
+    إدخال مجموعة إجازات في عملية واحدة (مثل ملف leaves.xlsx القديم). ترجع عدد المضاف،
+    وتفاصيل السجلات المتجاهلة من import_leaves_report.
+    """
+
+    return import_leaves_report(df, skip_overlaps=skip_overlaps)[0]
+
+
+def import_leaves_report(df: pd.DataFrame, skip_overlaps=False):
+
+    """
+    مثل import_leaves لكن ترجع (عدد المضاف، جدول السجلات المتجاهلة مع السبب).
+    السجلات التي لها نفس leave_id موجود مسبقًا يتم تجاهلها.
+    skip_overlaps: تجاهل السجلات المتداخلة مع إجازة موجودة لنفس الموظف
+    (بما فيها سجلات سابقة من نفس الملف) — راجع check_import_overlaps قبل الاستيراد.
+    """
+
+    ensure_db()
+
+    if df is None or df.empty:
+
+        return 0, pd.DataFrame(columns=IMPORT_SKIPPED_COLUMNS)
+
+    rows = []
+
+    skipped = []
+
+    now = str(datetime.now())
+
+    def skip(i, row, reason):
+
+        skipped.append((i + 1, row[0], row[1], row[7], row[8], row[9], reason))
+
+    for i, r in enumerate(df.to_dict("records")):
+
+        leave_id = _clean_text(r.get("leave_id")) or _import_leave_id(r)
+
+        start_date = _iso_date(r.get("start_date"))
+        end_date = _iso_date(r.get("end_date"))
+
+        if not start_date or not end_date:
+
+            skipped.append((
+
+                i + 1, leave_id, _clean_id(r.get("employee_id")), _clean_text(r.get("leave_type")),
+                start_date, end_date, "تاريخ غير صالح"
+
+            ))
+
+            continue
+
+        rows.append((i, (
+
+            leave_id,
+
+            _clean_id(r.get("employee_id")),
+            _clean_id(r.get("employee_no")),
+
+            _clean_text(r.get("name_ar")),
+            _clean_text(r.get("name_en")),
+
+            _clean_text(r.get("department")),
+            _clean_text(r.get("job_title")),
+
+            _clean_text(r.get("leave_type")),
+
+            start_date,
+            end_date,
+
+            _clean_text(r.get("status")),
+
+            _clean_text(r.get("attachment_name")),
+            _clean_text(r.get("attachment_path")),
+
+            _clean_text(r.get("notes")),
+
+            _clean_text(r.get("created_at")) or now,
+            _clean_text(r.get("created_by"))
+
+        )))
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        inserted = 0
+
+        for i, row in rows:
+
+            if skip_overlaps and _has_overlap(cur, row[1], row[8], row[9]):
+
+                skip(i, row, "تداخل مع إجازة أخرى")
+
+                continue
+
+            cur.execute("""
+
+            INSERT OR IGNORE INTO leaves (
+
+                leave_id,
+
+                employee_id,
+                employee_no,
+
+                name_ar,
+                name_en,
+
+                department,
+                job_title,
+
+                leave_type,
+
+                start_date,
+                end_date,
+
+                status,
+
+                attachment_name,
+                attachment_path,
+
+                notes,
+
+                created_at,
+                created_by
+
+            )
+
+            VALUES (
+
+                ?, ?, ?,
+                ?, ?,
+                ?, ?,
+                ?, ?, ?,
+                ?, ?, ?,
+                ?, ?, ?
+
+            )
+
+            """, row)
+
+            if cur.rowcount:
+
+                inserted += 1
+
+                _apply_month_totals(cur, row[1], row[7], row[8], row[9], 1)
+
+            else:
+
+                skip(i, row, "leave_id موجود مسبقًا")
+
+    return inserted, pd.DataFrame(skipped, columns=IMPORT_SKIPPED_COLUMNS)
+
+
+# =========================================================
+# OVERLAP DETECTION
+# =========================================================
+
+OVERLAP_COLUMNS = [
+    "employee_id",
+    "leave_id",
+    "leave_type",
+    "start_date",
+    "end_date",
+    "other_leave_id",
+    "other_leave_type",
+    "other_start_date",
+    "other_end_date",
+    "overlap_start",
+    "overlap_end",
+    "overlap_days",
+]
+
+
+def _has_overlap(cur, employee_id, start_date, end_date, exclude_leave_id=None):
+
+    """
+    exclude_leave_id: السجل نفسه عند التعديل أو الاسترجاع (لا يتداخل مع نفسه).
+    """
+
+    cur.execute("""
+
+        SELECT 1
+
+        FROM leaves
+
+        WHERE employee_id = ?
+            AND start_date <= ?
+            AND end_date >= ?
+            AND deleted_at IS NULL
+            AND (leave_id IS NULL OR leave_id != ?)
+
+        LIMIT 1
+
+    """, (employee_id, end_date, start_date, _clean_text(exclude_leave_id)))
+
+    return cur.fetchone() is not None
+
+
+def find_overlaps(df: pd.DataFrame) -> pd.DataFrame:
+
+    """
+    كل أزواج الإجازات المتداخلة لنفس الموظف (sweep line):
+    ترتيب الفترات حسب (الموظف، البداية) ثم مرور واحد مع كومة (heap)
+    بنهايات الفترات المفتوحة — O(n log n + عدد أزواج التداخل).
+    """
+
+    if df is None or df.empty:
+
+        return pd.DataFrame(columns=OVERLAP_COLUMNS)
+
+    x = pd.DataFrame({
+
+        "employee_id": df["employee_id"].map(_clean_id),
+        "leave_id": df["leave_id"].map(_clean_text),
+        "leave_type": df["leave_type"].map(_clean_text),
+        "start_date": df["start_date"].map(_iso_date),
+        "end_date": df["end_date"].map(_iso_date),
+
+    })
+
+    x = x[(x["start_date"] != "") & (x["end_date"] != "") & (x["end_date"] >= x["start_date"])]
+
+    x = x.sort_values(["employee_id", "start_date", "end_date"], kind="stable")
+
+    pairs = []
+
+    current = None
+
+    active = []
+
+    for i, r in enumerate(x.itertuples(index=False)):
+
+        if r.employee_id != current:
+
+            current = r.employee_id
+
+            active = []
+
+        # إخراج الفترات التي انتهت قبل بداية الفترة الحالية
+        while active and active[0][0] < r.start_date:
+
+            heapq.heappop(active)
+
+        for _, _, o in active:
+
+            overlap_end = min(o.end_date, r.end_date)
+
+            pairs.append((
+
+                r.employee_id,
+
+                o.leave_id, o.leave_type, o.start_date, o.end_date,
+
+                r.leave_id, r.leave_type, r.start_date, r.end_date,
+
+                r.start_date, overlap_end
+
+            ))
+
+        heapq.heappush(active, (r.end_date, i, r))
+
+    out = pd.DataFrame(pairs, columns=OVERLAP_COLUMNS[:-1])
+
+    out["overlap_days"] = (
+
+        pd.to_datetime(out["overlap_end"]) - pd.to_datetime(out["overlap_start"])
+
+    ).dt.days + 1
+
+    return out
+
+
+def leave_overlaps_db(employee_id, start_date, end_date, exclude_leave_id=None):
+
+    """
+    الإجازات الحالية لنفس الموظف المتقاطعة مع الفترة (تستخدم الفهرس idx_leaves_employee_period).
+    """
+
+    ensure_db()
+
+    conn = get_connection()
+
+    try:
+
+        df = pd.read_sql_query(
+
+            f"""
+
+            SELECT {", ".join(LEAVE_COLUMNS)}
+
+            FROM leaves
+
+            WHERE employee_id = ?
+                AND start_date <= ?
+                AND end_date >= ?
+                AND deleted_at IS NULL
+                AND (leave_id IS NULL OR leave_id != ?)
+
+            ORDER BY start_date
+
+            """,
+
+            conn,
+
+            params=(
+
+                _clean_id(employee_id),
+                _iso_date(end_date),
+                _iso_date(start_date),
+                _clean_text(exclude_leave_id)
+
+            )
+
+        )
+
+    finally:
+
+        conn.close()
+
+    return df
+
+
+def audit_leave_overlaps():
+
+    """
+    تقرير كامل بكل الإجازات المتداخلة في المخزن.
+    """
+
+    return find_overlaps(load_leaves_db())
+
+
+def check_import_overlaps(df: pd.DataFrame):
+
+    """
+    التداخلات التي سيسببها استيراد df: بين سجلات الملف نفسه أو مع الإجازات الحالية.
+    يُرجع فقط الأزواج التي تشمل سجلًا واحدًا على الأقل من الملف.
+    """
+
+    if df is None or df.empty or not {"employee_id", "start_date", "end_date"}.issubset(df.columns):
+
+        return pd.DataFrame(columns=OVERLAP_COLUMNS)
+
+    incoming = df.copy()
+
+    for c in ("leave_id", "leave_type"):
+
+        if c not in incoming.columns:
+
+            incoming[c] = ""
+
+    incoming["leave_id"] = [
+
+        _clean_text(r.get("leave_id")) or _import_leave_id(r)
+
+        for r in incoming.to_dict("records")
+
+    ]
+
+    starts = incoming["start_date"].map(_iso_date)
+    ends = incoming["end_date"].map(_iso_date)
+
+    valid = (starts != "") & (ends != "")
+
+    if not valid.any():
+
+        return pd.DataFrame(columns=OVERLAP_COLUMNS)
+
+    existing = query_leaves_db(
+
+        incoming["employee_id"].map(_clean_id).unique().tolist(),
+
+        starts[valid].min(),
+        ends[valid].max()
+
+    )
+
+    existing = existing[~existing["leave_id"].isin(incoming["leave_id"])]
+
+    overlaps = find_overlaps(pd.concat([
+
+        existing[["employee_id", "leave_id", "leave_type", "start_date", "end_date"]],
+        incoming[["employee_id", "leave_id", "leave_type", "start_date", "end_date"]]
+
+    ], ignore_index=True))
+
+    new_ids = set(incoming["leave_id"])
+
+    return overlaps[
+
+        overlaps["leave_id"].isin(new_ids) | overlaps["other_leave_id"].isin(new_ids)
+
+    ].reset_index(drop=True)
+
+
+# =========================================================
+# MONTHLY LEAVE-DAY TOTALS
+# =========================================================
+
+def rebuild_leave_month_totals():
+
+    """
+    إعادة بناء جدول leave_month_totals من كل الإجازات (مرة واحدة عند الترقية).
+    بعد ذلك يتم تحديثه تدريجيًا مع كل إضافة أو تعديل أو حذف.
+    """
+
+    with write_transaction() as conn:
+
+        cur = conn.cursor()
+
+        cur.execute("DELETE FROM leave_month_totals")
+
+        cur.execute("""
+
+            SELECT employee_id, leave_type, start_date, end_date
+
+            FROM leaves
+
+            WHERE deleted_at IS NULL
+
+        """)
+
+        for r in cur.fetchall():
+
+            _apply_month_totals(
+
+                cur,
+
+                r["employee_id"],
+                r["leave_type"],
+
+                r["start_date"],
+                r["end_date"],
+
+                1
+
+            )
+
+        cur.execute(
+
+            """
+
+            INSERT INTO store_meta (key, value)
+
+            VALUES ('month_totals_ready', '1')
+
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+
+            """
+
+        )
+
+
+def leave_day_totals_db(
+
+    date_from=None,
+    date_to=None,
+    leave_types=None
+
+):
+
+    """
+    إجمالي أيام الإجازات لكل (موظف، نوع) داخل الفترة.
+    الشهور الكاملة تُقرأ من leave_month_totals، والشهور الجزئية عند حدود الفترة
+    فقط يتم حسابها من سجلات الإجازات مع القص عند حدود الفترة.
+    """
+
+    ensure_db()
+
+    d_from = pd.to_datetime(date_from).normalize() if date_from is not None else None
+    d_to = pd.to_datetime(date_to).normalize() if date_to is not None else None
 
-    conn = sqlite3.connect(
+    full_from = d_from.to_period("M") if d_from is not None else None
+    full_to = d_to.to_period("M") if d_to is not None else None
 
-        DB_NAME,
+    segments = []
 
-        check_same_thread=False
+    if d_from is not None and d_from.day != 1:
 
-    )
+        seg_end = d_from + pd.offsets.MonthEnd(0)
 
-    conn.row_factory = sqlite3.Row
+        if d_to is not None and d_to < seg_end:
 
-    return conn
+            seg_end = d_to
 
+        segments.append((d_from, seg_end))
 
-# =========================================================
-# INIT DATABASE
-# =========================================================
+        full_from = full_from + 1
 
-def init_db():
+    if d_to is not None and not d_to.is_month_end:
 
-    conn = get_connection()
+        seg_start = d_to.replace(day=1)
 
-    cur = conn.cursor()
+        if not (segments and full_to == d_from.to_period("M")):
 
-    cur.execute("""
+            if d_from is not None and seg_start < d_from:
 
-    CREATE TABLE IF NOT EXISTS leaves (
+                seg_start = d_from
 
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+            segments.append((seg_start, d_to))
 
-        leave_id TEXT UNIQUE,
+        full_to = full_to - 1
 
-        employee_id TEXT,
-        employee_no TEXT,
+    type_sql = ""
+    type_params = []
 
-        name_ar TEXT,
-        name_en TEXT,
+    if leave_types is not None:
 
-        department TEXT,
-        job_title TEXT,
+        types = [_clean_text(x) for x in leave_types]
 
-        leave_type TEXT,
+        type_sql = f" AND leave_type IN ({', '.join('?' * len(types))})"
+        type_params = types
 
-        start_date TEXT,
-        end_date TEXT,
+    conn = get_connection()
 
-        status TEXT,
+    frames = []
 
-        attachment_name TEXT,
-        attachment_data BLOB,
+    try:
 
-        notes TEXT,
+        if full_from is None or full_to is None or full_from <= full_to:
 
-        created_at TEXT,
-        created_by TEXT
+            month_sql = ""
+            month_params = []
 
-    )
+            if full_from is not None:
 
-    """)
+                month_sql += " AND month >= ?"
+                month_params.append(full_from.strftime("%Y-%m"))
 
-    conn.commit()
+            if full_to is not None:
 
-    conn.close()
+                month_sql += " AND month <= ?"
+                month_params.append(full_to.strftime("%Y-%m"))
 
-    migrate_db()
+            frames.append(
 
+                pd.read_sql_query(
 
-# =========================================================
-# MIGRATION
-# =========================================================
+                    f"""
 
-def migrate_db():
+                    SELECT employee_id, leave_type, SUM(days) AS days
 
-    conn = get_connection()
+                    FROM leave_month_totals
 
-    cur = conn.cursor()
+                    WHERE 1 = 1{month_sql}{type_sql}
 
-    columns = []
+                    GROUP BY employee_id, leave_type
 
-    try:
+                    """,
 
-        cur.execute(
+                    conn,
 
-            "PRAGMA table_info(leaves)"
+                    params=month_params + type_params
 
-        )
+                )
 
-        columns = [
+            )
 
-            row[1]
+        for seg_start, seg_end in segments:
 
-            for row in cur.fetchall()
+            a = seg_start.strftime("%Y-%m-%d")
+            b = seg_end.strftime("%Y-%m-%d")
 
-        ]
+            frames.append(
 
-    except Exception:
-        pass
+                pd.read_sql_query(
 
-    # =====================================================
-    # attachment_data
-    # =====================================================
+                    f"""
 
-    if "attachment_data" not in columns:
+                    SELECT
 
-        try:
+                        employee_id,
+                        leave_type,
 
-            cur.execute("""
+                        SUM(
 
-                ALTER TABLE leaves
+                            CAST(julianday(MIN(end_date, ?)) - julianday(MAX(start_date, ?)) AS INTEGER) + 1
 
-                ADD COLUMN attachment_data BLOB
+                        ) AS days
 
-            """)
+                    FROM leaves
 
-        except Exception:
-            pass
+                    WHERE
 
-    # =====================================================
-    # attachment_name
-    # =====================================================
+                        end_date >= ?
+                        AND start_date <= ?
+                        AND end_date >= start_date
+                        AND deleted_at IS NULL{type_sql}
 
-    if "attachment_name" not in columns:
+                    GROUP BY employee_id, leave_type
 
-        try:
+                    """,
 
-            cur.execute("""
+                    conn,
 
-                ALTER TABLE leaves
+                    params=[b, a, a, b] + type_params
 
-                ADD COLUMN attachment_name TEXT
+                )
 
-            """)
+            )
 
-        except Exception:
-            pass
+    finally:
 
-    conn.commit()
+        conn.close()
 
-    conn.close()
+    frames = [f for f in frames if not f.empty]
+
+    if not frames:
+
+        return pd.DataFrame(columns=["employee_id", "leave_type", "days"])
+
+    out = (
+
+        pd.concat(frames, ignore_index=True)
+
+        .groupby(["employee_id", "leave_type"], as_index=False)["days"]
+
+        .sum()
+
+    )
+
+    out["days"] = out["days"].astype(int)
+
+    return out[out["days"] > 0].reset_index(drop=True)
 
 
 # =========================================================
-# LOAD LEAVES
+# ANNUAL LEAVE BALANCE LEDGER
 # =========================================================
 
-def load_leaves_db():
+LEDGER_COLUMNS = [
+    "employee_id",
+    "month",
+    "accrued",
+    "used",
+    "accrued_total",
+    "used_total",
+    "balance",
+]
 
-    init_db()
 
-    conn = get_connection()
+def set_leave_entitlement(
 
-    try:
+    employee_id,
+    annual_days=DEFAULT_ANNUAL_ENTITLEMENT,
+    accrual_start=None,
+    opening_balance=0,
+    updated_by=""
 
-        df = pd.read_sql_query(
+):
 
-            """
+    """
+    تحديد الاستحقاق السنوي للموظف (يُستحق شهريًا annual_days / 12 من شهر accrual_start)
+    والرصيد الافتتاحي. يتم إعادة احتساب سجل رصيده عند أول قراءة.
+    """
 
-            SELECT *
+    ensure_db()
 
-            FROM leaves
+    with write_transaction() as conn:
 
-            ORDER BY start_date DESC
+        cur = conn.cursor()
 
-            """,
+        cur.execute("""
 
-            conn
+            INSERT INTO leave_entitlements (
 
-        )
+                employee_id, annual_days, accrual_start, opening_balance, updated_at, updated_by
 
-    except Exception:
+            )
 
-        df = pd.DataFrame()
+            VALUES (?, ?, ?, ?, ?, ?)
 
-    conn.close()
+            ON CONFLICT(employee_id) DO UPDATE SET
 
-    return df
+                annual_days = excluded.annual_days,
+                accrual_start = excluded.accrual_start,
+                opening_balance = excluded.opening_balance,
+                updated_at = excluded.updated_at,
+                updated_by = excluded.updated_by
 
+        """, (
 
-# =========================================================
-# CHECK DUPLICATE
-# =========================================================
+            _clean_id(employee_id),
 
-def leave_exists(
+            float(annual_days),
 
-    employee_id,
-    leave_type,
-    start_date,
-    end_date
+            _iso_date(accrual_start) or datetime.now().strftime("%Y-01-01"),
+
+            float(opening_balance or 0),
+
+            str(datetime.now()),
+
+            _clean_text(updated_by)
+
+        ))
+
+        _mark_ledger_dirty(cur, employee_id)
+
+
+def seed_leave_entitlements(
+
+    employee_ids,
+    annual_days=DEFAULT_ANNUAL_ENTITLEMENT,
+    accrual_start=None,
+    updated_by=""
 
 ):
 
-    conn = get_connection()
+    """
+    إضافة الاستحقاق الافتراضي للموظفين الذين ليس لهم استحقاق مسجل فقط.
+    ترجع عدد الموظفين المضافين.
+    """
 
-    cur = conn.cursor()
+    ensure_db()
 
-    cur.execute("""
+    start = _iso_date(accrual_start) or datetime.now().strftime("%Y-01-01")
 
-        SELECT COUNT(*)
+    now = str(datetime.now())
 
-        FROM leaves
+    with write_transaction() as conn:
 
-        WHERE
+        cur = conn.cursor()
 
-            employee_id = ?
-            AND leave_type = ?
-            AND start_date = ?
-            AND end_date = ?
+        added = 0
 
-    """, (
+        for emp in {_clean_id(e) for e in employee_ids} - {""}:
 
-        str(employee_id),
-        str(leave_type),
-        str(start_date),
-        str(end_date)
+            cur.execute("""
 
-    ))
+                INSERT OR IGNORE INTO leave_entitlements (
 
-    count = cur.fetchone()[0]
+                    employee_id, annual_days, accrual_start, opening_balance, updated_at, updated_by
 
-    conn.close()
+                )
 
-    return count > 0
+                VALUES (?, ?, ?, 0, ?, ?)
 
+            """, (emp, float(annual_days), start, now, _clean_text(updated_by)))
 
-# =========================================================
-# INSERT LEAVE
-# =========================================================
+            if cur.rowcount:
 
-def insert_leave(record):
+                added += 1
 
-    init_db()
+                _mark_ledger_dirty(cur, emp)
 
-    # =====================================================
-    # منع التكرار
-    # =====================================================
+    return added
 
-    exists = leave_exists(
 
-        record.get("employee_id"),
+def load_leave_entitlements():
 
-        record.get("leave_type"),
+    ensure_db()
 
-        record.get("start_date"),
+    conn = get_connection()
 
-        record.get("end_date")
+    df = pd.read_sql_query("SELECT * FROM leave_entitlements", conn)
 
-    )
+    conn.close()
+
+    return df
+
+
+def refresh_balance_ledger():
 
-    if exists:
+    """
+    إعادة احتساب سجل الرصيد الشهري للموظفين المعلّمين فقط (تغيّر الاستحقاق أو أيام السنوية).
+    لكل شهر من بداية الاستحقاق حتى الشهر الحالي (أو آخر شهر فيه سنوية):
+    المستحق = annual_days / 12، المستخدم من leave_month_totals، والرصيد = الافتتاحي + التراكمي.
+    ترجع عدد الموظفين الذين تم احتسابهم.
+    """
 
-        return False
+    ensure_db()
 
+    # فحص سريع بدون قفل كتابة (الحالة الغالبة: لا يوجد شيء لإعادة احتسابه)
     conn = get_connection()
 
-    cur = conn.cursor()
+    pending = conn.execute("SELECT 1 FROM leave_ledger_dirty LIMIT 1").fetchone()
 
-    attachment_name = ""
-    attachment_data = None
+    conn.close()
 
-    uploaded_file = record.get(
+    if pending is None:
 
-        "uploaded_file"
+        return 0
 
-    )
+    with write_transaction() as conn:
 
-    if uploaded_file is not None:
+        cur = conn.cursor()
 
-        try:
+        dirty = [r["employee_id"] for r in cur.execute("SELECT employee_id FROM leave_ledger_dirty").fetchall()]
 
-            attachment_name = uploaded_file.name
+        if not dirty:
 
-            attachment_data = uploaded_file.getvalue()
+            conn.rollback()
 
-        except Exception:
+            return 0
 
-            attachment_name = ""
+        ents = pd.read_sql_query("SELECT * FROM leave_entitlements", conn)
+        ents = ents[ents["employee_id"].isin(dirty)]
 
-            attachment_data = None
+        used = pd.read_sql_query(
 
-    cur.execute("""
+            "SELECT employee_id, month, days FROM leave_month_totals WHERE leave_type = ? AND days != 0",
 
-    INSERT INTO leaves (
+            conn,
 
-        leave_id,
+            params=(ANNUAL_LEAVE_TYPE,)
 
-        employee_id,
-        employee_no,
+        )
+        used = used[used["employee_id"].isin(set(ents["employee_id"]))]
+        used_by_emp = {emp: g.set_index("month")["days"] for emp, g in used.groupby("employee_id")}
 
-        name_ar,
-        name_en,
+        this_month = pd.Period(datetime.now(), freq="M")
 
-        department,
-        job_title,
+        rows = []
 
-        leave_type,
+        for e in ents.itertuples(index=False):
 
-        start_date,
-        end_date,
+            start = pd.Period(pd.to_datetime(e.accrual_start), freq="M")
 
-        status,
+            emp_used = used_by_emp.get(e.employee_id, pd.Series(dtype="int64"))
+            last_used = pd.Period(max(emp_used.index), freq="M") if len(emp_used) else start
 
-        attachment_name,
-        attachment_data,
+            months = pd.period_range(start, max(this_month, last_used), freq="M")
 
-        notes,
+            accrued = pd.Series(float(e.annual_days) / 12, index=months.strftime("%Y-%m"))
+            month_used = emp_used.reindex(accrued.index, fill_value=0).astype(int)
 
-        created_at,
-        created_by
+            accrued_total = accrued.cumsum()
+            used_total = month_used.cumsum()
+            balance = float(e.opening_balance or 0) + accrued_total - used_total
 
-    )
+            rows.extend(zip(
 
-    VALUES (
+                [e.employee_id] * len(months),
 
-        ?, ?, ?,
-        ?, ?,
-        ?, ?,
-        ?, ?, ?,
-        ?, ?, ?,
-        ?, ?, ?
+                accrued.index,
 
-    )
+                accrued.round(4),
+                month_used.astype(int),
 
-    """, (
+                accrued_total.round(4),
+                used_total.astype(int),
 
-        record.get("leave_id"),
+                balance.round(4)
 
-        str(record.get("employee_id")),
-        str(record.get("employee_no")),
+            ))
 
-        str(record.get("name_ar")),
-        str(record.get("name_en")),
+        for i in range(0, len(dirty), QUERY_CHUNK_SIZE):
 
-        str(record.get("department")),
-        str(record.get("job_title")),
+            chunk = dirty[i:i + QUERY_CHUNK_SIZE]
 
-        str(record.get("leave_type")),
+            cur.execute(
 
-        str(record.get("start_date")),
-        str(record.get("end_date")),
+                f"DELETE FROM leave_balance_ledger WHERE employee_id IN ({', '.join('?' * len(chunk))})",
 
-        str(record.get("status")),
+                chunk
 
-        attachment_name,
-        attachment_data,
+            )
 
-        str(record.get("notes")),
+        cur.executemany(
 
-        str(datetime.now()),
-        str(record.get("created_by"))
+            f"INSERT INTO leave_balance_ledger ({', '.join(LEDGER_COLUMNS)}) VALUES ({', '.join('?' * len(LEDGER_COLUMNS))})",
 
-    ))
+            [tuple(v.item() if hasattr(v, "item") else v for v in r) for r in rows]
 
-    conn.commit()
+        )
 
-    conn.close()
+        cur.execute("DELETE FROM leave_ledger_dirty")
 
-    return True
+    return len(ents)
 
 
-# =========================================================
-# DELETE LEAVE
-# =========================================================
+def _extend_balances(df, month):
+
+    # الأشهر بعد آخر شهر محسوب ليس فيها استخدام (وإلا لتم احتسابها)، فيُضاف المستحق فقط
+
+    if df.empty:
+
+        return df
+
+    gap = (
+
+        pd.PeriodIndex(pd.Series(month, index=df.index), freq="M").asi8
+
+        - pd.PeriodIndex(df["month"], freq="M").asi8
 
-def delete_leave(leave_id):
+    )
+
+    monthly = df["annual_days"] / 12
+
+    df["accrued_total"] = df["accrued_total"] + gap * monthly
+    df["balance"] = df["balance"] + gap * monthly
+    df["month"] = month
+
+    return df
+
+
+def leave_balances_as_of(on_date=None, employee_id=None):
+
+    """
+    رصيد الإجازة السنوية في نهاية شهر on_date لكل الموظفين (أو موظف واحد)،
+    قراءة مباشرة من leave_balance_ledger بالمفتاح (employee_id, month).
+    (MAX(month) مع GROUP BY في SQLite يُرجع باقي أعمدة نفس الصف)
+    """
+
+    refresh_balance_ledger()
+
+    month = pd.Timestamp(on_date if on_date is not None else datetime.now()).strftime("%Y-%m")
+
+    emp_sql = ""
+    params = [month]
+
+    if employee_id is not None:
+
+        emp_sql = " AND l.employee_id = ?"
+        params.append(_clean_id(employee_id))
 
     conn = get_connection()
 
-    cur = conn.cursor()
+    df = pd.read_sql_query(
 
-    cur.execute(
+        f"""
 
-        """
+        SELECT l.employee_id, MAX(l.month) AS month,
+               l.accrued_total, l.used_total, l.balance,
+               e.annual_days, e.accrual_start, e.opening_balance
 
-        DELETE FROM leaves
+        FROM leave_balance_ledger l
 
-        WHERE leave_id = ?
+        JOIN leave_entitlements e ON e.employee_id = l.employee_id
+
+        WHERE l.month <= ?{emp_sql}
+
+        GROUP BY l.employee_id
 
         """,
 
-        (leave_id,)
+        conn,
 
-    )
+        params=params
 
-    conn.commit()
+    )
 
     conn.close()
 
+    return _extend_balances(df, month)
 
-# =========================================================
-# GET ATTACHMENT
-# =========================================================
 
-def get_attachment(leave_id):
+def get_leave_balance(employee_id, on_date=None):
 
-    conn = get_connection()
+    """
+    رصيد موظف واحد في تاريخ معين (dict)، أو None لو لا يوجد له استحقاق
+    أو التاريخ قبل بداية الاستحقاق.
+    """
 
-    cur = conn.cursor()
+    df = leave_balances_as_of(on_date, employee_id)
 
-    cur.execute("""
+    if df.empty:
 
-        SELECT
+        return None
 
-            attachment_name,
-            attachment_data
+    return df.iloc[0].to_dict()
 
-        FROM leaves
 
-        WHERE leave_id = ?
+def load_balance_ledger(employee_id):
 
-    """, (leave_id,))
+    refresh_balance_ledger()
 
-    row = cur.fetchone()
+    conn = get_connection()
 
-    conn.close()
+    df = pd.read_sql_query(
 
-    if row:
+        f"SELECT {', '.join(LEDGER_COLUMNS)} FROM leave_balance_ledger WHERE employee_id = ? ORDER BY month",
 
-        return {
+        conn,
 
-            "name": row["attachment_name"],
+        params=(_clean_id(employee_id),)
 
-            "data": row["attachment_data"]
+    )
 
-        }
+    conn.close()
 
-    return None
+    return df
 
 
 # =========================================================
-# UPDATE LEAVE
+# DATA VERSION
 # =========================================================
 
-def update_leave(
+def get_leaves_version():
 
-    leave_id,
-    data: dict
+    """
+    رقم إصدار بيانات الإجازات: يزيد مع كل إضافة أو تعديل أو حذف،
+    ويمكن استخدامه كمفتاح لأي cache في التطبيق أو المحرك.
+    """
 
-):
+    return int(get_meta("data_version", 0) or 0)
+
+
+# =========================================================
+# STORE META
+# =========================================================
+
+def get_meta_raw(key, default=None):
+
+    # بدون ensure_db — تُستخدم أثناء التهيئة نفسها
 
     conn = get_connection()
 
     cur = conn.cursor()
 
-    cur.execute("""
+    cur.execute(
 
-        UPDATE leaves
+        "SELECT value FROM store_meta WHERE key = ?",
 
-        SET
+        (key,)
 
-            leave_type = ?,
-            start_date = ?,
-            end_date = ?,
-            notes = ?,
-            status = ?
+    )
 
-        WHERE leave_id = ?
+    row = cur.fetchone()
 
-    """, (
+    conn.close()
+
+    if row:
 
-        str(data.get("leave_type")),
+        return row["value"]
 
-        str(data.get("start_date")),
+    return default
 
-        str(data.get("end_date")),
 
-        str(data.get("notes")),
+def get_meta(key, default=None):
 
-        str(data.get("status")),
+    ensure_db()
 
-        str(leave_id)
+    return get_meta_raw(key, default)
 
-    ))
 
-    conn.commit()
+def set_meta(key, value):
 
-    conn.close()
+    ensure_db()
+
+    with write_transaction() as conn:
+
+        conn.execute(
+
+            """
+
+            INSERT INTO store_meta (key, value)
+
+            VALUES (?, ?)
+
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+
+            """,
+
+            (key, str(value))
+
+        )
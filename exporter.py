@@ -0,0 +1,399 @@
+# =========================
+# exporter.py
+# =========================
+# تصدير مخرجات process_attendance (الملخص، التأخير، الغياب، المستثنون، الإجازات)
+# لملفات تستخدمها الرواتب. لا يعتمد على Streamlit.
+import datetime as dt
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import xlsxwriter
+
+
+# أوراق ملف Excel بالترتيب: (مفتاح، اسم الورقة)
+ATTENDANCE_SHEETS = [
+    ("summary", "الملخص"),
+    ("late", "التأخير"),
+    ("absence", "الغياب"),
+    ("exempt", "المستثنون"),
+    ("leaves", "الإجازات"),
+]
+
+# أعمدة الدقائق تُكتب كمدة زمنية (جزء من اليوم) بتنسيق ساعات:دقائق
+MINUTE_COLUMNS = {
+    "late_minutes",
+    "early_leave_minutes",
+    "worked_minutes",
+    "overtime_minutes",
+    "total_late_minutes",
+    "total_early_leave_minutes",
+    "total_overtime_minutes",
+}
+DATE_COLUMNS = {"date", "period_from", "period_to", "start_date", "end_date"}
+TIME_COLUMNS = {"first_punch_time", "last_punch_time", "first_in", "last_out"}
+
+MINUTES_FORMAT = "[h]:mm"
+DATE_FORMAT = "yyyy-mm-dd"
+TIME_FORMAT = "hh:mm"
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm"
+
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+
+COLUMN_LABELS = {
+    "employee_id": "رقم الموظف",
+    "employee_no": "الرقم الوظيفي",
+    "name_ar": "الاسم",
+    "name_en": "Name",
+    "job_title": "الوظيفة",
+    "is_saudi": "سعودي",
+    "nationality": "الجنسية",
+    "nationality_raw": "الجنسية",
+    "department": "القسم",
+    "schedule": "العطلة الأسبوعية",
+    "period_from": "من",
+    "period_to": "إلى",
+    "absent_days": "أيام الغياب",
+    "approved_leave_days": "أيام الإجازات",
+    "late_days": "أيام التأخير",
+    "total_late_minutes": "إجمالي التأخير",
+    "early_leave_days": "أيام الخروج المبكر",
+    "total_early_leave_minutes": "إجمالي الخروج المبكر",
+    "total_overtime_minutes": "إجمالي الإضافي",
+    "attendance_calculation": "طريقة الاحتساب",
+    "date": "التاريخ",
+    "weekday": "Weekday",
+    "weekday_ar": "اليوم",
+    "late_minutes": "التأخير",
+    "early_leave_minutes": "الخروج المبكر",
+    "worked_minutes": "ساعات العمل",
+    "overtime_minutes": "الإضافي",
+    "first_punch": "أول بصمة (كاملة)",
+    "first_punch_time": "أول بصمة",
+    "first_in": "أول دخول",
+    "last_punch": "آخر بصمة (كاملة)",
+    "last_punch_time": "آخر بصمة",
+    "last_out": "آخر خروج",
+    "leave_type": "نوع الإجازة",
+    "attachment_name": "المرفق",
+}
+
+# عدد الصفوف التي تُجهّز معًا قبل كتابتها (التحويل يتم على مستوى العمود لكل دفعة)
+EXCEL_CHUNK_ROWS = 20000
+
+HEADER_FORMAT = {
+    "bold": True,
+    "font_color": "#FFFFFF",
+    "bg_color": "#1E293B",
+    "align": "center",
+    "valign": "vcenter",
+}
+
+
+def _column_kind(name: str) -> str | None:
+    if name in MINUTE_COLUMNS:
+        return "minutes"
+    if name in DATE_COLUMNS:
+        return "date"
+    if name in TIME_COLUMNS:
+        return "time"
+    return None
+
+
+def _column_width(name: str, kind: str | None) -> float:
+    if kind == "minutes" or kind == "time":
+        return 11
+    if kind == "date":
+        return 12
+    if name in ("name_ar", "name_en", "department", "job_title"):
+        return 28
+    return max(12, len(COLUMN_LABELS.get(name, name)) + 4)
+
+
+def _prepare_chunk(chunk: pd.DataFrame, kinds: list) -> list:
+    """تحويل أعمدة الدفعة لقيم Excel (مدة / تاريخ / وقت / نص) وإرجاعها كقوائم أعمدة."""
+    columns = []
+    for name, kind in zip(chunk.columns, kinds):
+        s = chunk[name]
+        if kind == "minutes":
+            vals = pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64") / 1440.0
+            values = [None if np.isnan(v) else v for v in vals.tolist()]
+        elif kind == "date":
+            # رقم اليوم التسلسلي في Excel؛ تنسيق العمود يعرضه كتاريخ
+            d = pd.to_datetime(s, errors="coerce").dt.normalize()
+            vals = ((d - EXCEL_EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype="float64", na_value=np.nan)
+            values = [None if np.isnan(v) else v for v in vals.tolist()]
+        elif kind == "time":
+            values = [_to_time(v) for v in s.tolist()]
+        else:
+            values = [_to_cell(v) for v in s.tolist()]
+        columns.append(values)
+    return columns
+
+
+def _parse_time(v) -> dt.time | None:
+    if v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, dt.time):
+        return v
+    t = pd.to_datetime(str(v), errors="coerce")
+    return None if pd.isna(t) else t.time()
+
+
+def _to_time(v):
+    """وقت اليوم كجزء من اليوم (0..1) كما يخزنه Excel."""
+    v = _parse_time(v)
+    if v is None:
+        return None
+    return (v.hour * 3600 + v.minute * 60 + v.second) / 86400.0
+
+
+def _to_cell(v):
+    if v is None or v is pd.NA:
+        return None
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    if isinstance(v, (np.integer, np.floating, np.bool_)):
+        return v.item()
+    if v is pd.NaT:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v
+
+
+def write_frame_sheet(wb: xlsxwriter.Workbook, title: str, df: pd.DataFrame | None, chunk_rows: int = EXCEL_CHUNK_ROWS):
+    """
+    إضافة ورقة (RTL) لـ workbook: هيدر ثابت ثم الصفوف دفعة دفعة.
+    تنسيق كل عمود (دقائق / تاريخ / وقت) يُضبط مرة واحدة على العمود نفسه،
+    فالخلايا تُكتب بدون تنسيق خاص بها.
+    """
+    ws = wb.add_worksheet(title[:31])
+    ws.right_to_left()
+
+    if df is None or df.empty or len(df.columns) == 0:
+        ws.write_string(0, 0, "لا توجد بيانات")
+        return ws
+
+    names = [str(c) for c in df.columns]
+    kinds = [_column_kind(n) for n in names]
+    formats = {
+        "minutes": wb.add_format({"num_format": MINUTES_FORMAT}),
+        "date": wb.add_format({"num_format": DATE_FORMAT}),
+        "time": wb.add_format({"num_format": TIME_FORMAT}),
+    }
+
+    for i, (name, kind) in enumerate(zip(names, kinds)):
+        ws.set_column(i, i, _column_width(name, kind), formats.get(kind))
+    ws.freeze_panes(1, 0)
+
+    ws.write_row(0, 0, [COLUMN_LABELS.get(n, n) for n in names], wb.add_format(HEADER_FORMAT))
+
+    row_idx = 1
+    for start in range(0, len(df), chunk_rows):
+        columns = _prepare_chunk(df.iloc[start:start + chunk_rows], kinds)
+        for row in zip(*columns):
+            for col, value in enumerate(row):
+                if value is not None:
+                    _write_value(ws, row_idx, col, value)
+            row_idx += 1
+
+    return ws
+
+
+def _write_value(ws, row: int, col: int, value):
+    if isinstance(value, str):
+        ws.write_string(row, col, value)
+    elif isinstance(value, bool):
+        ws.write_boolean(row, col, value)
+    elif isinstance(value, (int, float)):
+        ws.write_number(row, col, value)
+    elif isinstance(value, (dt.datetime, dt.date, dt.time)):
+        ws.write_datetime(row, col, value)
+    else:
+        ws.write_string(row, col, str(value))
+
+
+def write_attendance_excel(
+    out,
+    summary: pd.DataFrame,
+    late: pd.DataFrame,
+    absence: pd.DataFrame,
+    exempt: pd.DataFrame | None = None,
+    leaves: pd.DataFrame | None = None,
+    chunk_rows: int = EXCEL_CHUNK_ROWS,
+):
+    """
+    ملف Excel متعدد الأوراق لمخرجات process_attendance.
+    out: مسار أو ملف مفتوح للكتابة (BytesIO / TemporaryFile).
+    الكتابة بوضع constant_memory: كل صف يُفرّغ للقرص فور اكتمال الصف الذي يليه،
+    فالذاكرة ثابتة تقريبًا مهما كان عدد الصفوف.
+    """
+    frames = {
+        "summary": summary,
+        "late": late,
+        "absence": absence,
+        "exempt": exempt,
+        "leaves": leaves,
+    }
+
+    wb = xlsxwriter.Workbook(out, {
+        "constant_memory": True,
+        "remove_timezone": True,
+        "default_date_format": DATETIME_FORMAT,
+    })
+    for key, title in ATTENDANCE_SHEETS:
+        write_frame_sheet(wb, title, frames[key], chunk_rows=chunk_rows)
+    wb.close()
+    return out
+
+
+# =========================
+# ملفات الرواتب (Parquet / CSV)
+# =========================
+# نظام الرواتب يقرأ ملفات مسطحة كل ليلة. كل جدول يُكتب مقسمًا بأسلوب Hive:
+#   <out_dir>/<format>/<table>/payroll_period=2026-03-08/department=ENGR/part-0.<ext>
+# فيقرأ كل job فترة/قسم معين فقط (pyarrow.dataset / Spark / DuckDB تفهم هذا التقسيم).
+PAYROLL_FEED_FORMATS = ("parquet", "csv")
+PAYROLL_PERIOD_COLUMN = "payroll_period"
+PAYROLL_PARTITION_COLUMNS = (PAYROLL_PERIOD_COLUMN, "department")
+
+# قيمة القسم الفارغ في المسار (نفس القيمة التي تعاملها أدوات Hive / Arrow كـ null)
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def payroll_period_start(dates) -> pd.Series:
+    """
+    بداية فترة الرواتب (يوم 8) لكل تاريخ — نفس قاعدة _payroll_period في محرك الحضور
+    (من يوم 8 حتى يوم 7 في الشهر التالي) لكن لعمود كامل دفعة واحدة.
+    """
+    d = pd.to_datetime(pd.Series(dates), errors="coerce").dt.normalize()
+    shifted = d - pd.Timedelta(days=7)
+    return shifted.dt.to_period("M").dt.start_time + pd.Timedelta(days=7)
+
+
+def _feed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """نسخة من الجدول مع أعمدة التقسيم: فترة الرواتب (من date أو period_from) والقسم."""
+    out = df.copy()
+    source = out["date"] if "date" in out.columns else out.get("period_from")
+    if source is None:
+        out[PAYROLL_PERIOD_COLUMN] = ""
+    else:
+        out[PAYROLL_PERIOD_COLUMN] = payroll_period_start(source).dt.strftime("%Y-%m-%d").fillna("").to_numpy()
+    if "department" in out.columns:
+        out["department"] = out["department"].fillna("").astype(str).str.strip()
+    else:
+        out["department"] = ""
+    return out
+
+
+def _arrow_column(name: str, s: pd.Series) -> pa.Array:
+    """
+    تحويل عمود لنوع Arrow ثابت: الدقائق int32، التواريخ date32، الأوقات time32،
+    والنصوص dictionary (الأقسام والأسماء والجداول تتكرر كثيرًا).
+    """
+    kind = _column_kind(name)
+    if kind == "minutes":
+        values = pd.to_numeric(s, errors="coerce").round().astype("Int32")
+        return pa.array(values, type=pa.int32(), from_pandas=True)
+    if kind == "date":
+        d = pd.to_datetime(s, errors="coerce")
+        return pa.array([None if pd.isna(v) else v.date() for v in d], type=pa.date32())
+    if kind == "time":
+        return pa.array([_parse_time(v) for v in s.tolist()], type=pa.time32("s"))
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return pa.array(s, type=pa.bool_(), from_pandas=True)
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pa.array(s, type=pa.int64(), from_pandas=True)
+    if pd.api.types.is_float_dtype(s.dtype):
+        return pa.array(s, type=pa.float64(), from_pandas=True)
+    values = [None if (v is None or v is pd.NA or v is pd.NaT or (isinstance(v, float) and np.isnan(v))) else str(v) for v in s.tolist()]
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def _arrow_table(df: pd.DataFrame, columns: list) -> pa.Table:
+    return pa.table({name: _arrow_column(name, df[name]) for name in columns})
+
+
+def _partition_dir(root: str, period: str, department: str) -> str:
+    # القيم تُرمّز كـ URI (الأسماء العربية والرموز مثل / و |) — نفس segment_encoding="uri" في pyarrow
+    return os.path.join(
+        root,
+        f"{PAYROLL_PERIOD_COLUMN}={quote(period, safe='') or HIVE_NULL_PARTITION}",
+        f"department={quote(department, safe='') or HIVE_NULL_PARTITION}",
+    )
+
+
+def _write_atomic(path: str, write) -> None:
+    # الكتابة لملف مؤقت ثم replace حتى لا يقرأ job الرواتب ملفًا نصف مكتوب
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_payroll_feed(
+    out_dir: str,
+    summary: pd.DataFrame,
+    late: pd.DataFrame,
+    absence: pd.DataFrame,
+    exempt: pd.DataFrame | None = None,
+    leaves: pd.DataFrame | None = None,
+    formats=PAYROLL_FEED_FORMATS,
+) -> list:
+    """
+    كتابة مخرجات process_attendance كملفات Parquet و/أو CSV مقسمة حسب فترة الرواتب والقسم.
+
+    - Parquet: النصوص dictionary-encoded والدقائق int32، وأعمدة التقسيم في المسار فقط.
+    - CSV: نفس الأعمدة مع payroll_period و department داخل الملف (للأنظمة القديمة
+      التي تقرأ كل ملف منفردًا).
+
+    كل تقسيم يُكتب كملف واحد part-0، فإعادة التشغيل لنفس الفترة تستبدل ملفاتها فقط
+    ولا تلمس الفترات أو الأقسام الأخرى. الجداول الفارغة لا تُكتب.
+    يُرجع قائمة مسارات الملفات المكتوبة.
+    """
+    frames = {
+        "summary": summary,
+        "late": late,
+        "absence": absence,
+        "exempt": exempt,
+        "leaves": leaves,
+    }
+
+    unknown = set(formats) - set(PAYROLL_FEED_FORMATS)
+    if unknown:
+        raise ValueError(f"صيغة غير مدعومة: {sorted(unknown)}")
+
+    written = []
+
+    for key, _ in ATTENDANCE_SHEETS:
+        df = frames[key]
+        if df is None or df.empty or len(df.columns) == 0:
+            continue
+
+        feed = _feed_frame(df)
+        data_columns = [str(c) for c in df.columns if c not in PAYROLL_PARTITION_COLUMNS]
+        csv_columns = [*PAYROLL_PARTITION_COLUMNS, *data_columns]
+
+        for (period, department), part in feed.groupby(list(PAYROLL_PARTITION_COLUMNS), sort=True):
+
+            if "parquet" in formats:
+                folder = _partition_dir(os.path.join(out_dir, "parquet", key), period, department)
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, "part-0.parquet")
+                table = _arrow_table(part, data_columns)
+                _write_atomic(path, lambda p: pq.write_table(table, p))
+                written.append(path)
+
+            if "csv" in formats:
+                folder = _partition_dir(os.path.join(out_dir, "csv", key), period, department)
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, "part-0.csv")
+                table = _arrow_table(part, csv_columns)
+                _write_atomic(path, lambda p: pa_csv.write_csv(table, p))
+                written.append(path)
+
+    return written
@@ -0,0 +1,268 @@
+# =========================
+# html_reports.py
+# =========================
+# تقرير الموظف الشهري كصفحة HTML (RTL) للمعاينة والطباعة من المتصفح.
+# نفس محتوى build_pdf لكن بدون ReportLab: القالب يُحمّل ويُترجم مرة واحدة لكل process
+# والعرض يستغرق أجزاء من الثانية، وPDF يبقى لملفات الأرشفة فقط.
+import base64
+import os
+from functools import lru_cache
+
+import pandas as pd
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from pdf_context import LOGO_PATH
+from pdf_reports import (
+    t,
+    safe_str,
+    fmt_id,
+    fmt_date,
+    month_year_title,
+    month_year_title_en,
+    mm_to_hhmm,
+    mm_to_ar_hm,
+)
+
+TEMPLATES_DIR = "templates"
+EMPLOYEE_REPORT_TEMPLATE = "employee_report.html"
+
+
+@lru_cache(maxsize=1)
+def _environment() -> Environment:
+    # auto_reload=False: القالب المترجم يبقى محفوظًا بدون فحص تاريخ الملف مع كل عرض
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+
+
+def report_template(name: str = EMPLOYEE_REPORT_TEMPLATE):
+    return _environment().get_template(name)
+
+
+@lru_cache(maxsize=1)
+def _logo_data_uri(path: str) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
+
+
+def logo_data_uri() -> str:
+    """الشعار كـ data URI (الصفحة تُعرض داخل iframe بدون وصول لملفات التطبيق)."""
+    uri = _logo_data_uri(LOGO_PATH)
+    if not uri:
+        _logo_data_uri.cache_clear()
+    return uri
+
+
+def _fmt_time(x) -> str:
+    try:
+        tt = pd.to_datetime(str(x), errors="coerce")
+        return "" if pd.isna(tt) else tt.strftime("%H:%M")
+    except Exception:
+        return ""
+
+
+def _day(r, lang: str) -> str:
+    if lang == "ar":
+        return safe_str(r.get("weekday_ar", r.get("weekday", "")))
+    return safe_str(r.get("weekday", ""))
+
+
+def _minutes(r, col: str) -> str:
+    return mm_to_hhmm(int(r.get(col, 0) or 0))
+
+
+def _sorted_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    if "date" in out.columns:
+        out = out.sort_values("date")
+        out["date"] = out["date"].apply(fmt_date)
+    return out
+
+
+def _late_section(emp_row, late_emp, lang: str, attendance_rule: str) -> dict:
+    section = {
+        "title": t("التأخير والخروج المبكر والإضافي", "Late / Early Leave / Overtime", lang),
+        "empty_text": t("لا يوجد بيانات", "No records", lang),
+        "header": [],
+        "rows": [],
+        "totals": [],
+    }
+    if late_emp is None or late_emp.empty:
+        return section
+
+    le = _sorted_by_date(late_emp)
+    daily_hours = attendance_rule == "daily_hours"
+
+    if daily_hours:
+        section["header"] = [
+            t("اليوم", "Day", lang),
+            t("التاريخ", "Date", lang),
+            t("أول بصمة", "First In", lang),
+            t("آخر بصمة", "Last Out", lang),
+            t("ساعات العمل", "Worked", lang),
+            t("التأخير", "Late", lang),
+            t("الخروج المبكر", "Early Leave", lang),
+            t("الإضافي", "Overtime", lang),
+        ]
+    else:
+        section["header"] = [
+            t("اليوم", "Day", lang),
+            t("التاريخ", "Date", lang),
+            t("أول بصمة", "First Punch", lang),
+            t("آخر بصمة", "Last Punch", lang),
+            t("التأخير", "Late", lang),
+            t("الخروج المبكر", "Early Leave", lang),
+        ]
+
+    for r in le.to_dict("records"):
+        row = [
+            _day(r, lang),
+            safe_str(r.get("date", "")),
+            _fmt_time(r.get("first_punch_time", "")),
+            _fmt_time(r.get("last_punch_time", "")),
+        ]
+        if daily_hours:
+            row.append(_minutes(r, "worked_minutes"))
+        row += [_minutes(r, "late_minutes"), _minutes(r, "early_leave_minutes")]
+        if daily_hours:
+            row.append(_minutes(r, "overtime_minutes"))
+        section["rows"].append(row)
+
+    total_late = int(emp_row.get("total_late_minutes", 0) or 0)
+    total_early_leave = int(emp_row.get("total_early_leave_minutes", 0) or 0)
+    total_overtime = int(emp_row.get("total_overtime_minutes", 0) or 0)
+    total_deduction = total_late + total_early_leave
+    net_minutes = total_overtime - total_deduction
+    totals = section["totals"]
+
+    if lang == "ar":
+        totals.append(f"⏱ إجمالي التأخير: {mm_to_ar_hm(total_late)}")
+        totals.append(f"🚪 إجمالي الخروج المبكر: {mm_to_ar_hm(total_early_leave)}")
+        if daily_hours:
+            totals.append(f"⬆️ إجمالي الإضافي: {mm_to_ar_hm(total_overtime)}")
+            if net_minutes > 0:
+                totals.append(f"✅ الصافي النهائي: إضافي {mm_to_ar_hm(net_minutes)}")
+            elif net_minutes < 0:
+                totals.append(f"❌ الصافي النهائي: عجز {mm_to_ar_hm(net_minutes)}")
+            else:
+                totals.append("➖ الصافي النهائي: متعادل (0 دقيقة)")
+        else:
+            totals.append(f"📌 إجمالي التأخير + الخروج المبكر: {mm_to_ar_hm(total_deduction)}")
+    else:
+        totals.append(f"Total Late: {mm_to_hhmm(total_late)}")
+        totals.append(f"Total Early Leave: {mm_to_hhmm(total_early_leave)}")
+        if daily_hours:
+            totals.append(f"Total Overtime: {mm_to_hhmm(total_overtime)}")
+            if net_minutes > 0:
+                totals.append(f"Final Net: Overtime {mm_to_hhmm(net_minutes)}")
+            elif net_minutes < 0:
+                totals.append(f"Final Net: Deficit {mm_to_hhmm(net_minutes)}")
+            else:
+                totals.append("Final Net: Balanced (0m)")
+        else:
+            totals.append(f"Total Late + Early Leave: {mm_to_hhmm(total_deduction)}")
+
+    return section
+
+
+def _absence_section(emp_row, abs_emp, lang: str) -> dict:
+    section = {
+        "title": t("الغياب", "Absence", lang),
+        "empty_text": t("لا يوجد غياب", "No absence records", lang),
+        "header": [t("اليوم", "Day", lang), t("التاريخ", "Date", lang)],
+        "rows": [],
+        "totals": [],
+    }
+    if abs_emp is None or abs_emp.empty:
+        return section
+
+    for r in _sorted_by_date(abs_emp).to_dict("records"):
+        section["rows"].append([_day(r, lang), safe_str(r.get("date", ""))])
+
+    absent_days = int(emp_row.get("absent_days", 0) or 0)
+    section["totals"].append(t(f"🚫 عدد أيام الغياب: {absent_days}", f"🚫 Total Absent Days: {absent_days}", lang))
+    return section
+
+
+def _leave_section(emp_row, leave_emp, lang: str) -> dict:
+    section = {
+        "title": t("الإجازات المعتمدة", "Approved Leaves", lang),
+        "empty_text": t("لا توجد إجازات معتمدة", "No approved leaves", lang),
+        "header": [t("اليوم", "Day", lang), t("التاريخ", "Date", lang), t("نوع الإجازة", "Leave Type", lang)],
+        "rows": [],
+        "totals": [],
+    }
+    if leave_emp is None or leave_emp.empty:
+        return section
+
+    lv = _sorted_by_date(leave_emp)
+    for r in lv.to_dict("records"):
+        section["rows"].append([_day(r, lang), safe_str(r.get("date", "")), safe_str(r.get("leave_type", "إجازة"))])
+
+    leave_days = int(emp_row.get("approved_leave_days", len(lv)) or 0)
+    section["totals"].append(t(
+        f"🏖️ عدد أيام الإجازات المعتمدة: {leave_days}",
+        f"🏖️ Total Approved Leave Days: {leave_days}",
+        lang,
+    ))
+    return section
+
+
+def employee_report_context(emp_row, late_emp: pd.DataFrame, abs_emp: pd.DataFrame, leave_emp: pd.DataFrame | None = None, lang: str = "ar") -> dict:
+    """بيانات قالب تقرير الموظف — نفس أقسام employee_story (النصوص كما هي، الاتجاه يتولاه المتصفح)."""
+    name_ar_ = safe_str(emp_row.get("name_ar", ""))
+    name_en_ = safe_str(emp_row.get("name_en", ""))
+    nat = safe_str(emp_row.get("nationality", emp_row.get("nationality_raw", "")))
+    emp_no = fmt_id(emp_row.get("employee_no", ""))
+    dept = safe_str(emp_row.get("department", ""))
+    job = safe_str(emp_row.get("job_title", ""))
+    attendance_rule = safe_str(emp_row.get("attendance_calculation", "")).strip().lower()
+
+    if lang == "ar":
+        name_parts = [p for p in (name_ar_, name_en_) if p]
+        labels = ("الكود/الرقم", "الوظيفة", "الإدارة", "الجنسية")
+    else:
+        name_parts = [p for p in (name_en_, name_ar_) if p]
+        labels = ("Employee No", "Job Title", "Department", "Nationality")
+    info = [(label, value) for label, value in zip(labels, (emp_no, job, dept, nat)) if value]
+
+    if attendance_rule == "daily_hours":
+        note = t(
+            "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام، والإضافي بعد نهاية الدوام.",
+            "📝 Note: Late is calculated after shift start with grace, early leave before shift end, and overtime after shift end.",
+            lang,
+        )
+    else:
+        note = t(
+            "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام المحددة.",
+            "📝 Note: Late is calculated after shift start with grace, and early leave before official shift end.",
+            lang,
+        )
+
+    return {
+        "lang": lang,
+        "dir": "rtl" if lang == "ar" else "ltr",
+        "title": month_year_title(emp_row) if lang == "ar" else month_year_title_en(emp_row),
+        "name_parts": name_parts,
+        "info": info,
+        "note": note,
+        "logo": logo_data_uri(),
+        "print_label": t("🖨️ طباعة", "🖨️ Print", lang),
+        "sections": [
+            _late_section(emp_row, late_emp, lang, attendance_rule),
+            _absence_section(emp_row, abs_emp, lang),
+            _leave_section(emp_row, leave_emp, lang),
+        ],
+    }
+
+
+def render_employee_html(emp_row, late_emp: pd.DataFrame, abs_emp: pd.DataFrame, leave_emp: pd.DataFrame | None = None, lang: str = "ar") -> str:
+    """تقرير الموظف الشهري كصفحة HTML كاملة (للمعاينة داخل التطبيق أو الطباعة من المتصفح)."""
+    context = employee_report_context(emp_row, late_emp, abs_emp, leave_emp, lang=lang)
+    return report_template().render(**context)
@@ -0,0 +1,114 @@
+# =========================
+# pdf_context.py
+# =========================
+# موارد تقارير PDF المشتركة: تسجيل الخط وأنماط الفقرات والشعار.
+# يتم تجهيزها مرة واحدة لكل process (الموديول يبقى محمّلًا بين إعادات تشغيل Streamlit)
+# بدل إعادة قراءة ملف الخط وبناء الأنماط مع كل تقرير.
+import os
+from functools import lru_cache
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+FONT_PATH = os.path.join("fonts", "Amiri-Regular.ttf")
+LOGO_PATH = os.path.join("assets", "logo.png")
+
+FONT_AR = "AR"
+FONT_EN = "Helvetica"
+
+# أقصى عدد نصوص عربية مُشكّلة محفوظة (أسماء الموظفين والأقسام والملاحظات تتكرر كثيرًا)
+AR_SHAPE_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=AR_SHAPE_CACHE_SIZE)
+def shape_ar(s: str) -> str:
+    """تشكيل النص العربي وترتيبه للعرض (reshape + bidi) مع حفظ النتيجة."""
+    return get_display(arabic_reshaper.reshape(s))
+
+
+def warm_ar_cache(labels) -> None:
+    """تشكيل العناوين الثابتة مسبقًا حتى لا يدفع أول تقرير تكلفتها."""
+    for label in labels:
+        s = str(label).strip() if label is not None else ""
+        if s:
+            shape_ar(s)
+
+
+@lru_cache(maxsize=None)
+def _register_font(name: str, path: str) -> bool:
+    if name in pdfmetrics.getRegisteredFontNames():
+        return True
+    if not os.path.exists(path):
+        return False
+    pdfmetrics.registerFont(TTFont(name, path))
+    return True
+
+
+def ensure_fonts() -> str:
+    """تسجيل الخط العربي (مرة واحدة) وإرجاع اسمه للاستخدام في الأنماط."""
+    if not _register_font(FONT_AR, FONT_PATH):
+        # الملف غير موجود: لا نحفظ النتيجة حتى يُعاد المحاولة لاحقًا
+        _register_font.cache_clear()
+    return FONT_AR
+
+
+@lru_cache(maxsize=1)
+def sample_styles():
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def pdf_style(name: str, parent="BodyText", **kwargs) -> ParagraphStyle:
+    """
+    ParagraphStyle محفوظ حسب (الاسم، الأب، الخصائص) — نفس الكائن يُعاد لكل التقارير.
+    parent: اسم نمط من getSampleStyleSheet أو ParagraphStyle آخر.
+    """
+    base = sample_styles()[parent] if isinstance(parent, str) else parent
+    return ParagraphStyle(name, parent=base, **kwargs)
+
+
+@lru_cache(maxsize=1)
+def _logo_reader(path: str):
+    if not os.path.exists(path):
+        return None
+    try:
+        return ImageReader(path)
+    except Exception:
+        return None
+
+
+def logo_reader():
+    """شعار التقارير (ImageReader) أو None لو غير متوفر."""
+    reader = _logo_reader(LOGO_PATH)
+    if reader is None:
+        _logo_reader.cache_clear()
+    return reader
+
+
+class StreamedStory(list):
+    """
+    قائمة flowables تُملأ من generator عند الحاجة.
+    doc.build يستهلك العناصر من أول القائمة ويسأل عن طولها في كل خطوة، فيبقى
+    في الذاكرة عدد محدود من العناصر (lookahead) بدل التقرير كله.
+    """
+
+    def __init__(self, source, lookahead: int = 32):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+        self._fill()
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                list.append(self, next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
@@ -0,0 +1,1098 @@
+# =========================
+# pdf_reports.py
+# =========================
+# تقرير الموظف الشهري (PDF) ودوال تنسيق النصوص المستخدمة فيه.
+# الموديول لا يعتمد على Streamlit حتى يمكن استدعاؤه من processes منفصلة
+# (تصدير تقارير كل الموظفين دفعة واحدة).
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+from multiprocessing import get_context
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.platypus.flowables import Flowable, HRFlowable
+from reportlab.platypus.tableofcontents import TableOfContents
+from reportlab.lib.units import cm
+from reportlab.lib import colors
+
+from pdf_context import FONT_PATH, FONT_AR, FONT_EN, ensure_fonts, pdf_style, logo_reader, shape_ar
+from rules import SICK_LEAVE_ANNUAL_QUOTA
+
+
+def ar(text: str) -> str:
+    if text is None:
+        return ""
+    s = str(text).strip()
+    if not s:
+        return ""
+    # التشكيل محفوظ في pdf_context (يبقى بين إعادات التشغيل)
+    return shape_ar(s)
+
+
+def t(ar_text: str, en_text: str, lang: str) -> str:
+    return ar_text if lang == "ar" else en_text
+
+
+def safe_str(x):
+    return "" if x is None or (isinstance(x, float) and pd.isna(x)) else str(x).strip()
+
+
+def fmt_id(x):
+    """يحول أي قيمة رقم وظيفي/رقم موظف (بما فيها float زي 27164.0) لنص بدون فواصل عشرية."""
+    if x is None or (isinstance(x, float) and pd.isna(x)):
+        return ""
+    s = str(x).strip()
+    if s == "" or s.lower() == "nan":
+        return ""
+    try:
+        f = float(s)
+        if f.is_integer():
+            return str(int(f))
+        return s
+    except (ValueError, TypeError):
+        return s
+
+
+def fmt_date(d):
+    try:
+        return pd.to_datetime(d).strftime("%d-%m-%Y")
+    except Exception:
+        return safe_str(d)
+
+
+def month_year_title(emp_row):
+    y, m = "", ""
+    p_to = emp_row.get("period_to", "")
+    try:
+        dt_to = pd.to_datetime(p_to)
+        y = dt_to.year
+        m = dt_to.month
+    except Exception:
+        pass
+    if y and m:
+        return f"تقرير الموظف عن شهر {m:02d} - {y}"
+    return "تقرير الموظف"
+
+
+def month_year_title_en(emp_row):
+    y, m = "", ""
+    p_to = emp_row.get("period_to", "")
+    try:
+        dt_to = pd.to_datetime(p_to)
+        y = dt_to.year
+        m = dt_to.month
+    except Exception:
+        pass
+    if y and m:
+        return f"Employee Monthly Report - {m:02d}/{y}"
+    return "Employee Report"
+
+
+def sanitize_filename(s: str) -> str:
+    s = re.sub(r"[\\/:*?\"<>|]+", "", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s[:80] if s else "employee"
+
+
+WEEKDAY_AR = {
+    "Saturday": "السبت",
+    "Sunday": "الأحد",
+    "Monday": "الإثنين",
+    "Tuesday": "الثلاثاء",
+    "Wednesday": "الأربعاء",
+    "Thursday": "الخميس",
+    "Friday": "الجمعة",
+}
+
+
+def weekday_to_ar(x: str) -> str:
+    s = safe_str(x)
+    return WEEKDAY_AR.get(s, s)
+
+
+AR_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]")
+
+
+def mm_to_hhmm(m: int) -> str:
+    m = int(m or 0)
+    sign = "-" if m < 0 else ""
+    m = abs(m)
+    return f"{sign}{m//60:02d}:{m%60:02d}"
+
+
+def mm_to_ar_hm(m: int) -> str:
+    m = int(m or 0)
+    sign = "-" if m < 0 else ""
+    m = abs(m)
+    h = m // 60
+    mm = m % 60
+    return f"{sign}{h} ساعة و {mm} دقيقة"
+
+
+# هوامش صفحة تقرير الموظف (نفس القيم في التقرير الفردي وتقرير القسم)
+EMPLOYEE_PAGE_MARGINS = dict(
+    leftMargin=1.0 * cm,
+    rightMargin=1.0 * cm,
+    topMargin=1.0 * cm,
+    bottomMargin=1.0 * cm,
+)
+
+
+def _draw_logo(canvas, doc):
+    """الشعار أعلى يمين الصفحة (أول صفحة في تقرير كل موظف)."""
+    canvas.saveState()
+    W, H = A4
+    img = logo_reader()
+    if img is not None:
+        try:
+            w = 3.0 * cm
+            h = 1.4 * cm
+            x = W - doc.rightMargin - w
+            y = H - doc.topMargin - h + 0.2 * cm
+            canvas.drawImage(img, x, y, width=w, height=h, mask="auto")
+        except Exception:
+            pass
+    canvas.restoreState()
+
+
+def employee_story(emp_row, late_emp: pd.DataFrame, abs_emp: pd.DataFrame, leave_emp: pd.DataFrame | None = None, lang: str = "ar") -> list:
+    """flowables تقرير الموظف الشهري — تُستخدم في build_pdf وفي تقرير القسم المجمّع."""
+    ensure_fonts()
+
+    font_main = FONT_AR if lang == "ar" else FONT_EN
+
+    align_text = 2 if lang == "ar" else 0
+    align_head = 2 if lang == "ar" else 0
+
+    def txt(x):
+        s = safe_str(x)
+        return ar(s) if lang == "ar" else s
+
+
+    title_style = pdf_style("title", parent="Title", fontName=font_main, fontSize=15, alignment=1)
+    name_style = pdf_style("name", parent="BodyText", fontName=font_main, fontSize=12, alignment=1, leading=16)
+
+    info_font = font_main if lang == "ar" else FONT_EN
+    info_style = pdf_style(
+        "info",
+        parent="BodyText",
+        fontName=info_font,
+        fontSize=10,
+        alignment=1,
+        textColor=colors.grey,
+        leading=14,
+    )
+
+    note_style = pdf_style(
+        "note",
+        parent="BodyText",
+        fontName=font_main if lang == "ar" else FONT_EN,
+        fontSize=10,
+        alignment=2 if lang == "ar" else 0,
+        textColor=colors.HexColor("#8B5CF6"),
+        leading=14,
+        spaceBefore=6,
+        spaceAfter=6,
+    )
+
+    h_style = pdf_style("h", parent=title_style, fontName=font_main, fontSize=12, alignment=align_head, spaceAfter=6)
+    p_style = pdf_style("p", parent="BodyText", fontName=font_main, fontSize=10.5, alignment=align_text, leading=15)
+    total_style = pdf_style("total", parent=p_style, fontName=font_main, fontSize=12.0, alignment=align_text, leading=18)
+
+    name_ar_ = safe_str(emp_row.get("name_ar", ""))
+    name_en_ = safe_str(emp_row.get("name_en", ""))
+    nat = safe_str(emp_row.get("nationality", emp_row.get("nationality_raw", "")))
+    emp_no = fmt_id(emp_row.get("employee_no", ""))
+    dept = safe_str(emp_row.get("department", ""))
+    job = safe_str(emp_row.get("job_title", ""))
+
+    title = month_year_title(emp_row) if lang == "ar" else month_year_title_en(emp_row)
+    attendance_rule = safe_str(emp_row.get("attendance_calculation", "")).strip().lower()
+
+    if lang == "ar":
+        info_parts = []
+        if emp_no:
+            info_parts.append(f"الكود/الرقم: {emp_no}")
+        if job:
+            info_parts.append(f"الوظيفة: {job}")
+        if dept:
+            info_parts.append(f"الإدارة: {dept}")
+        if nat:
+            info_parts.append(f"الجنسية: {nat}")
+        info_line = ar(" | ".join(info_parts))
+    else:
+        parts = []
+        if emp_no:
+            parts.append(escape(f"Employee No: {emp_no}"))
+        if job:
+            parts.append(f"Job Title: <font name='AR'>{ar(job)}</font>" if AR_CHARS.search(job) else escape(f"Job Title: {job}"))
+        if dept:
+            parts.append(f"Department: <font name='AR'>{ar(dept)}</font>" if AR_CHARS.search(dept) else escape(f"Department: {dept}"))
+        if nat:
+            parts.append(f"Nationality: <font name='AR'>{ar(nat)}</font>" if AR_CHARS.search(nat) else escape(f"Nationality: {nat}"))
+        info_line = " | ".join(parts)
+
+    def fmt_time(x):
+        try:
+            tt = pd.to_datetime(str(x), errors="coerce")
+            return "" if pd.isna(tt) else tt.strftime("%H:%M")
+        except Exception:
+            return ""
+
+    def rtl_row(row):
+        return list(reversed(row)) if lang == "ar" else row
+
+    def rtl_cols(widths):
+        return list(reversed(widths)) if lang == "ar" else widths
+
+    if lang == "ar":
+        name_line = f"{name_ar_} — {name_en_}" if name_en_ else name_ar_
+        name_paragraph = Paragraph(ar(name_line), name_style)
+    else:
+        en_part = escape(name_en_ or "")
+        ar_part = ar(name_ar_) if name_ar_ else ""
+        if en_part and ar_part:
+            mixed = f"{en_part} — <font name='AR'>{ar_part}</font>"
+        elif en_part:
+            mixed = en_part
+        else:
+            mixed = f"<font name='AR'>{ar_part}</font>"
+        name_paragraph = Paragraph(mixed, name_style)
+
+    story = []
+    story.append(Paragraph(txt(title), title_style))
+    story.append(name_paragraph)
+    story.append(Paragraph(info_line, info_style))
+    story.append(Spacer(1, 6))
+
+    if attendance_rule == "daily_hours":
+        if lang == "ar":
+            note = "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام، والإضافي بعد نهاية الدوام."
+            story.append(Paragraph(ar(note), note_style))
+        else:
+            note = "📝 Note: Late is calculated after shift start with grace, early leave before shift end, and overtime after shift end."
+            story.append(Paragraph(note, note_style))
+    else:
+        if lang == "ar":
+            note = "📝 ملاحظة: يتم احتساب التأخير بعد بداية الدوام مع السماح، والخروج المبكر قبل نهاية الدوام المحددة."
+            story.append(Paragraph(ar(note), note_style))
+        else:
+            note = "📝 Note: Late is calculated after shift start with grace, and early leave before official shift end."
+            story.append(Paragraph(note, note_style))
+
+    story.append(HRFlowable(width="100%", thickness=0.6, color=colors.lightgrey))
+    story.append(Spacer(1, 8))
+
+    section_title = "التأخير والخروج المبكر والإضافي" if lang == "ar" else "Late / Early Leave / Overtime"
+    story.append(Paragraph(txt(section_title), h_style))
+
+    if late_emp is None or late_emp.empty:
+        story.append(Paragraph(txt(t("لا يوجد بيانات", "No records", lang)), p_style))
+    else:
+        le = late_emp.copy()
+        if "date" in le.columns:
+            le = le.sort_values("date")
+            le["date"] = le["date"].apply(fmt_date)
+
+        if "worked_minutes" not in le.columns:
+            le["worked_minutes"] = 0
+        if "overtime_minutes" not in le.columns:
+            le["overtime_minutes"] = 0
+        if "early_leave_minutes" not in le.columns:
+            le["early_leave_minutes"] = 0
+
+        if attendance_rule == "daily_hours":
+            rows = [rtl_row([
+                txt(t("اليوم", "Day", lang)),
+                txt(t("التاريخ", "Date", lang)),
+                txt(t("أول بصمة", "First In", lang)),
+                txt(t("آخر بصمة", "Last Out", lang)),
+                txt(t("ساعات العمل", "Worked", lang)),
+                txt(t("التأخير", "Late", lang)),
+                txt(t("الخروج المبكر", "Early Leave", lang)),
+                txt(t("الإضافي", "Overtime", lang)),
+            ])]
+
+            for _, r in le.iterrows():
+                day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
+                row = [
+                    txt(day_val),
+                    txt(safe_str(r.get("date", ""))),
+                    txt(fmt_time(r.get("first_punch_time", ""))),
+                    txt(fmt_time(r.get("last_punch_time", ""))),
+                    txt(mm_to_hhmm(int(r.get("worked_minutes", 0) or 0))),
+                    txt(mm_to_hhmm(int(r.get("late_minutes", 0) or 0))),
+                    txt(mm_to_hhmm(int(r.get("early_leave_minutes", 0) or 0))),
+                    txt(mm_to_hhmm(int(r.get("overtime_minutes", 0) or 0))),
+                ]
+                rows.append(rtl_row(row))
+
+            widths = rtl_cols([2.2*cm, 2.7*cm, 2.2*cm, 2.2*cm, 2.6*cm, 2.2*cm, 2.6*cm, 2.2*cm])
+            t1 = Table(rows, colWidths=widths)
+        else:
+            rows = [rtl_row([
+                txt(t("اليوم", "Day", lang)),
+                txt(t("التاريخ", "Date", lang)),
+                txt(t("أول بصمة", "First Punch", lang)),
+                txt(t("آخر بصمة", "Last Punch", lang)),
+                txt(t("التأخير", "Late", lang)),
+                txt(t("الخروج المبكر", "Early Leave", lang)),
+            ])]
+
+            for _, r in le.iterrows():
+                day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
+                row = [
+                    txt(day_val),
+                    txt(safe_str(r.get("date", ""))),
+                    txt(fmt_time(r.get("first_punch_time", ""))),
+                    txt(fmt_time(r.get("last_punch_time", ""))),
+                    txt(mm_to_hhmm(int(r.get("late_minutes", 0) or 0))),
+                    txt(mm_to_hhmm(int(r.get("early_leave_minutes", 0) or 0))),
+                ]
+                rows.append(rtl_row(row))
+
+            widths = rtl_cols([3.0*cm, 3.2*cm, 2.8*cm, 2.8*cm, 2.8*cm, 3.0*cm])
+            t1 = Table(rows, colWidths=widths)
+
+        t1.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, -1), font_main),
+            ("FONTSIZE", (0, 0), (-1, 0), 10.0),
+            ("FONTSIZE", (0, 1), (-1, -1), 9.2),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+            ("TOPPADDING", (0, 0), (-1, -1), 5),
+        ]))
+        story.append(t1)
+        story.append(Spacer(1, 8))
+
+        total_late = int(emp_row.get("total_late_minutes", 0) or 0)
+        total_early_leave = int(emp_row.get("total_early_leave_minutes", 0) or 0)
+        total_overtime = int(emp_row.get("total_overtime_minutes", 0) or 0)
+        total_deduction = total_late + total_early_leave
+
+        if lang == "ar":
+            story.append(Paragraph(ar(f"⏱ إجمالي التأخير: {mm_to_ar_hm(total_late)}"), total_style))
+            story.append(Paragraph(ar(f"🚪 إجمالي الخروج المبكر: {mm_to_ar_hm(total_early_leave)}"), total_style))
+
+            if attendance_rule == "daily_hours":
+                story.append(Paragraph(ar(f"⬆️ إجمالي الإضافي: {mm_to_ar_hm(total_overtime)}"), total_style))
+                net_minutes = total_overtime - total_deduction
+                if net_minutes > 0:
+                    net_line = f"✅ الصافي النهائي: إضافي {mm_to_ar_hm(net_minutes)}"
+                elif net_minutes < 0:
+                    net_line = f"❌ الصافي النهائي: عجز {mm_to_ar_hm(net_minutes)}"
+                else:
+                    net_line = "➖ الصافي النهائي: متعادل (0 دقيقة)"
+                story.append(Paragraph(ar(net_line), total_style))
+            else:
+                story.append(Paragraph(ar(f"📌 إجمالي التأخير + الخروج المبكر: {mm_to_ar_hm(total_deduction)}"), total_style))
+        else:
+            story.append(Paragraph(f"Total Late: {mm_to_hhmm(total_late)}", total_style))
+            story.append(Paragraph(f"Total Early Leave: {mm_to_hhmm(total_early_leave)}", total_style))
+            if attendance_rule == "daily_hours":
+                story.append(Paragraph(f"Total Overtime: {mm_to_hhmm(total_overtime)}", total_style))
+                net_minutes = total_overtime - total_deduction
+                if net_minutes > 0:
+                    net_line = f"Final Net: Overtime {mm_to_hhmm(net_minutes)}"
+                elif net_minutes < 0:
+                    net_line = f"Final Net: Deficit {mm_to_hhmm(net_minutes)}"
+                else:
+                    net_line = "Final Net: Balanced (0m)"
+                story.append(Paragraph(net_line, total_style))
+            else:
+                story.append(Paragraph(f"Total Late + Early Leave: {mm_to_hhmm(total_deduction)}", total_style))
+
+    story.append(Spacer(1, 12))
+
+    story.append(Paragraph(txt(t("الغياب", "Absence", lang)), h_style))
+    if abs_emp is None or abs_emp.empty:
+        story.append(Paragraph(txt(t("لا يوجد غياب", "No absence records", lang)), p_style))
+    else:
+        ae = abs_emp.copy().sort_values("date") if "date" in abs_emp.columns else abs_emp.copy()
+        if "date" in ae.columns:
+            ae["date"] = ae["date"].apply(fmt_date)
+
+        rows2 = [rtl_row([
+            txt(t("اليوم", "Day", lang)),
+            txt(t("التاريخ", "Date", lang)),
+        ])]
+
+        for _, r in ae.iterrows():
+            day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
+            row = [txt(day_val), txt(safe_str(r.get("date", "")))]
+            rows2.append(rtl_row(row))
+
+        t2 = Table(rows2, colWidths=rtl_cols([6.0 * cm, 9.5 * cm]))
+        t2.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, -1), font_main),
+            ("FONTSIZE", (0, 0), (-1, 0), 11),
+            ("FONTSIZE", (0, 1), (-1, -1), 10),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+            ("TOPPADDING", (0, 0), (-1, -1), 5),
+        ]))
+        story.append(t2)
+        story.append(Spacer(1, 6))
+
+        absent_days = int(emp_row.get("absent_days", 0) or 0)
+        story.append(Paragraph(txt(t(f"🚫 عدد أيام الغياب: {absent_days}", f"🚫 Total Absent Days: {absent_days}", lang)), total_style))
+
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(txt(t("الإجازات المعتمدة", "Approved Leaves", lang)), h_style))
+    if leave_emp is None or leave_emp.empty:
+        story.append(Paragraph(txt(t("لا توجد إجازات معتمدة", "No approved leaves", lang)), p_style))
+    else:
+        lv = leave_emp.copy().sort_values("date") if "date" in leave_emp.columns else leave_emp.copy()
+        if "date" in lv.columns:
+            lv["date"] = lv["date"].apply(fmt_date)
+        rows3 = [rtl_row([
+            txt(t("اليوم", "Day", lang)),
+            txt(t("التاريخ", "Date", lang)),
+            txt(t("نوع الإجازة", "Leave Type", lang)),
+        ])]
+        for _, r in lv.iterrows():
+            day_val = safe_str(r.get("weekday_ar", r.get("weekday", ""))) if lang == "ar" else safe_str(r.get("weekday", ""))
+            rows3.append(rtl_row([
+                txt(day_val),
+                txt(safe_str(r.get("date", ""))),
+                txt(safe_str(r.get("leave_type", "إجازة"))),
+            ]))
+        t3 = Table(rows3, colWidths=rtl_cols([4.5 * cm, 4.5 * cm, 6.5 * cm]))
+        t3.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, -1), font_main),
+            ("FONTSIZE", (0, 0), (-1, 0), 11),
+            ("FONTSIZE", (0, 1), (-1, -1), 10),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT" if lang == "ar" else "LEFT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+            ("TOPPADDING", (0, 0), (-1, -1), 5),
+        ]))
+        story.append(t3)
+        story.append(Spacer(1, 6))
+        leave_days = int(emp_row.get("approved_leave_days", len(lv)) or 0)
+        story.append(Paragraph(txt(t(f"🏖️ عدد أيام الإجازات المعتمدة: {leave_days}", f"🏖️ Total Approved Leave Days: {leave_days}", lang)), total_style))
+
+    return story
+
+
+def build_pdf(emp_row, late_emp: pd.DataFrame, abs_emp: pd.DataFrame, leave_emp: pd.DataFrame | None = None, lang: str = "ar") -> bytes:
+    if not os.path.exists(FONT_PATH):
+        raise FileNotFoundError(f"Arabic font not found: {FONT_PATH}")
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=A4, **EMPLOYEE_PAGE_MARGINS)
+    doc.build(employee_story(emp_row, late_emp, abs_emp, leave_emp, lang=lang), onFirstPage=_draw_logo)
+    return buf.getvalue()
+
+
+
+# =========================
+# تقارير كل الموظفين (ZIP)
+# =========================
+def _employee_groups(df: pd.DataFrame | None) -> dict:
+    """تقسيم جدول (تأخير / غياب / إجازات) حسب employee_id مرة واحدة بدل فلترته لكل موظف."""
+    if df is None or df.empty or "employee_id" not in df.columns:
+        return {}
+    df = df.copy()
+    if "weekday" in df.columns:
+        df["weekday_ar"] = df["weekday"].apply(weekday_to_ar)
+    keys = df["employee_id"].astype(str).str.strip()
+    return {k: g for k, g in df.groupby(keys, sort=False)}
+
+
+def employee_report_jobs(summary: pd.DataFrame, late: pd.DataFrame, absence: pd.DataFrame, leave_days: pd.DataFrame):
+    """(صف الملخص، التأخير، الغياب، الإجازات) لكل موظف — نفس مدخلات build_pdf في الصفحة الرئيسية."""
+    late_g = _employee_groups(late)
+    abs_g = _employee_groups(absence)
+    leave_g = _employee_groups(leave_days)
+    empty = pd.DataFrame()
+
+    for _, emp in summary.iterrows():
+        emp_id = safe_str(emp.get("employee_id", ""))
+        yield emp, late_g.get(emp_id, empty), abs_g.get(emp_id, empty), leave_g.get(emp_id, empty)
+
+
+def employee_pdf_filename(emp_row, lang: str) -> str:
+    base_name = sanitize_filename(safe_str(emp_row.get("name_ar", "")) or safe_str(emp_row.get("name_en", "")))
+    base_no = sanitize_filename(fmt_id(emp_row.get("employee_no", "")))
+    return f"{base_name}_{base_no}_{lang.upper()}.pdf"
+
+
+def render_employee_pdfs(job) -> list:
+    """تقريرا الموظف (عربي وإنجليزي) كـ [(اسم الملف، bytes)] — تُنفذ داخل process العامل."""
+    emp, late_emp, abs_emp, leave_emp = job
+    return [
+        (employee_pdf_filename(emp, lang), build_pdf(emp, late_emp, abs_emp, leave_emp, lang=lang))
+        for lang in ("ar", "en")
+    ]
+
+
+def _unique_name(name: str, used: set) -> str:
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 2
+    while candidate in used:
+        candidate = f"{stem}_{n}{ext}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def export_employee_pdfs_zip(
+    summary: pd.DataFrame,
+    late: pd.DataFrame,
+    absence: pd.DataFrame,
+    leave_days: pd.DataFrame,
+    zip_path: str,
+    max_workers: int | None = None,
+    progress=None,
+) -> int:
+    """
+    كتابة تقارير PDF (عربي وإنجليزي) لكل موظف في summary داخل ملف ZIP على القرص.
+    التقارير تُبنى بالتوازي على processes وكل نتيجة تُكتب في الملف فور انتهائها،
+    وعدد المهام المعلّقة محدود حتى لا تتجمع التقارير في الذاكرة.
+    progress(done, total) يُستدعى بعد كل موظف. ترجع عدد الموظفين المصدّرين.
+    """
+    total = 0 if summary is None else len(summary)
+    if total == 0:
+        with zipfile.ZipFile(zip_path, "w"):
+            pass
+        return 0
+
+    jobs = employee_report_jobs(summary, late, absence, leave_days)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, total))
+    used = set()
+    done = 0
+
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+
+        def write(files):
+            nonlocal done
+            for name, data in files:
+                zf.writestr(_unique_name(name, used), data)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+        if workers == 1:
+            for job in jobs:
+                write(render_employee_pdfs(job))
+            return done
+
+        # spawn: العمال لا يرثون threads الخاصة بـ Streamlit
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            pending = set()
+            for job in jobs:
+                pending.add(pool.submit(render_employee_pdfs, job))
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        write(fut.result())
+            for fut in pending:
+                write(fut.result())
+
+    return done
+
+
+# =========================
+# تقرير القسم المجمّع (PDF واحد)
+# =========================
+class _EmployeeMark(Flowable):
+    """علامة بداية تقرير موظف داخل تقرير القسم (بدون حجم): bookmark + سطر في الفهرس + الشعار."""
+
+    def __init__(self, key: str, outline: str, toc_text: str):
+        super().__init__()
+        self.key = key
+        self.outline = outline
+        self.toc_text = toc_text
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        pass
+
+
+class _DepartmentDocTemplate(SimpleDocTemplate):
+
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, _EmployeeMark):
+            self.canv.bookmarkPage(flowable.key)
+            self.canv.addOutlineEntry(flowable.outline, flowable.key, level=0)
+            self.notify("TOCEntry", (0, flowable.toc_text, self.page, flowable.key))
+            _draw_logo(self.canv, self)
+
+
+def department_employees(summary: pd.DataFrame, department: str) -> pd.DataFrame:
+    if summary is None or summary.empty or "department" not in summary.columns:
+        return pd.DataFrame()
+    return summary[summary["department"].apply(safe_str) == safe_str(department)]
+
+
+def department_pdf_filename(department: str, lang: str) -> str:
+    return f"department_{sanitize_filename(safe_str(department))}_{lang.upper()}.pdf"
+
+
+def build_department_pdf(
+    department: str,
+    summary: pd.DataFrame,
+    late: pd.DataFrame,
+    absence: pd.DataFrame,
+    leave_days: pd.DataFrame,
+    lang: str = "ar",
+) -> bytes:
+    """
+    ملف واحد لكل موظفي القسم: صفحة عنوان وفهرس، ثم تقرير كل موظف (نفس تخطيط build_pdf)
+    بدايةً من صفحة جديدة مع bookmark باسمه. البناء في doc واحد (multiBuild لأرقام صفحات الفهرس).
+    """
+    if not os.path.exists(FONT_PATH):
+        raise FileNotFoundError(f"Arabic font not found: {FONT_PATH}")
+    ensure_fonts()
+
+    font_main = FONT_AR if lang == "ar" else FONT_EN
+    dept_summary = department_employees(summary, department)
+    dept_name = safe_str(department)
+
+    title_style = pdf_style("dept_title", parent="Title", fontName=font_main, fontSize=16, alignment=1)
+    info_style = pdf_style("dept_info", parent="BodyText", fontName=font_main, fontSize=11, alignment=1, textColor=colors.grey, leading=16)
+    h_style = pdf_style("dept_h", parent="Heading2", fontName=font_main, fontSize=13, alignment=2 if lang == "ar" else 0, spaceAfter=8)
+
+    toc = TableOfContents()
+    toc.levelStyles = [
+        pdf_style("dept_toc0", parent="BodyText", fontName=font_main, fontSize=10, leading=15),
+    ]
+
+    def mixed(text):
+        # نص إنجليزي قد يحتوي اسمًا عربيًا (اسم القسم أو الموظف)
+        return f"<font name='{FONT_AR}'>{ar(text)}</font>" if AR_CHARS.search(text) else escape(text)
+
+    count = len(dept_summary)
+    if lang == "ar":
+        period = month_year_title(dept_summary.iloc[0]).replace("تقرير الموظف", "").strip() if count else ""
+        story = [
+            Paragraph(ar(f"تقرير قسم {dept_name or 'بدون قسم'}"), title_style),
+            Paragraph(ar(f"{period} | عدد الموظفين: {count}".strip(" |")), info_style),
+            Spacer(1, 12),
+            Paragraph(ar("فهرس الموظفين"), h_style),
+        ]
+    else:
+        story = [
+            Paragraph(f"Department Report - {mixed(dept_name) if dept_name else 'No Department'}", title_style),
+            Paragraph(f"Employees: {count}", info_style),
+            Spacer(1, 12),
+            Paragraph("Employees Index", h_style),
+        ]
+    story.append(toc)
+
+    jobs = employee_report_jobs(dept_summary, late, absence, leave_days)
+    for i, (emp, late_emp, abs_emp, leave_emp) in enumerate(jobs):
+        name_ar_ = safe_str(emp.get("name_ar", ""))
+        name_en_ = safe_str(emp.get("name_en", ""))
+        emp_no = fmt_id(emp.get("employee_no", ""))
+
+        if lang == "ar":
+            name = name_ar_ or name_en_
+            toc_text = ar(f"{name} — {emp_no}" if emp_no else name)
+        else:
+            name = name_en_ or name_ar_
+            toc_text = f"{mixed(name)} — {escape(emp_no)}" if emp_no else mixed(name)
+        outline = f"{name} ({emp_no})" if emp_no else name
+
+        story.append(PageBreak())
+        story.append(_EmployeeMark(f"emp-{i}", outline or f"#{i + 1}", toc_text))
+        story.extend(employee_story(emp, late_emp, abs_emp, leave_emp, lang=lang))
+
+    buf = BytesIO()
+    doc = _DepartmentDocTemplate(buf, pagesize=A4, **EMPLOYEE_PAGE_MARGINS)
+    doc.multiBuild(story)
+    return buf.getvalue()
+
+
+# =========================
+# جداول الملخصات على canvas مباشرة
+# =========================
+# بديل سريع لـ Table/Paragraph في تقارير الملخصات الكبيرة (آلاف الصفوف): عرض الأعمدة
+# وارتفاع كل صف محسوبان مسبقًا، والرسم يتم مباشرة على canvas بنفس ألوان ومقاسات الجدول.
+SUMMARY_HEADER_BG = colors.HexColor("#1e293b")
+SUMMARY_GRID_COLOR = colors.HexColor("#cbd5e1")
+SUMMARY_ALT_ROW_BG = colors.HexColor("#f8fafc")
+SUMMARY_EXCEEDED_BG = colors.HexColor("#fee2e2")
+SUMMARY_NEAR_LIMIT_BG = colors.HexColor("#fef9c3")
+SUMMARY_MARGIN = 0.7 * cm
+SUMMARY_FRAME_PADDING = 6  # نفس padding الـ Frame في SimpleDocTemplate
+SUMMARY_CELL_PADDING = 5  # TOPPADDING / BOTTOMPADDING في تنسيق الجدول
+SUMMARY_CELL_HPADDING = 6  # LEFTPADDING / RIGHTPADDING الافتراضية لـ Table
+
+
+def _wrap_cell(text: str, font: str, size: float, width: float) -> list:
+    """أسطر الخلية مُشكّلة: التقسيم يتم على النص الأصلي (كلمة كلمة) ثم يُشكّل كل سطر."""
+    s = safe_str(text)
+    if not s:
+        return [""]
+    shaped = ar(s)
+    if stringWidth(shaped, font, size) <= width:
+        return [shaped]
+
+    lines, cur = [], ""
+    for word in s.split():
+        candidate = f"{cur} {word}" if cur else word
+        if stringWidth(ar(candidate), font, size) <= width:
+            cur = candidate
+            continue
+        if cur:
+            lines.append(ar(cur))
+        cur = word
+        # كلمة أعرض من العمود تُقسم على الحروف (مثل splitLongWords في Paragraph)
+        while len(cur) > 1 and stringWidth(ar(cur), font, size) > width:
+            cut = len(cur) - 1
+            while cut > 1 and stringWidth(ar(cur[:cut]), font, size) > width:
+                cut -= 1
+            lines.append(ar(cur[:cut]))
+            cur = cur[cut:]
+    if cur:
+        lines.append(ar(cur))
+    return lines
+
+
+def render_canvas_table_pdf(
+    title: str,
+    subtitles: list,
+    header: list,
+    rows: list,
+    col_widths: list,
+    row_backgrounds: list,
+    footer_lines: list,
+) -> bytes:
+    """
+    تقرير جدول واحد (عنوان + جدول بهيدر يتكرر في كل صفحة + إجماليات) مرسوم على canvas.
+    header / rows: نصوص غير مُشكّلة بترتيب الأعمدة من اليسار لليمين (نفس ترتيب Table).
+    row_backgrounds: لون خلفية كل صف من rows.
+    """
+    font = ensure_fonts()
+    W, H = A4
+
+    avail = W - 2 * SUMMARY_MARGIN - 2 * SUMMARY_FRAME_PADDING
+    table_w = sum(col_widths)
+    x0 = SUMMARY_MARGIN + SUMMARY_FRAME_PADDING + (avail - table_w) / 2
+    top = H - SUMMARY_MARGIN - SUMMARY_FRAME_PADDING
+    bottom = SUMMARY_MARGIN + SUMMARY_FRAME_PADDING
+
+    col_x = [x0]
+    for w in col_widths:
+        col_x.append(col_x[-1] + w)
+    inner = [w - 2 * SUMMARY_CELL_HPADDING for w in col_widths]
+
+    def layout(cells, size, leading):
+        lines = [_wrap_cell(c, font, size, inner[i]) for i, c in enumerate(cells)]
+        height = max(len(cell) for cell in lines) * leading + 2 * SUMMARY_CELL_PADDING
+        return lines, height
+
+    header_lines, header_h = layout(header, 10, 14)
+
+    # صف أطول من صفحة كاملة يُقسّم على عدة صفحات (نفس الخلفية) وإلا لن يتسع في أي صفحة
+    max_lines = max(1, int((top - bottom - header_h - 2 * SUMMARY_CELL_PADDING) // 13))
+    body = []
+    for r, bg in zip(rows, row_backgrounds):
+        lines, height = layout(r, 9.5, 13)
+        n = max(len(cell) for cell in lines)
+        if n <= max_lines:
+            body.append((lines, height, bg))
+            continue
+        for start in range(0, n, max_lines):
+            part = [cell[start:start + max_lines] for cell in lines]
+            part_h = max(len(cell) for cell in part) * 13 + 2 * SUMMARY_CELL_PADDING
+            body.append((part, part_h, bg))
+
+    buf = BytesIO()
+    c = Canvas(buf, pagesize=A4)
+
+    def draw_row(lines, height, y_top, size, leading, fill, text_color):
+        c.setFillColor(fill)
+        c.rect(x0, y_top - height, table_w, height, stroke=0, fill=1)
+        c.setFillColor(text_color)
+        c.setFont(font, size)
+        for i, cell in enumerate(lines):
+            cx = (col_x[i] + col_x[i + 1]) / 2
+            # توسيط رأسي مثل VALIGN MIDDLE
+            y = y_top - (height - len(cell) * leading) / 2 - size
+            for line in cell:
+                c.drawCentredString(cx, y, line)
+                y -= leading
+
+    def draw_grid(y_top, boundaries):
+        c.setStrokeColor(SUMMARY_GRID_COLOR)
+        c.setLineWidth(0.4)
+        y_bottom = boundaries[-1]
+        for x in col_x:
+            c.line(x, y_top, x, y_bottom)
+        for y in [y_top] + boundaries:
+            c.line(x0, y, x0 + table_w, y)
+
+    # العنوان والفترة (أول صفحة فقط)
+    y = top
+    c.setFillColor(colors.HexColor("#111827"))
+    c.setFont(font, 18)
+    c.drawCentredString(W / 2, y - 18, ar(title))
+    y -= 24 + 6
+    c.setFillColor(colors.HexColor("#374151"))
+    c.setFont(font, 11)
+    for line in subtitles:
+        c.drawCentredString(W / 2, y - 11, ar(line))
+        y -= 16 + 14
+
+    i = 0
+    while True:
+        page_top = y
+        draw_row(header_lines, header_h, y, 10, 14, SUMMARY_HEADER_BG, colors.white)
+        y -= header_h
+        boundaries = [y]
+        # في صفحة جديدة يُرسم صف واحد على الأقل حتى لا تتكرر showPage بلا نهاية
+        while i < len(body) and (y - body[i][1] >= bottom or (page_top == top and len(boundaries) == 1)):
+            lines, height, bg = body[i]
+            draw_row(lines, height, y, 9.5, 13, bg, colors.black)
+            y -= height
+            boundaries.append(y)
+            i += 1
+        draw_grid(page_top, boundaries)
+        if i >= len(body):
+            break
+        c.showPage()
+        y = top
+
+    # الإجماليات (يمين الصفحة)
+    y -= 12 + 12
+    c.setFillColor(colors.HexColor("#111827"))
+    c.setFont(font, 11)
+    right = W - SUMMARY_MARGIN - SUMMARY_FRAME_PADDING
+    for line in footer_lines:
+        if y - 16 < bottom:
+            c.showPage()
+            c.setFillColor(colors.HexColor("#111827"))
+            c.setFont(font, 11)
+            y = top
+        c.drawRightString(right, y - 11, ar(line))
+        y -= 16
+
+    c.save()
+    return buf.getvalue()
+
+
+def _platypus_summary_pdf(prefix, title, subtitles, header, rows, col_widths, row_backgrounds, footer_lines, empty_text=None) -> bytes:
+    """نفس التقرير بـ SimpleDocTemplate/Table (التخطيط الأصلي لتقارير الملخصات)."""
+    buf = BytesIO()
+
+    FONT_NAME = ensure_fonts()
+
+    doc = SimpleDocTemplate(
+        buf,
+        pagesize=A4,
+        leftMargin=0.7 * cm,
+        rightMargin=0.7 * cm,
+        topMargin=0.7 * cm,
+        bottomMargin=0.7 * cm,
+    )
+
+    title_style = pdf_style(
+        f"{prefix}_title",
+        parent="Title",
+        fontName=FONT_NAME,
+        fontSize=18,
+        alignment=1,
+        textColor=colors.HexColor("#111827"),
+        leading=24,
+        spaceAfter=6,
+    )
+
+    subtitle_style = pdf_style(
+        f"{prefix}_subtitle",
+        parent="BodyText",
+        fontName=FONT_NAME,
+        fontSize=11,
+        alignment=1,
+        textColor=colors.HexColor("#374151"),
+        leading=16,
+        spaceAfter=14,
+    )
+
+    header_style = pdf_style(
+        f"{prefix}_header",
+        parent="BodyText",
+        fontName=FONT_NAME,
+        fontSize=10,
+        alignment=1,
+        textColor=colors.white,
+        leading=14,
+    )
+
+    cell_style = pdf_style(
+        f"{prefix}_cell",
+        parent="BodyText",
+        fontName=FONT_NAME,
+        fontSize=9.5,
+        alignment=1,
+        textColor=colors.black,
+        leading=13,
+    )
+
+    total_style = pdf_style(
+        f"{prefix}_total",
+        parent="BodyText",
+        fontName=FONT_NAME,
+        fontSize=11,
+        alignment=2,
+        textColor=colors.HexColor("#111827"),
+        leading=16,
+        spaceBefore=12,
+    )
+
+    story = [Paragraph(ar(title), title_style)]
+    story.extend(Paragraph(ar(line), subtitle_style) for line in subtitles)
+
+    if empty_text is not None:
+        story.append(Paragraph(ar(empty_text), cell_style))
+        doc.build(story)
+        return buf.getvalue()
+
+    table_rows = [[Paragraph(ar(h), header_style) for h in header]]
+    table_rows.extend([Paragraph(ar(v), cell_style) for v in r] for r in rows)
+
+    table = Table(table_rows, colWidths=col_widths, repeatRows=1)
+
+    style_cmds = [
+        ("BACKGROUND", (0, 0), (-1, 0), SUMMARY_HEADER_BG),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("GRID", (0, 0), (-1, -1), 0.4, SUMMARY_GRID_COLOR),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 5),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+    ]
+    for i, bg in enumerate(row_backgrounds, start=1):
+        style_cmds.append(("BACKGROUND", (0, i), (-1, i), bg))
+
+    table.setStyle(TableStyle(style_cmds))
+    story.append(table)
+
+    story.append(Spacer(1, 12))
+    story.extend(Paragraph(ar(line), total_style) for line in footer_lines)
+
+    doc.build(story)
+    return buf.getvalue()
+
+
+def build_sick_leave_pdf(summary_df: pd.DataFrame, year_label: str = "", fast: bool = False) -> bytes:
+    """
+    تقرير PDF لملخص الإجازات المرضية لكل موظف مرتب من الأكثر إلى الأقل،
+    مع تمييز الموظفين المتجاوزين للحد السنوي (30 يوم).
+    fast: رسم الجدول مباشرة على canvas (للتقارير الكبيرة).
+    """
+    title = "تقرير الإجازات المرضية حسب الموظف"
+    subtitles = [f"الفترة: {year_label}"] if year_label else []
+    subtitles.append(f"الحد السنوي المسموح به لكل موظف: {SICK_LEAVE_ANNUAL_QUOTA} يوم")
+
+    if summary_df is None or summary_df.empty:
+        return _platypus_summary_pdf("sick", title, subtitles, [], [], [], [], [], empty_text="لا توجد إجازات مرضية ضمن الفترة المحددة")
+
+    # رأس الجدول (بالترتيب من اليسار لليمين: الترقيم في أقصى اليمين)
+    header = ["الحالة", "المتبقي", "إجمالي الأيام", "عدد الإجازات", "القسم", "الرقم الوظيفي", "الموظف", "م"]
+
+    rows = []
+    row_backgrounds = []
+
+    for r in summary_df.to_dict("records"):
+        total_days = int(r.get("total_days", 0))
+        exceeded = total_days >= SICK_LEAVE_ANNUAL_QUOTA
+        near_limit = total_days >= SICK_LEAVE_ANNUAL_QUOTA * 0.7 and not exceeded
+
+        rows.append([
+            safe_str(r.get("status")),
+            str(int(r.get("remaining_days", 0))),
+            str(total_days),
+            str(int(r.get("leave_count", 0))),
+            safe_str(r.get("department")),
+            fmt_id(r.get("employee_no")),
+            safe_str(r.get("name_ar")),
+            str(int(r.get("rank", 0))),
+        ])
+
+        if exceeded:
+            row_backgrounds.append(SUMMARY_EXCEEDED_BG)
+        elif near_limit:
+            row_backgrounds.append(SUMMARY_NEAR_LIMIT_BG)
+        else:
+            row_backgrounds.append(colors.white if len(row_backgrounds) % 2 == 1 else SUMMARY_ALT_ROW_BG)
+
+    col_widths = [1.6 * cm, 1.8 * cm, 2.3 * cm, 2.3 * cm, 3.2 * cm, 2.8 * cm, 5.0 * cm, 1.0 * cm]
+
+    exceeded_count = int((summary_df["total_days"] >= SICK_LEAVE_ANNUAL_QUOTA).sum())
+    total_employees = len(summary_df)
+    total_days_all = int(summary_df["total_days"].sum())
+
+    footer_lines = [
+        f"👥 عدد الموظفين: {total_employees}    |    📅 إجمالي أيام الإجازات المرضية: {total_days_all}",
+        f"🔴 عدد الموظفين المتجاوزين للحد السنوي ({SICK_LEAVE_ANNUAL_QUOTA} يوم): {exceeded_count}",
+    ]
+
+    if fast:
+        return render_canvas_table_pdf(title, subtitles, header, rows, col_widths, row_backgrounds, footer_lines)
+    return _platypus_summary_pdf("sick", title, subtitles, header, rows, col_widths, row_backgrounds, footer_lines)
+
+
+def build_all_leave_summary_pdf(summary_df: pd.DataFrame, year_label: str = "", fast: bool = False) -> bytes:
+    """
+    تقرير PDF شامل لملخص إجازات كل الموظفين (كل الأنواع)،
+    يعرض عدد الإجازات وإجمالي الأيام وآخر إجازة لكل موظف.
+    fast: رسم الجدول مباشرة على canvas (للتقارير الكبيرة).
+    """
+    title = "ملخص الإجازات الشامل لكل الموظفين"
+    subtitles = [f"الفترة: {year_label}"] if year_label else []
+
+    if summary_df is None or summary_df.empty:
+        return _platypus_summary_pdf("allsum", title, subtitles, [], [], [], [], [], empty_text="لا توجد إجازات مسجلة ضمن الفترة المحددة")
+
+    # رأس الجدول (بالترتيب من اليسار لليمين: الترقيم في أقصى اليمين)
+    header = ["آخر إجازة", "إجمالي الأيام", "عدد الإجازات", "القسم", "الرقم الوظيفي", "الموظف", "م"]
+
+    rows = [
+        [
+            fmt_date(r.get("last_leave_date")),
+            str(int(r.get("total_days", 0))),
+            str(int(r.get("leave_count", 0))),
+            safe_str(r.get("department")),
+            fmt_id(r.get("employee_no")),
+            safe_str(r.get("name_ar")),
+            str(int(r.get("rank", 0))),
+        ]
+        for r in summary_df.to_dict("records")
+    ]
+    row_backgrounds = [colors.white if i % 2 == 0 else SUMMARY_ALT_ROW_BG for i in range(1, len(rows) + 1)]
+
+    col_widths = [2.4 * cm, 2.3 * cm, 2.3 * cm, 3.4 * cm, 2.8 * cm, 5.3 * cm, 1.0 * cm]
+
+    total_employees = len(summary_df)
+    total_days_all = int(summary_df["total_days"].sum())
+    total_leaves_all = int(summary_df["leave_count"].sum())
+
+    footer_lines = [
+        f"👥 عدد الموظفين: {total_employees}    |    "
+        f"📄 إجمالي عدد الإجازات: {total_leaves_all}    |    "
+        f"📅 إجمالي أيام الإجازات: {total_days_all}"
+    ]
+
+    if fast:
+        return render_canvas_table_pdf(title, subtitles, header, rows, col_widths, row_backgrounds, footer_lines)
+    return _platypus_summary_pdf("allsum", title, subtitles, header, rows, col_widths, row_backgrounds, footer_lines)
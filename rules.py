@@ -0,0 +1,86 @@
+# =========================
+# rules.py
+# =========================
+import numpy as np
+import pandas as pd
+
+from attendance_engine import EID_FROM, EID_TO, weekend_schedule
+
+# نمط أيام العمل لكل جدول دوام بصيغة numpy (الاثنين ... الأحد)
+SCHEDULE_WEEKMASKS = {
+    "جمعة وسبت": "1111001",
+    "جمعة فقط": "1111011",
+}
+
+DEFAULT_SCHEDULE = "جمعة وسبت"
+
+SICK_LEAVE_ANNUAL_QUOTA = 30  # عدد أيام الإجازة المرضية المسموح بها سنويًا لكل موظف
+
+# عيد الأضحى: الغياب فيه لا يُحتسب في تقرير الحضور (exclude_eid_al_adha_absence)
+EID_AL_ADHA_2026_START = pd.Timestamp("2026-05-26")
+EID_AL_ADHA_2026_END = pd.Timestamp("2026-05-30")
+
+# الإجازات الرسمية (من - إلى) — نفس فترات العطل المستخدمة في احتساب الحضور
+HOLIDAY_RANGES = [
+    (EID_FROM, EID_TO),
+    (EID_AL_ADHA_2026_START, EID_AL_ADHA_2026_END),
+]
+
+
+def schedule_for_nationality(nat, has_saturday_presence: bool = True) -> str:
+    """
+    جدول العطلة الأسبوعية بنفس قاعدة process_attendance (weekend_schedule):
+    السعودي جمعة وسبت، وغير السعودي جمعة فقط بشرط وجود بصمة يوم سبت.
+    بدون ملف بصمة (مثل احتساب أيام الإجازات) يُفترض أن غير السعودي يداوم السبت.
+    """
+    return weekend_schedule(nat, has_saturday_presence)
+
+
+def holiday_calendar(holiday_ranges=None) -> np.ndarray:
+    ranges = HOLIDAY_RANGES if holiday_ranges is None else holiday_ranges
+    days = [
+        pd.date_range(pd.to_datetime(s), pd.to_datetime(e), freq="D").values.astype("datetime64[D]")
+        for s, e in ranges
+    ]
+    if not days:
+        return np.array([], dtype="datetime64[D]")
+    return np.unique(np.concatenate(days))
+
+
+def count_workdays(start_dates, end_dates, schedules=None, holidays=None) -> np.ndarray:
+    """
+    عدد أيام العمل في كل فترة [start, end] (شاملة الطرفين) دفعة واحدة بدون توسيع الأيام.
+    schedules: اسم جدول واحد أو قائمة بطول الفترات (جمعة وسبت / جمعة فقط)،
+    الجدول غير المعروف يعامل كـ DEFAULT_SCHEDULE.
+    الفترات التي ينقصها تاريخ أو نهايتها قبل بدايتها تُحتسب صفر.
+    """
+    start = pd.to_datetime(pd.Series(start_dates), errors="coerce").to_numpy().astype("datetime64[D]")
+    end = pd.to_datetime(pd.Series(end_dates), errors="coerce").to_numpy().astype("datetime64[D]")
+
+    n = len(start)
+    out = np.zeros(n, dtype=np.int64)
+    if n == 0:
+        return out
+
+    if schedules is None or isinstance(schedules, str):
+        sched = np.full(n, schedules or DEFAULT_SCHEDULE, dtype=object)
+    else:
+        sched = pd.Series(schedules, dtype=object).fillna(DEFAULT_SCHEDULE).to_numpy()
+    sched = np.where(pd.Series(sched).isin(list(SCHEDULE_WEEKMASKS)), sched, DEFAULT_SCHEDULE)
+
+    valid = ~(np.isnat(start) | np.isnat(end)) & (end >= start)
+
+    hol = holiday_calendar() if holidays is None else np.asarray(holidays, dtype="datetime64[D]")
+
+    # استدعاء واحد لكل جدول دوام (عدد الجداول صغير)
+    for name, mask in SCHEDULE_WEEKMASKS.items():
+        sel = valid & (sched == name)
+        if sel.any():
+            out[sel] = np.busday_count(
+                start[sel],
+                end[sel] + np.timedelta64(1, "D"),
+                weekmask=mask,
+                holidays=hol,
+            )
+
+    return out